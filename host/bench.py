@@ -0,0 +1,194 @@
+"""
+Frame rate benchmark of `main.App.run()` on the emulated board.
+
+    python host/bench.py                          # every preset, synthetic scene
+    python host/bench.py --preset framediff -n 200 --frames path/to/jpegs
+    python host/bench.py --preset blob_class --set BLEND_TIMEOUT_MS=5000 --window 800
+    python host/bench.py --preset framediff --profile    # per-stage timings (util.profiler)
+    python host/bench.py --preset framediff --scene drift=15 --scene enter=999   # empty scene, light changes
+
+Each preset runs in its own interpreter (settings are read at import time). Reported:
+    cpu fps: frames per second of host compute (snapshot to snapshot, real time)
+    board fps: frames per second on the virtual clock, i.e. host compute plus the
+               simulated waits (sensor readout, delays, model loads and inferences)
+    blob crops saved: files in jpegs/blobs at the end of the run, before the open tracks end
+                      (their best crop is still in memory, see TRACK_CROP_MAX_AGE_MS)
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PRESETS = {
+    "capture": {"FRAME_DIFF_ENABLED": False, "ML_MODE": None, "IMG_SAVE_FILTER": [0, 1, 2]},
+    "framediff": {"FRAME_DIFF_ENABLED": True, "ML_MODE": None},
+    "blob_class": {"FRAME_DIFF_ENABLED": True, "ML_MODE": 2},
+    "frame_class": {"FRAME_DIFF_ENABLED": False, "ML_MODE": 0},
+    "object_detect": {"FRAME_DIFF_ENABLED": False, "ML_MODE": 1},
+}
+
+LABELS = ["Background", "insect", "bird", "mammal"]
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def _count_files(folder):
+    return sum(len(files) for _, _, files in os.walk(folder))
+
+
+def run_preset(args):
+    import emulator
+
+    settings = dict(PRESETS[args.preset])
+    if args.profile:
+        settings["PROFILER_ENABLED"] = True
+    for item in args.set:
+        key, _, value = item.partition("=")
+        settings[key] = ast.literal_eval(value)
+
+    sdcard = os.path.abspath(args.sdcard) if args.sdcard else tempfile.mkdtemp(prefix="ecoeye-bench-")
+    os.makedirs(sdcard, exist_ok=True)
+    with open(os.path.join(sdcard, "labels.txt"), "w") as f:
+        f.write("\n".join(LABELS) + "\n")
+    with open(os.path.join(sdcard, "trained.tflite"), "wb") as f:
+        f.write(bytes(256 * 1024))
+    settings.setdefault("LABELS_PATH", os.path.join(sdcard, "labels.txt"))
+    settings.setdefault("NET_PATH", os.path.join(sdcard, "trained.tflite"))
+    if args.window:
+        emulator.setup_path()
+        from util.rect import Rect
+        settings["WIN_RECT"] = Rect(960 + (1600 - args.window) // 2, 0, args.window, args.window)
+    frames = args.frames
+    if args.scene:
+        emulator.setup_path()
+        import frames as frame_sources
+        frames = frame_sources.SyntheticSource(**{k: ast.literal_eval(v) for k, _, v in (s.partition("=") for s in args.scene)})
+    emulator.install(frames=frames, sdcard=sdcard, settings=settings,
+                     frame_period_ms=args.frame_period_ms, limit=args.frames_count)
+
+    import _host
+    import sensor
+    import tf
+    stamps = []
+    snapshot = sensor.snapshot
+
+    def timed_snapshot():
+        stamps.append((time.perf_counter(), _host.clock.us()))
+        return snapshot()
+
+    sensor.snapshot = timed_snapshot
+
+    stdout = sys.stdout
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w")
+    try:
+        import main
+        app = main.App()
+        end = emulator.run(app)
+        stamps.append((time.perf_counter(), _host.clock.us()))
+        detections = app.session.detectionlog.detection_count if app.session else 0
+        # blob crops on the SD card at the end of the run (the crops of the open tracks are still in memory)
+        crops = _count_files(os.path.join(os.getcwd(), "jpegs", "blobs")) if app.session else 0
+        tracker = app.frame_differencer.tracker if app.frame_differencer else None
+        open_tracks = len(tracker.tracks) if tracker else 0
+        if app.session:
+            # clean shutdown: write what is still buffered to the SD card
+            app.session.save()
+    finally:
+        if not args.verbose:
+            sys.stdout.close()
+        sys.stdout = stdout
+
+    # first loop iterations set the background reference, keep them out of the statistics
+    stamps = stamps[args.warmup:]
+    cpu_ms = [(b[0] - a[0]) * 1000 for a, b in zip(stamps, stamps[1:])]
+    board_ms = [(b[1] - a[1]) / 1000 for a, b in zip(stamps, stamps[1:])]
+    frames = len(cpu_ms)
+    stages = []
+    if args.profile:
+        from util.profiler import profiler
+        stages = profiler.report()
+    return {
+        "preset": args.preset,
+        "frames": frames,
+        "end": end,
+        "cpu_fps": round(frames / (sum(cpu_ms) / 1000), 2) if frames else 0.0,
+        "board_fps": round(frames / (sum(board_ms) / 1000), 2) if frames else 0.0,
+        "ms_median": round(_percentile(cpu_ms, 0.5), 2),
+        "ms_p95": round(_percentile(cpu_ms, 0.95), 2),
+        "detections": detections,
+        "crops": crops,
+        "open_tracks": open_tracks,
+        "model_loads": tf.loads,
+        "inferences": tf.inferences,
+        "sdcard": sdcard,
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", choices=sorted(PRESETS), help="code path to benchmark (default: all)")
+    parser.add_argument("--frames", help="directory of JPEG/PNG frames (default: synthetic scene)")
+    parser.add_argument("-n", "--frames-count", type=int, default=120, help="number of frames to capture")
+    parser.add_argument("--warmup", type=int, default=2, help="frames left out of the statistics")
+    parser.add_argument("--scene", action="append", default=[], metavar="KEY=VALUE",
+                        help="parameter of the synthetic scene (frames.SyntheticSource), e.g. drift=15")
+    parser.add_argument("--window", type=int, help="side of a centred square sensor window (default: settings WIN_RECT)")
+    parser.add_argument("--frame-period-ms", type=float, default=0, help="simulated sensor readout time per frame")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="override a setting (Python literal)")
+    parser.add_argument("--sdcard", help="directory used as SD card (default: temporary)")
+    parser.add_argument("--profile", action="store_true", help="enable the profiler and report per-stage timings")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show the application output")
+    args = parser.parse_args()
+    if args.frames:
+        args.frames = os.path.abspath(args.frames)
+
+    if args.preset:
+        result = run_preset(args)
+        print(json.dumps(result) if args.json else _format(result))
+        return
+
+    forwarded = [a for a in sys.argv[1:] if a != "--json"]
+    print(_header())
+    for preset in PRESETS:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--preset", preset, "--json"] + forwarded,
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            print(f"{preset:<14} failed: {out.stderr.strip().splitlines()[-1] if out.stderr.strip() else out.returncode}")
+            continue
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(json.dumps(result) if args.json else _row(result))
+
+
+def _header():
+    return f"{'preset':<14}{'frames':>7}{'cpu fps':>10}{'board fps':>11}{'median ms':>11}{'p95 ms':>9}{'detections':>12}"
+
+
+def _row(r):
+    return f"{r['preset']:<14}{r['frames']:>7}{r['cpu_fps']:>10}{r['board_fps']:>11}{r['ms_median']:>11}{r['ms_p95']:>9}{r['detections']:>12}"
+
+
+def _format(result):
+    lines = [_header(), _row(result)]
+    if result["inferences"]:
+        lines.append(f"model loads: {result['model_loads']}, inferences: {result['inferences']}")
+    if result["crops"] or result["open_tracks"]:
+        lines.append(f"blob crops saved: {result['crops']}, open tracks: {result['open_tracks']}")
+    if result["stages"]:
+        lines.append(f"\n{'stage':<18}{'count':>7}{'min ms':>9}{'mean ms':>9}{'p95 ms':>9}{'max ms':>9}")
+        for name, count, lo, mean, p95, hi in result["stages"]:
+            lines.append(f"{name:<18}{count:>7}{lo / 1000:>9.2f}{mean / 1000:>9.2f}{p95 / 1000:>9.2f}{hi / 1000:>9.2f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    main()
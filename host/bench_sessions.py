@@ -0,0 +1,51 @@
+"""
+Benchmark of the creation of new sessions (logging.session.Session.create) on a card that already holds many.
+
+    python host/bench_sessions.py                 # 2000 sessions
+    python host/bench_sessions.py -n 5000 --step 1000
+
+Reports the mean creation time (ms, host CPU) of every step of sessions, which should not grow with the number
+of session folders in DATA/, and checks that every session got its own folder.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import emulator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--sessions", type=int, default=2000, help="number of sessions to create")
+    parser.add_argument("--step", type=int, default=500, help="sessions per reported mean")
+    parser.add_argument("--sdcard", help="directory used as SD card (default: temporary)")
+    args = parser.parse_args()
+
+    sdcard = emulator.install(sdcard=args.sdcard or tempfile.mkdtemp(prefix="ecoeye-sessions-"))
+    from logging.session import Session
+    from util.timeutil import Rtc
+    rtc = Rtc()
+
+    stdout = sys.stdout
+    print(f"{'sessions':>9}{'mean ms':>9}")
+    durations = []
+    for i in range(args.sessions):
+        os.chdir(sdcard)
+        sys.stdout = open(os.devnull, "w")
+        start = time.perf_counter()
+        Session().create(rtc)
+        durations.append((time.perf_counter() - start) * 1000)
+        sys.stdout.close()
+        sys.stdout = stdout
+        if (i + 1) % args.step == 0:
+            step = durations[-args.step:]
+            print(f"{i + 1:>9}{sum(step) / len(step):>9.3f}")
+
+    folders = os.listdir(os.path.join(sdcard, Session.DATA_FOLDER))
+    print(f"folders: {len(folders)}, distinct numbers: {len(set(name.split(' ')[0] for name in folders))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark of the post-processing of a classified window (vision.classification) on large label sets.
+
+    python host/bench_topk.py
+    python host/bench_topk.py --labels 10 100 1000 -k 3 --windows 2000
+
+Per window, the classifier needs the highest target confidence (refinement and threshold) and, for the
+detected windows, the top-k labels to log. Reported per window (microseconds of host CPU):
+    previous: target confidence looped over the target indices twice (refinement, then threshold),
+              top-k by sorting the whole output
+    top_k:    like the classifier: the target confidence by argmax over the target indices (up to SMALL_OUTPUT
+              labels) or top_k(output, 1, target ranges), top_k(output, k) for the detected windows
+"""
+import argparse
+import random
+import time
+
+import emulator
+
+DETECTED_RATIO = 0.05  # share of the windows above the threshold (logged)
+
+
+def previous(output, target_indices, k):
+    def target_confidence():
+        confidence = 0
+        for idx in target_indices:
+            if output[idx] > confidence:
+                confidence = output[idx]
+        return confidence
+    target_confidence()  # refinement
+    detected = target_confidence() >= 0.5  # threshold
+    if detected:
+        indices = sorted(range(len(output)), key=lambda i: output[i], reverse=True)[:k]
+        return indices, [output[i] for i in indices]
+    return None
+
+
+def current(output, runs, target_indices, k):
+    if target_indices is not None:
+        confidence = argmax(output, target_indices)[1]
+    else:
+        confidences = top_k(output, 1, runs)[1]
+        confidence = confidences[0] if confidences else 0
+    if confidence >= 0.5:
+        return top_k(output, k)
+    return None
+
+
+def outputs(labels, windows, rng):
+    """Softmax-like outputs: background (label 0) dominates, a target label dominates in DETECTED_RATIO of the windows"""
+    result = []
+    for _ in range(windows):
+        values = [rng.random() for _ in range(labels)]
+        winner = rng.randrange(1, labels) if rng.random() < DETECTED_RATIO else 0
+        values[winner] += labels
+        total = sum(values)
+        result.append([v / total for v in values])
+    return result
+
+
+def measure(function, outputs, *args):
+    start = time.perf_counter()
+    for output in outputs:
+        function(output, *args)
+    return (time.perf_counter() - start) / len(outputs) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--labels", type=int, nargs="+", default=[4, 100, 1000], help="label set sizes")
+    parser.add_argument("-k", type=int, default=3, help="number of logged labels")
+    parser.add_argument("--windows", type=int, default=2000, help="windows per label set")
+    args = parser.parse_args()
+
+    emulator.setup_path()
+    global argmax, top_k
+    from vision.classification import SMALL_OUTPUT, argmax, mask_runs, target_mask, top_k
+
+    rng = random.Random(0)
+    print(f"{'labels':>7}{'previous us':>13}{'top_k us':>10}{'speedup':>9}")
+    for labels in args.labels:
+        names = ["Background"] + [f"class{i}" for i in range(1, labels)]
+        mask = target_mask(names, "Background")
+        runs = mask_runs(mask)
+        target_indices = [i for i in range(labels) if mask[i]]
+        small_indices = target_indices if labels <= SMALL_OUTPUT else None
+        windows = outputs(labels, args.windows, rng)
+        for output in windows:
+            assert previous(output, target_indices, args.k) == (current(output, runs, small_indices, args.k) or None)
+        before = measure(previous, windows, target_indices, args.k)
+        after = measure(current, windows, runs, small_indices, args.k)
+        print(f"{labels:>7}{before:>13.1f}{after:>10.1f}{before / after:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Wake-to-sleep benchmark of a deep sleep reset (hardware.wake), on the host stand-in.
+
+    python host/bench_wake.py            # both paths, 10 runs each
+    python host/bench_wake.py -n 50
+
+Every run is a fresh interpreter (module imports are part of the cost), started as a deep sleep reset:
+    nap:  the sleep is not over, from the start of main.py to pyb.standby()
+    full: the sleep is over, from the start of main.py to the constructed App (the emulator preloads
+          the settings and the session modules, so this understates the full start)
+Reported: host CPU time (ms) and number of application modules (src/) imported.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HOST_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(HOST_DIR), "src")
+FIRMWARE_MODULES = ("image", "machine", "micropython", "network", "pyb", "requests", "sensor", "tf")
+
+
+def _src_modules():
+    return sum(1 for module in list(sys.modules.values())
+               if (getattr(module, "__file__", None) or "").startswith(SRC_DIR))
+
+
+def run_child(path):
+    import emulator
+    sdcard = tempfile.mkdtemp(prefix="ecoeye-wake-")
+    os.makedirs(os.path.join(sdcard, "VAR"))
+    emulator.setup_path()
+    import _host
+    import machine
+    if path == "full":
+        emulator.install(sdcard=sdcard, reset_cause=machine.DEEPSLEEP_RESET, limit=1)
+    else:
+        _host.reset_cause = machine.DEEPSLEEP_RESET
+        os.chdir(sdcard)
+    # firmware modules are built in on the board: keep their host stand-ins out of the timing
+    for name in FIRMWARE_MODULES:
+        __import__(name)
+    import hardware.wake as wake
+    wake.STATE_PATH = os.path.join(sdcard, "VAR", "dsleep.bin")
+    now = int(_host.rtc_now())
+    wake.save_state(now, now + (3600 if path == "nap" else 0), 60000)
+
+    modules = _src_modules()
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    start = time.perf_counter()
+    end = "started"
+    try:
+        import main
+        main.App()
+    except _host.Standby:
+        end = "standby"
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    sys.stdout = stdout
+    print(json.dumps({"path": path, "end": end, "ms": elapsed_ms, "modules": _src_modules() - modules,
+                      "wakeup_ms": _host.rtc_wakeup_ms}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--runs", type=int, default=10, help="runs per path")
+    parser.add_argument("--child", choices=["nap", "full"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args.child)
+        return
+
+    print(f"{'path':<6}{'end':>9}{'median ms':>11}{'max ms':>9}{'modules':>9}")
+    for path in ("nap", "full"):
+        results = []
+        for _ in range(args.runs):
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", path],
+                                 capture_output=True, text=True, check=True)
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        times = sorted(r["ms"] for r in results)
+        print(f"{path:<6}{results[0]['end']:>9}{times[len(times) // 2]:>11.2f}{times[-1]:>9.2f}{results[0]['modules']:>9}")
+
+
+if __name__ == "__main__":
+    main()
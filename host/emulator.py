@@ -0,0 +1,111 @@
+"""
+Run the ecoEye scripts of `src/` unchanged under CPython on a Linux host.
+
+`install()` puts the stand-ins of the OpenMV modules (host/openmv: sensor, image, pyb,
+machine, tf, ...) and `src/` on the import path, emulates the SD card with a host
+directory and feeds `sensor.snapshot()` from a frame source:
+
+    import emulator
+    emulator.install(frames="path/to/jpegs", settings={"FRAME_DIFF_ENABLED": True})
+    import main
+    emulator.run(main.App())
+"""
+import os
+import sys
+import tempfile
+import types
+
+HOST_DIR = os.path.dirname(os.path.abspath(__file__))
+OPENMV_DIR = os.path.join(HOST_DIR, "openmv")
+SRC_DIR = os.path.join(os.path.dirname(HOST_DIR), "src")
+
+_installed = False
+
+
+def setup_path():
+    """
+    `src/logging` (a namespace package) shadows the standard library package of the same
+    name: Pillow, which uses the standard one, is fully initialised first, then the name is
+    handed over to `src`.
+    """
+    global _installed
+    if _installed:
+        return
+    from PIL import Image
+    Image.init()
+    for name in [m for m in sys.modules if m == "logging" or m.startswith("logging.")]:
+        del sys.modules[name]
+    package = types.ModuleType("logging")
+    package.__path__ = [os.path.join(SRC_DIR, "logging")]
+    sys.modules["logging"] = package
+    for path in (SRC_DIR, OPENMV_DIR, HOST_DIR):
+        if path in sys.path:
+            sys.path.remove(path)
+    sys.path[0:0] = [OPENMV_DIR, SRC_DIR, HOST_DIR]
+    import _host
+    _host.install_time()
+    _host.install_os()
+    _host.install_gc()
+    _installed = True
+
+
+def install(frames=None, sdcard=None, settings=None, reset_cause=None, frame_period_ms=0, limit=None):
+    """
+    Install the emulated board.
+
+    :param frames: directory of JPEG/PNG frames, a `frames.FrameSource`, or None for the synthetic scene.
+    :param sdcard: host directory used as the SD card (working directory of the scripts), temporary if None.
+    :param settings: overrides of `config.settings` values, applied before any other `src` import.
+    :param reset_cause: `machine.reset_cause()` value (e.g. `machine.DEEPSLEEP_RESET`), power on if None.
+    :param frame_period_ms: virtual time spent by the sensor per snapshot (0: compute bound).
+    :param limit: number of snapshots before `EndOfFrames` is raised (None: endless).
+    :return: the SD card directory.
+    """
+    setup_path()
+    import _host
+    import machine
+    import frames as frame_sources
+
+    if isinstance(frames, str):
+        frames = frame_sources.DirectorySource(os.path.abspath(frames), limit=limit)
+    elif frames is None:
+        frames = frame_sources.SyntheticSource(limit=limit)
+    elif limit is not None:
+        frames.limit = limit
+    _host.frame_source = frames
+    _host.frame_period_ms = frame_period_ms
+    _host.reset_cause = reset_cause if reset_cause is not None else machine.PWRON_RESET
+
+    sdcard = os.path.abspath(sdcard) if sdcard else tempfile.mkdtemp(prefix="ecoeye-sdcard-")
+    os.makedirs(sdcard, exist_ok=True)
+    os.chdir(sdcard)
+
+    import config.settings as cfg
+    for key, value in (settings or {}).items():
+        if not hasattr(cfg, key):
+            raise KeyError(f"unknown setting {key}")
+        setattr(cfg, key, value)
+
+    import tf
+    if os.path.exists(cfg.LABELS_PATH):
+        with open(cfg.LABELS_PATH) as f:
+            tf.classes = max(1, len([line for line in f if line.strip()]))
+
+    from logging.session import Session
+    Session.SDCARD = sdcard
+    return sdcard
+
+
+def run(app):
+    """
+    Run `app.run()` until the frame source is exhausted or the board goes to deep sleep.
+
+    :return: "frames" or "standby", whichever ended the run.
+    """
+    import _host
+    try:
+        app.run()
+    except _host.EndOfFrames:
+        return "frames"
+    except _host.Standby:
+        return "standby"
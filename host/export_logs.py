@@ -0,0 +1,135 @@
+"""
+Convert the binary logs written with LOG_FORMAT = "binary" (images.bin, detections.bin)
+to the images.csv / detections.csv layout of the CSV loggers.
+
+    python host/export_logs.py SESSION_FOLDER [-o OUTPUT_FOLDER]
+    python host/export_logs.py path/to/detections.bin -o detections.csv
+
+Records are streamed, so files of long deployments are converted in constant memory.
+"""
+import argparse
+import os
+import struct
+import sys
+
+MAGIC = b"ECOLOG"
+HAS_BLOB = 1
+HAS_CLASS = 2
+BLOB_VALUES = 19
+CHUNK_RECORDS = 4096
+
+
+def read_header(file):
+    """
+    :return: (kind, struct format, column names, label table, labels per record (0: all))
+    """
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{file.name}: not an ecoEye binary log")
+    version, length = struct.unpack("<BH", file.read(3))
+    if version not in (1, 2):
+        raise ValueError(f"{file.name}: unsupported version {version}")
+    items = file.read(length).decode().split("\n")
+    kind, record_format, columns, labels = items[:4]
+    top_k = int(items[4]) if version >= 2 else 0  # version 1: every label of the table
+    return kind, record_format, columns.split(","), labels.split(";") if labels else [], top_k
+
+
+def records(file, record_format):
+    size = struct.calcsize(record_format)
+    while True:
+        chunk = file.read(size * CHUNK_RECORDS)
+        if not chunk:
+            return
+        usable = len(chunk) - len(chunk) % size  # a brown-out can leave a truncated last record
+        yield from struct.iter_unpack(record_format, chunk[:usable])
+        if usable < len(chunk):
+            return
+
+
+def _number(value):
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else f"{value:.6g}"
+    return str(value)
+
+
+def image_row(record, labels, columns, top_k):
+    picture_id, year, month, day, hours, minutes, seconds, exposure_us, gain_db, fps, image_type = record[:11]
+    roi = record[11:15]
+    row = [str(picture_id), f"{year}-{month}-{day}-{hours}-{minutes}-{seconds}", str(exposure_us),
+           _number(gain_db), _number(fps), "" if image_type == -1 else str(image_type)]
+    if roi[2] != -1:
+        row += [str(v) for v in roi]
+    return row
+
+
+def detection_row(record, labels, columns, top_k):
+    # id columns before the flags: detection_id, picture_id (, track_id in the logs of the first tracking version)
+    ids = columns.index("blob_pixels")
+    # track_id as last column (and field, after the rect); logs written before tracking do not have it
+    tracked = columns[-1] == "track_id"
+    rect = record[-5:-1] if tracked else record[-4:]
+    row = [str(record[0]), str(record[1])]
+    if ids > 2:
+        row.append(str(record[2]) if record[2] else "NA")
+    flags = record[ids]
+    blob_fields = ids + 1 + BLOB_VALUES
+    if flags & HAS_BLOB:
+        row += [_number(v) for v in record[ids + 1:blob_fields]]
+    else:
+        row += ["NA"] * BLOB_VALUES
+    if flags & HAS_CLASS:
+        # like the CSV logger: the labels set in the record, by decreasing confidence (lowest index first), top_k of them
+        confidences = record[blob_fields:blob_fields + len(labels)]
+        ranked = sorted((i for i, c in enumerate(confidences) if c), key=lambda i: (-confidences[i], i))
+        if top_k > 0:
+            ranked = ranked[:top_k]
+        row += [";".join(labels[i] for i in ranked), ";".join(_number(round(confidences[i] / 255, 4)) for i in ranked)]
+        row += [str(v) for v in rect]
+    elif tracked:
+        row += ["NA"] * 6
+    if tracked:
+        row.append(str(record[-1]) if record[-1] else "NA")
+    return row
+
+
+ROW_WRITERS = {"images": image_row, "detections": detection_row}
+
+
+def export(bin_path, csv_path):
+    """
+    Convert one binary log to CSV.
+
+    :return: number of records converted
+    """
+    count = 0
+    with open(bin_path, "rb") as src, open(csv_path, "w") as dst:
+        kind, record_format, columns, labels, top_k = read_header(src)
+        row = ROW_WRITERS[kind]
+        dst.write(",".join(columns) + "\n")
+        for record in records(src, record_format):
+            dst.write(",".join(row(record, labels, columns, top_k)) + "\n")
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="session folder or .bin file")
+    parser.add_argument("-o", "--output", help="output folder (session folder) or .csv file (single file)")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.path):
+        out_dir = args.output or args.path
+        os.makedirs(out_dir, exist_ok=True)
+        pairs = [(os.path.join(args.path, f), os.path.join(out_dir, f[:-4] + ".csv"))
+                 for f in sorted(os.listdir(args.path)) if f.endswith(".bin")]
+    else:
+        pairs = [(args.path, args.output or args.path[:-4] + ".csv")]
+    if not pairs:
+        sys.exit(f"no .bin log in {args.path}")
+    for bin_path, csv_path in pairs:
+        print(f"{bin_path} -> {csv_path}: {export(bin_path, csv_path)} records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Frame sources for the emulated `sensor.snapshot()`.
+
+A source returns RGB888 pixels of the sensor window for each snapshot and raises
+`EndOfFrames` once `limit` frames have been produced.
+"""
+import os
+import numpy as np
+from PIL import Image as PILImage
+
+from _host import EndOfFrames
+
+
+class FrameSource:
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.count = 0
+
+    def next_frame(self, sensor_w, sensor_h, window):
+        if self.limit is not None and self.count >= self.limit:
+            raise EndOfFrames()
+        px = self.render(self.count, sensor_w, sensor_h, window)
+        self.count += 1
+        return px
+
+    def render(self, index, sensor_w, sensor_h, window):
+        raise NotImplementedError
+
+
+class DirectorySource(FrameSource):
+    """
+    JPEG/PNG files of a directory in name order, scaled to the sensor resolution and
+    cropped to the window. Decoded frames are cached so decoding is not part of the
+    measured loop time once every file has been seen (`preload` decodes them upfront).
+    """
+
+    EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+    def __init__(self, path, limit=None, loop=True, preload=False):
+        super().__init__(limit)
+        self.paths = sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(self.EXTENSIONS))
+        if not self.paths:
+            raise ValueError(f"no frames found in {path}")
+        self.loop = loop
+        self.preload = preload
+        self._cache = {}
+
+    def _load(self, i, sensor_w, sensor_h, window):
+        key = (i, sensor_w, sensor_h, window)
+        if key not in self._cache:
+            with PILImage.open(self.paths[i]) as pil:
+                pil = pil.convert("RGB")
+                if pil.size != (sensor_w, sensor_h):
+                    pil = pil.resize((sensor_w, sensor_h), PILImage.BILINEAR)
+                x, y, w, h = window
+                self._cache[key] = np.asarray(pil)[y:y + h, x:x + w].copy()
+        return self._cache[key]
+
+    def render(self, index, sensor_w, sensor_h, window):
+        if self.preload and not self._cache:
+            for i in range(len(self.paths)):
+                self._load(i, sensor_w, sensor_h, window)
+        if index >= len(self.paths) and not self.loop:
+            raise EndOfFrames()
+        return self._load(index % len(self.paths), sensor_w, sensor_h, window)
+
+
+class SyntheticSource(FrameSource):
+    """
+    Reproducible scene: a textured static background with low sensor noise, and a dark
+    "animal" that periodically enters, moves, stays still, then leaves.
+
+    Per `period` frames: `[0, enter)` empty, `[enter, stop)` moving, `[stop, leave)` still,
+    `[leave, period)` empty again.
+
+    `animals` animals move along parallel paths at the same time (frames with several blobs).
+
+    Harder scenes: `drift` makes the whole scene brightness oscillate by +-drift (light
+    changes, automatic exposure) over `drift_period` frames, `clutter` adds noise of +-clutter
+    in a band of the scene, changing every frame (foliage moved by the wind, water).
+    """
+
+    NOISE_FIELDS = 4
+
+    def __init__(self, limit=None, seed=0, period=60, enter=20, stop=35, leave=50, size_ratio=0.1, noise=1,
+                 drift=0, drift_period=100, clutter=0, animals=1):
+        super().__init__(limit)
+        self.seed = seed
+        self.period = period
+        self.enter = enter
+        self.stop = stop
+        self.leave = leave
+        self.size_ratio = size_ratio
+        self.noise = noise
+        self.drift = drift
+        self.drift_period = drift_period
+        self.clutter = clutter
+        self.animals = animals
+        self._backgrounds = None
+        self._window = None
+
+    def _prepare(self, w, h):
+        rng = np.random.default_rng(self.seed)
+        yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+        base = np.stack([
+            90 + 40 * np.sin(xx / 37.0) * np.cos(yy / 53.0),
+            120 + 30 * np.sin((xx + yy) / 71.0),
+            70 + 25 * np.cos(xx / 29.0 - yy / 41.0),
+        ], axis=-1)
+        self._backgrounds = []
+        for _ in range(self.NOISE_FIELDS):
+            noisy = base + rng.integers(-self.noise, self.noise + 1, size=base.shape)
+            self._backgrounds.append(np.clip(noisy, 0, 255).astype(np.uint8))
+        side = max(8, int(min(w, h) * self.size_ratio))
+        yy, xx = np.mgrid[0:side, 0:side].astype(np.float32)
+        pattern = 30 + 20 * np.sin(xx / 5.0) * np.sin(yy / 7.0)
+        self._animal = np.repeat(pattern[..., None], 3, axis=2).astype(np.uint8)
+        self._clutter = []
+        if self.clutter:
+            band = (h // 8, w)
+            for _ in range(self.NOISE_FIELDS * 2 - 1):
+                self._clutter.append(rng.integers(-self.clutter, self.clutter + 1, size=band + (1,)).astype(np.int16))
+
+    def animal_rect(self, index, w, h, animal=0):
+        """(x, y, w, h) of the animal in frame `index`, None when the scene is empty."""
+        phase = index % self.period
+        if phase < self.enter or phase >= self.leave:
+            return None
+        side = self._animal.shape[0]
+        progress = min(phase, self.stop) - self.enter
+        span = max(1, self.stop - self.enter)
+        x = int((w - side) * (0.2 + 0.6 * progress / span))
+        y = int((h - side) * ((0.3 + 0.2 * progress / span + 0.35 * animal) % 0.9))
+        return (x, y, side, side)
+
+    def animal_rects(self, index, w, h):
+        """Rectangles of all the animals in frame `index`."""
+        rects = [self.animal_rect(index, w, h, animal) for animal in range(self.animals)]
+        return [rect for rect in rects if rect]
+
+    def render(self, index, sensor_w, sensor_h, window):
+        x0, y0, w, h = window
+        if self._backgrounds is None or self._window != (w, h):
+            self._prepare(w, h)
+            self._window = (w, h)
+        px = self._backgrounds[index % self.NOISE_FIELDS].copy()
+        if self._clutter:
+            band = px[h - h // 8:]
+            noise = self._clutter[index % len(self._clutter)]
+            band[:] = np.clip(band.astype(np.int16) + noise, 0, 255)
+        if self.drift:
+            shift = int(round(self.drift * np.sin(2 * np.pi * index / self.drift_period)))
+            px = np.clip(px.astype(np.int16) + shift, 0, 255).astype(np.uint8)
+        for x, y, side, _ in self.animal_rects(index, w, h):
+            px[y:y + side, x:x + side] = self._animal
+        return px
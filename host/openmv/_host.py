@@ -0,0 +1,132 @@
+"""
+Shared state of the host stand-in modules (virtual clock, reset cause, frame source).
+
+Not an OpenMV module: imported by the fake `pyb`, `machine`, `sensor`, `time`
+helpers so that they all agree on the same emulated board.
+"""
+import os as _os
+import time as _time
+
+
+class Standby(BaseException):
+    """
+    Raised by `pyb.standby()`: on the board the script stops and the MCU resets.
+    Derives from BaseException so the application's `except Exception` does not swallow it.
+    """
+
+    def __init__(self, wakeup_ms=None):
+        super().__init__(wakeup_ms)
+        self.wakeup_ms = wakeup_ms
+
+
+class EndOfFrames(BaseException):
+    """
+    Raised by `sensor.snapshot()` when the frame source is exhausted.
+    """
+
+
+class VirtualClock:
+    """
+    Board clock: real elapsed time plus time that would have been spent waiting.
+
+    Compute time is measured for real (so frame rates reflect the host CPU cost),
+    while delays, frame skips, exposure waits and sleeps only advance the clock.
+    """
+
+    def __init__(self):
+        self._start_ns = _time.perf_counter_ns()
+        self._offset_us = 0
+
+    def us(self) -> int:
+        return (_time.perf_counter_ns() - self._start_ns) // 1000 + self._offset_us
+
+    def ms(self) -> int:
+        return self.us() // 1000
+
+    def advance_ms(self, ms):
+        if ms and ms > 0:
+            self._offset_us += int(ms * 1000)
+
+    def reset(self):
+        self.__init__()
+
+
+clock = VirtualClock()
+
+# machine.reset_cause() value, set by the emulator to simulate deep sleep wake-ups
+reset_cause = 1
+
+# frame source feeding sensor.snapshot(), see host/frames.py
+frame_source = None
+
+# time advanced on each snapshot (simulated sensor readout), 0: compute bound
+frame_period_ms = 0
+
+# RTC: epoch seconds set through pyb.RTC().datetime(...) and clock value at that moment
+rtc_epoch = None
+rtc_set_us = 0
+
+# last requested RTC wakeup (ms) and standby count, inspected by host tools
+rtc_wakeup_ms = None
+standby_count = 0
+
+# free bytes of the emulated MicroPython heap (gc.mem_free()), models loaded with tf.load are taken from it
+heap_free = 4 * 1024 * 1024
+
+
+def rtc_now():
+    """Current emulated epoch seconds."""
+    if rtc_epoch is None:
+        return _time.time()
+    return rtc_epoch + (clock.us() - rtc_set_us) / 1000000
+
+
+class TimeClock:
+    """OpenMV `time.clock()` on the virtual clock."""
+
+    def __init__(self):
+        self._tick_us = clock.us()
+        self._ms = 0
+
+    def tick(self):
+        self._tick_us = clock.us()
+
+    def avg(self):
+        self._ms = (clock.us() - self._tick_us) / 1000
+        return self._ms
+
+    def fps(self):
+        ms = self.avg()
+        return 1000 / ms if ms > 0 else 0.0
+
+
+def install_time():
+    """Add the MicroPython/OpenMV parts of `time` and make `time.localtime()` follow the emulated RTC."""
+    if getattr(_time, "_host_installed", False):
+        return
+    localtime = _time.localtime
+    _time.clock = TimeClock
+    _time.ticks_ms = clock.ms
+    _time.ticks_us = clock.us
+    _time.ticks_diff = lambda end, start: end - start
+    _time.ticks_add = lambda ticks, delta: ticks + delta
+    _time.sleep_ms = clock.advance_ms
+    _time.sleep_us = lambda us: clock.advance_ms(us / 1000)
+    _time.localtime = lambda secs=None: localtime(int(rtc_now()) if secs is None else secs)
+    _time._host_installed = True
+
+
+def install_gc():
+    """Add the MicroPython heap statistics to `gc`."""
+    import gc
+    gc.mem_free = lambda: heap_free
+    gc.mem_alloc = lambda: 0
+
+
+def install_os():
+    """MicroPython `os` semantics the scripts rely on: an empty path is the working directory."""
+    if getattr(_os, "_host_installed", False):
+        return
+    listdir = _os.listdir
+    _os.listdir = lambda path=".": listdir(path or ".")
+    _os._host_installed = True
@@ -0,0 +1,650 @@
+"""
+Host stand-in for the OpenMV `image` module, backed by NumPy (and Pillow for file/JPEG I/O).
+
+Pixel layouts:
+    BINARY    (h, w)    uint8, 0 or 1
+    GRAYSCALE (h, w)    uint8
+    RGB565    (h, w, 3) uint8 RGB888 (LAB conversions go through a RGB565 lookup table like the firmware)
+    JPEG      encoded bytes, plus the pixels it was encoded from so that reads still work
+"""
+import io
+import numpy as np
+from PIL import Image as _PILImage
+
+BINARY = 1
+GRAYSCALE = 2
+RGB565 = 3
+BAYER = 4
+YUV422 = 5
+JPEG = 6
+PNG = 7
+
+AREA = 1
+BILINEAR = 2
+BICUBIC = 4
+CENTER = 8
+SCALE_ASPECT_KEEP = 16
+SCALE_ASPECT_EXPAND = 32
+SCALE_ASPECT_IGNORE = 64
+
+_PIL_FILTERS = {AREA: _PILImage.BOX, BILINEAR: _PILImage.BILINEAR, BICUBIC: _PILImage.BICUBIC}
+
+_lab_lut = None
+
+
+def _lab_table():
+    """(L, A, B) int16 lookup tables indexed by RGB565 value, as done by the firmware."""
+    global _lab_lut
+    if _lab_lut is None:
+        idx = np.arange(65536, dtype=np.uint32)
+        r = ((idx >> 11) & 31) * 255 // 31
+        g = ((idx >> 5) & 63) * 255 // 63
+        b = (idx & 31) * 255 // 31
+        rgb = np.stack([r, g, b], axis=-1) / 255.0
+        rgb = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+        m = np.array([[0.4124, 0.3576, 0.1805],
+                      [0.2126, 0.7152, 0.0722],
+                      [0.0193, 0.1192, 0.9505]])
+        xyz = rgb @ m.T / np.array([0.95047, 1.0, 1.08883])
+        f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16 / 116)
+        l = np.clip(np.round(116 * f[:, 1] - 16), 0, 100)
+        a = np.clip(np.round(500 * (f[:, 0] - f[:, 1])), -128, 127)
+        b_ = np.clip(np.round(200 * (f[:, 1] - f[:, 2])), -128, 127)
+        _lab_lut = (l.astype(np.int16), a.astype(np.int16), b_.astype(np.int16))
+    return _lab_lut
+
+
+def _rgb565_index(px):
+    return ((px[..., 0].astype(np.uint16) >> 3) << 11) | ((px[..., 1].astype(np.uint16) >> 2) << 5) | (px[..., 2] >> 3)
+
+
+def _to_lab(px):
+    l, a, b = _lab_table()
+    idx = _rgb565_index(px)
+    return l[idx], a[idx], b[idx]
+
+
+def _to_gray(px):
+    return ((px[..., 0].astype(np.uint16) * 38 + px[..., 1].astype(np.uint16) * 75 + px[..., 2].astype(np.uint16) * 15) >> 7).astype(np.uint8)
+
+
+def _rect_args(args, kwargs):
+    """Accept draw/roi rects given as (x, y, w, h), a tuple or a Rect-like object."""
+    if len(args) >= 4:
+        return tuple(int(v) for v in args[:4])
+    r = args[0] if args else kwargs.get("rect")
+    if hasattr(r, "x") and not callable(r.x):
+        return (r.x, r.y, r.w, r.h)
+    return tuple(int(v) for v in r)
+
+
+def _binomial(size):
+    k = [1]
+    for _ in range(2 * size):
+        k = [a + b for a, b in zip(k + [0], [0] + k)]
+    return k
+
+
+class blob:
+    """Connected component found by `Image.find_blobs`."""
+
+    def __init__(self, x, y, w, h, pixels, cx, cy, rotation, elongation, code=1, count=1):
+        self._rect = (int(x), int(y), int(w), int(h))
+        self._pixels = int(pixels)
+        self._cx = float(cx)
+        self._cy = float(cy)
+        self._rotation = float(rotation)
+        self._elongation = float(elongation)
+        self._code = code
+        self._count = count
+
+    def rect(self): return self._rect
+    def x(self): return self._rect[0]
+    def y(self): return self._rect[1]
+    def w(self): return self._rect[2]
+    def h(self): return self._rect[3]
+    def pixels(self): return self._pixels
+    def area(self): return self._rect[2] * self._rect[3]
+    def density(self): return self._pixels / max(1, self.area())
+    def cx(self): return int(round(self._cx))
+    def cy(self): return int(round(self._cy))
+    def cxf(self): return self._cx
+    def cyf(self): return self._cy
+    def rotation(self): return self._rotation
+    def elongation(self): return self._elongation
+    def code(self): return self._code
+    def count(self): return self._count
+
+    def corners(self):
+        x, y, w, h = self._rect
+        return [(x, y + h - 1), (x + w - 1, y + h - 1), (x + w - 1, y), (x, y)]
+
+    min_corners = corners
+
+    def __getitem__(self, i):
+        return (self._rect + (self._pixels, self.cx(), self.cy(), self._rotation, self._code, self._count))[i]
+
+    def __repr__(self):
+        x, y, w, h = self._rect
+        return "{\"x\":%d, \"y\":%d, \"w\":%d, \"h\":%d, \"pixels\":%d, \"cx\":%d, \"cy\":%d}" % (x, y, w, h, self._pixels, self.cx(), self.cy())
+
+
+class statistics:
+    """Result of `Image.get_statistics`: per channel mean/median/mode/stdev/min/max/lq/uq."""
+
+    def __init__(self, channels):
+        self._c = [self._channel(c) for c in channels]
+        while len(self._c) < 3:
+            self._c.append(self._c[0] if len(self._c) == 0 else (0,) * 8)
+
+    @staticmethod
+    def _channel(values):
+        if values.size == 0:
+            return (0,) * 8
+        v = np.sort(values.ravel())
+        n = v.size
+        counts = np.bincount(v - v[0])
+        return (int(round(float(v.mean()))), int(v[n // 2]), int(np.argmax(counts) + v[0]),
+                int(round(float(v.std()))), int(v[0]), int(v[-1]), int(v[n // 4]), int(v[(3 * n) // 4]))
+
+    def mean(self): return self._c[0][0]
+    def median(self): return self._c[0][1]
+    def mode(self): return self._c[0][2]
+    def stdev(self): return self._c[0][3]
+    def min(self): return self._c[0][4]
+    def max(self): return self._c[0][5]
+    def lq(self): return self._c[0][6]
+    def uq(self): return self._c[0][7]
+    def l_mean(self): return self._c[0][0]
+    def l_median(self): return self._c[0][1]
+    def l_mode(self): return self._c[0][2]
+    def l_stdev(self): return self._c[0][3]
+    def l_min(self): return self._c[0][4]
+    def l_max(self): return self._c[0][5]
+    def l_lq(self): return self._c[0][6]
+    def l_uq(self): return self._c[0][7]
+    def a_mean(self): return self._c[1][0]
+    def a_median(self): return self._c[1][1]
+    def a_mode(self): return self._c[1][2]
+    def a_stdev(self): return self._c[1][3]
+    def a_min(self): return self._c[1][4]
+    def a_max(self): return self._c[1][5]
+    def a_lq(self): return self._c[1][6]
+    def a_uq(self): return self._c[1][7]
+    def b_mean(self): return self._c[2][0]
+    def b_median(self): return self._c[2][1]
+    def b_mode(self): return self._c[2][2]
+    def b_stdev(self): return self._c[2][3]
+    def b_min(self): return self._c[2][4]
+    def b_max(self): return self._c[2][5]
+    def b_lq(self): return self._c[2][6]
+    def b_uq(self): return self._c[2][7]
+
+
+class Image:
+    """
+    image.Image(path, copy_to_fb=False) or image.Image(width, height, pixformat).
+    """
+
+    def __init__(self, arg, height=None, pixformat=None, buffer=None, copy_to_fb=False):
+        self._buf = None
+        self._px = None
+        self._jpeg = None
+        if isinstance(arg, str):
+            with _PILImage.open(arg) as pil:
+                if pil.mode in ("L", "1"):
+                    self._set(np.asarray(pil.convert("L")), GRAYSCALE)
+                else:
+                    self._set(np.asarray(pil.convert("RGB")), RGB565)
+        elif isinstance(arg, np.ndarray):
+            self._set(arg, height if height else (RGB565 if arg.ndim == 3 else GRAYSCALE))
+        else:
+            self._fmt = pixformat if pixformat else RGB565
+            shape = (height, arg, 3) if self._fmt == RGB565 else (height, arg)
+            self._set(np.zeros(shape, np.uint8), self._fmt)
+
+    # ----- storage -----
+
+    def _set(self, arr, fmt):
+        """Store pixels, writing through the existing buffer when the layout is unchanged."""
+        self._fmt = fmt
+        self._jpeg = None
+        if self._px is not None and self._px.shape == arr.shape:
+            np.copyto(self._px, arr, casting="unsafe")
+            return
+        self._buf = bytearray(arr.size)
+        self._px = np.frombuffer(self._buf, np.uint8).reshape(arr.shape)
+        np.copyto(self._px, arr, casting="unsafe")
+
+    def _raw_format(self):
+        if self._fmt != JPEG:
+            return self._fmt
+        return RGB565 if self._px.ndim == 3 else GRAYSCALE
+
+    def _pixels_of(self, other):
+        """Pixels of another image (or image file) converted to this image's layout."""
+        if isinstance(other, str):
+            other = Image(other)
+        if not isinstance(other, Image):
+            # scalar or color value
+            return np.broadcast_to(self._color(other), self._px.shape).astype(np.uint8)
+        px = other._px
+        if self._px.ndim == 3 and px.ndim == 2:
+            px = np.repeat(px[..., None], 3, axis=2)
+        elif self._px.ndim == 2 and px.ndim == 3:
+            px = _to_gray(px)
+        return px
+
+    def _apply(self, result, mask):
+        if mask is not None:
+            # firmware rule: BINARY pixels are set when non-zero, GRAYSCALE (and RGB565) pixels when brighter than 127
+            if mask._fmt == BINARY:
+                m = mask._px.astype(bool)
+            else:
+                m = (mask._px if mask._px.ndim == 2 else _to_gray(mask._px)) > 127
+            if self._px.ndim == 3:
+                m = m[..., None]
+            result = np.where(m, result, self._px)
+        self._set(result, self._raw_format())
+        return self
+
+    def _roi(self, roi):
+        h, w = self._px.shape[:2]
+        if roi is None:
+            return 0, 0, w, h
+        x, y, rw, rh = _rect_args((roi,), {})
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(w, x + rw), min(h, y + rh)
+        return x0, y0, max(0, x1 - x0), max(0, y1 - y0)
+
+    def _threshold_mask(self, px, thresholds, invert=False):
+        if px.ndim == 3:
+            l, a, b = _to_lab(px)
+        mask = np.zeros(px.shape[:2], bool)
+        for t in thresholds:
+            if px.ndim == 3:
+                t = tuple(t) + (-128, 127, -128, 127)[len(t) - 2:] if len(t) < 6 else t
+                m = ((l >= min(t[0], t[1])) & (l <= max(t[0], t[1]))
+                     & (a >= min(t[2], t[3])) & (a <= max(t[2], t[3]))
+                     & (b >= min(t[4], t[5])) & (b <= max(t[4], t[5])))
+            else:
+                m = (px >= min(t[0], t[1])) & (px <= max(t[0], t[1]))
+            mask |= m
+        return ~mask if invert else mask
+
+    # ----- info -----
+
+    def width(self): return self._px.shape[1]
+    def height(self): return self._px.shape[0]
+    def format(self): return self._fmt
+
+    def size(self):
+        if self._fmt == JPEG:
+            return len(self._jpeg)
+        if self._fmt == RGB565:
+            return self.width() * self.height() * 2
+        return self._px.size
+
+    def bytearray(self):
+        return bytearray(self._jpeg) if self._fmt == JPEG else self._buf
+
+    def to_ndarray(self, dtype="B", buffer=None):
+        return self._px.copy()
+
+    def get_pixel(self, x, y, rgbtuple=None):
+        v = self._px[y, x]
+        return tuple(int(c) for c in v) if self._px.ndim == 3 else int(v)
+
+    def set_pixel(self, x, y, color):
+        self._px[y, x] = color
+        self._jpeg = None if self._fmt != JPEG else self._jpeg
+
+    # ----- conversions -----
+
+    def copy(self, roi=None, x_scale=1.0, y_scale=1.0, x_size=None, y_size=None, hint=0, copy_to_fb=False, **kwargs):
+        x, y, w, h = self._roi(roi)
+        px = self._px[y:y + h, x:x + w]
+        if x_size or y_size:
+            nw = x_size if x_size else int(round(w * y_size / h))
+            nh = y_size if y_size else int(round(h * x_size / w))
+        else:
+            nw, nh = int(round(w * x_scale)), int(round(h * y_scale))
+        if (nw, nh) != (w, h):
+            px = self._resize(px, nw, nh, hint)
+        return Image(px.copy(), self._raw_format())
+
+    crop = copy
+
+    @staticmethod
+    def _resize(px, nw, nh, hint):
+        for flag, flt in _PIL_FILTERS.items():
+            if hint & flag:
+                return np.asarray(_PILImage.fromarray(px).resize((nw, nh), flt))
+        ys = (np.arange(nh) * px.shape[0]) // nh
+        xs = (np.arange(nw) * px.shape[1]) // nw
+        return px[ys][:, xs]
+
+    def scale(self, roi=None, x_scale=1.0, y_scale=1.0, x_size=None, y_size=None, hint=0, **kwargs):
+        self._set(self.copy(roi, x_scale, y_scale, x_size, y_size, hint)._px, self._raw_format())
+        return self
+
+    def to_jpeg(self, quality=90, copy=False, **kwargs):
+        buf = io.BytesIO()
+        _PILImage.fromarray(self._px).save(buf, format="JPEG", quality=quality)
+        target = Image(self._px.copy(), self._raw_format()) if copy else self
+        target._fmt = JPEG
+        target._jpeg = buf.getvalue()
+        return target
+
+    def compress(self, quality=50, **kwargs):
+        return self.to_jpeg(quality=quality)
+
+    def compressed(self, quality=50, **kwargs):
+        return self.to_jpeg(quality=quality, copy=True)
+
+    def to_grayscale(self, copy=False, **kwargs):
+        px = _to_gray(self._px) if self._px.ndim == 3 else self._px.copy()
+        if copy:
+            return Image(px, GRAYSCALE)
+        self._set(px, GRAYSCALE)
+        return self
+
+    def to_rgb565(self, copy=False, **kwargs):
+        px = self._px if self._px.ndim == 3 else np.repeat(self._px[..., None], 3, axis=2)
+        if copy:
+            return Image(px.copy(), RGB565)
+        self._set(px.copy(), RGB565)
+        return self
+
+    def save(self, path, roi=None, quality=50):
+        if self._fmt == JPEG and roi is None and path.lower().endswith((".jpg", ".jpeg")):
+            with open(path, "wb") as f:
+                f.write(self._jpeg)
+            return self
+        px = self.copy(roi=roi)._px if roi else self._px
+        if px.ndim == 2 and self._fmt == BINARY:
+            px = px * 255
+        fmt = "JPEG" if path.lower().endswith((".jpg", ".jpeg")) else ("PNG" if path.lower().endswith(".png") else "BMP")
+        _PILImage.fromarray(px).save(path, format=fmt, quality=quality)
+        return self
+
+    # ----- pixel operations -----
+
+    def clear(self, mask=None):
+        return self._apply(np.zeros_like(self._px), mask)
+
+    def replace(self, other, hmirror=False, vflip=False, transpose=False, mask=None):
+        px = self._pixels_of(other)
+        if mask is None:
+            self._set(px, self._raw_format() if self._px.ndim == px.ndim else other._raw_format())
+            return self
+        return self._apply(px, mask)
+
+    assign = replace
+
+    def difference(self, other, mask=None):
+        px = self._pixels_of(other)
+        return self._apply(np.maximum(self._px, px) - np.minimum(self._px, px), mask)
+
+    def add(self, other, mask=None):
+        px = self._pixels_of(other)
+        return self._apply(np.minimum(self._px.astype(np.uint16) + px, 255), mask)
+
+    def sub(self, other, reverse=False, mask=None):
+        px = self._pixels_of(other).astype(np.int16)
+        res = px - self._px if reverse else self._px - px
+        return self._apply(np.clip(res, 0, 255), mask)
+
+    def max(self, other, mask=None):
+        return self._apply(np.maximum(self._px, self._pixels_of(other)), mask)
+
+    def min(self, other, mask=None):
+        return self._apply(np.minimum(self._px, self._pixels_of(other)), mask)
+
+    def blend(self, other, alpha=128, mask=None):
+        """self = (other * alpha + self * (256 - alpha)) / 256"""
+        px = self._pixels_of(other).astype(np.uint32)
+        res = (px * alpha + self._px.astype(np.uint32) * (256 - alpha)) >> 8
+        return self._apply(res, mask)
+
+    def gaussian(self, size, unsharp=False, mul=None, add=0.0, threshold=False, offset=0, invert=False, mask=None):
+        k = _binomial(size)
+        r = size
+        out = self._px.astype(np.uint32)
+        for axis in (0, 1):
+            pad = [(0, 0)] * out.ndim
+            pad[axis] = (r, r)
+            p = np.pad(out, pad, mode="edge")
+            acc = np.zeros(out.shape, np.uint32)
+            n = out.shape[axis]
+            for i, c in enumerate(k):
+                sl = [slice(None)] * out.ndim
+                sl[axis] = slice(i, i + n)
+                acc += c * p[tuple(sl)]
+            out = acc
+        total = sum(k) ** 2
+        return self._apply((out + total // 2) // total, mask)
+
+    def binary(self, thresholds, invert=False, zero=False, mask=None, to_bitmap=False, copy=False):
+        m = self._threshold_mask(self._px, thresholds, invert)
+        if to_bitmap:
+            res = Image(m.astype(np.uint8), BINARY)
+        elif zero:
+            res = Image(np.where(m[..., None] if self._px.ndim == 3 else m, 0, self._px).astype(np.uint8), self._raw_format())
+        else:
+            res = Image(np.where(m[..., None] if self._px.ndim == 3 else m, 255, 0).astype(np.uint8), self._raw_format())
+        if copy or to_bitmap:
+            return res
+        return self._apply(res._px, mask)
+
+    def mean_pool(self, x_div, y_div):
+        self._set(self._mean_pool(x_div, y_div), self._raw_format())
+        return self
+
+    def mean_pooled(self, x_div, y_div):
+        return Image(self._mean_pool(x_div, y_div), self._raw_format())
+
+    def _mean_pool(self, x_div, y_div):
+        h, w = self._px.shape[:2]
+        nh, nw = h // y_div, w // x_div
+        px = self._px[:nh * y_div, :nw * x_div]
+        px = px.reshape((nh, y_div, nw, x_div) + px.shape[2:])
+        return (px.sum(axis=3, dtype=np.uint32).sum(axis=1) // (x_div * y_div)).astype(np.uint8)
+
+    # ----- drawing -----
+
+    def _color(self, color):
+        if self._px.ndim == 3:
+            if isinstance(color, (tuple, list)):
+                return np.array(color[:3], np.uint8)
+            return np.array((color, color, color), np.uint8)
+        if isinstance(color, (tuple, list)):
+            return int(_to_gray(np.array(color[:3], np.uint8)))
+        return 1 if self._fmt == BINARY and color else color
+
+    def draw_rectangle(self, *args, color=(255, 255, 255), thickness=1, fill=False, **kwargs):
+        x, y, w, h = _rect_args(args, kwargs)
+        c = self._color(color)
+        ih, iw = self._px.shape[:2]
+        x0, y0, x1, y1 = max(0, x), max(0, y), min(iw, x + w), min(ih, y + h)
+        if x1 <= x0 or y1 <= y0:
+            return self
+        if fill:
+            self._px[y0:y1, x0:x1] = c
+        else:
+            t = thickness
+            self._px[y0:min(y1, y0 + t), x0:x1] = c
+            self._px[max(y0, y1 - t):y1, x0:x1] = c
+            self._px[y0:y1, x0:min(x1, x0 + t)] = c
+            self._px[y0:y1, max(x0, x1 - t):x1] = c
+        return self
+
+    def draw_image(self, image, x=0, y=0, x_scale=1.0, y_scale=1.0, roi=None, alpha=256, hint=0, mask=None, **kwargs):
+        """Draw (scaled, format converted) `image` at x, y."""
+        rx, ry, rw, rh = image._roi(roi)
+        nw, nh = int(round(rw * x_scale)), int(round(rh * y_scale))
+        px = image._px[ry:ry + rh, rx:rx + rw]
+        if (nw, nh) != (rw, rh):
+            px = self._resize(px, nw, nh, hint)
+        src = Image(px, image._raw_format())
+        px = self._pixels_of(src)
+        ih, iw = self._px.shape[:2]
+        x0, y0, x1, y1 = max(0, x), max(0, y), min(iw, x + nw), min(ih, y + nh)
+        if x1 <= x0 or y1 <= y0:
+            return self
+        px = px[y0 - y:y1 - y, x0 - x:x1 - x]
+        if alpha < 256:
+            px = (px.astype(np.uint32) * alpha + self._px[y0:y1, x0:x1].astype(np.uint32) * (256 - alpha)) >> 8
+        self._px[y0:y1, x0:x1] = px
+        self._jpeg = None if self._fmt != JPEG else self._jpeg
+        return self
+
+    def draw_line(self, x0, y0, x1, y1, color=(255, 255, 255), thickness=1):
+        n = max(abs(x1 - x0), abs(y1 - y0), 1)
+        xs = np.clip(np.linspace(x0, x1, n + 1).round().astype(int), 0, self.width() - 1)
+        ys = np.clip(np.linspace(y0, y1, n + 1).round().astype(int), 0, self.height() - 1)
+        self._px[ys, xs] = self._color(color)
+        return self
+
+    def draw_edges(self, corners, color=(255, 255, 255), size=1, thickness=1, fill=False):
+        for i in range(len(corners)):
+            (x0, y0), (x1, y1) = corners[i], corners[(i + 1) % len(corners)]
+            self.draw_line(x0, y0, x1, y1, color, thickness)
+        return self
+
+    def draw_string(self, x, y, text, color=(255, 255, 255), scale=1, **kwargs):
+        return self
+
+    def draw_cross(self, x, y, color=(255, 255, 255), size=5, thickness=1):
+        self.draw_line(x - size, y, x + size, y, color)
+        self.draw_line(x, y - size, x, y + size, color)
+        return self
+
+    # ----- analysis -----
+
+    def get_statistics(self, thresholds=None, invert=False, roi=None, bins=None, l_bins=None, a_bins=None, b_bins=None, difference=None):
+        x, y, w, h = self._roi(roi)
+        px = self._px[y:y + h, x:x + w]
+        mask = self._threshold_mask(px, thresholds, invert) if thresholds else None
+        if px.ndim == 3:
+            channels = _to_lab(px)
+        else:
+            channels = (px.astype(np.int16),)
+        if mask is not None:
+            channels = [c[mask] for c in channels]
+        return statistics(channels)
+
+    get_stats = get_statistics
+    statistics = get_statistics
+
+    def find_blobs(self, thresholds, invert=False, roi=None, x_stride=2, y_stride=1, area_threshold=10,
+                   pixels_threshold=10, merge=False, margin=0, threshold_cb=None, merge_cb=None, **kwargs):
+        x, y, w, h = self._roi(roi)
+        mask = self._threshold_mask(self._px[y:y + h, x:x + w], thresholds, invert)
+        blobs = [b for b in _components(mask, x, y)
+                 if b.pixels() >= pixels_threshold and b.area() >= area_threshold]
+        if merge:
+            blobs = _merge_blobs(blobs, margin)
+        if threshold_cb:
+            blobs = [b for b in blobs if threshold_cb(self, b)]
+        return blobs
+
+
+def _components(mask, ox=0, oy=0):
+    """8-connected components of a boolean mask, labelled on horizontal runs."""
+    h, w = mask.shape
+    m = np.zeros((h, w + 2), np.int8)
+    m[:, 1:-1] = mask
+    d = np.diff(m, axis=1)
+    rows, starts = np.nonzero(d == 1)
+    _, ends = np.nonzero(d == -1)
+    n = rows.size
+    if n == 0:
+        return []
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    first = np.searchsorted(rows, np.arange(h + 1)).tolist()
+    s, e = starts.tolist(), ends.tolist()
+    for r in range(1, h):
+        a0, a1, b1 = first[r - 1], first[r], first[r + 1]
+        i, j = a0, a1
+        while i < a1 and j < b1:
+            if s[i] <= e[j] and s[j] <= e[i]:
+                ri, rj = find(i), find(j)
+                if ri != rj:
+                    parent[max(ri, rj)] = min(ri, rj)
+            if e[i] < e[j]:
+                i += 1
+            else:
+                j += 1
+    roots = np.array([find(i) for i in range(n)])
+    _, labels = np.unique(roots, return_inverse=True)
+    k = labels.max() + 1
+
+    length = (ends - starts).astype(np.float64)
+    sx = (starts + ends - 1) * length / 2
+    sxx = ((ends - 1) * ends * (2 * ends - 1) - (starts - 1) * starts * (2 * starts - 1)) / 6.0
+    ry = rows.astype(np.float64)
+    pixels = np.bincount(labels, length, k)
+    sum_x = np.bincount(labels, sx, k)
+    sum_y = np.bincount(labels, ry * length, k)
+    sum_xx = np.bincount(labels, sxx, k)
+    sum_yy = np.bincount(labels, ry * ry * length, k)
+    sum_xy = np.bincount(labels, ry * sx, k)
+    x0 = np.full(k, w)
+    np.minimum.at(x0, labels, starts)
+    x1 = np.zeros(k, int)
+    np.maximum.at(x1, labels, ends)
+    y0 = np.full(k, h)
+    np.minimum.at(y0, labels, rows)
+    y1 = np.zeros(k, int)
+    np.maximum.at(y1, labels, rows)
+
+    blobs = []
+    for c in range(k):
+        p = pixels[c]
+        cx, cy = sum_x[c] / p, sum_y[c] / p
+        mxx = sum_xx[c] / p - cx * cx
+        myy = sum_yy[c] / p - cy * cy
+        mxy = sum_xy[c] / p - cx * cy
+        common = np.sqrt(max(0.0, (mxx - myy) ** 2 + 4 * mxy * mxy))
+        major, minor = (mxx + myy + common) / 2, (mxx + myy - common) / 2
+        elongation = 1 - np.sqrt(max(minor, 0.0) / major) if major > 0 else 0.0
+        rotation = 0.5 * np.arctan2(2 * mxy, mxx - myy) % np.pi
+        blobs.append(blob(x0[c] + ox, y0[c] + oy, x1[c] - x0[c], y1[c] - y0[c] + 1, p,
+                          cx + ox, cy + oy, rotation, elongation))
+    return blobs
+
+
+def _merge_blobs(blobs, margin):
+    merged = True
+    blobs = list(blobs)
+    while merged:
+        merged = False
+        out = []
+        while blobs:
+            a = blobs.pop()
+            for i, b in enumerate(out):
+                ax, ay, aw, ah = a.rect()
+                bx, by, bw, bh = b.rect()
+                if (ax - margin < bx + bw and bx - margin < ax + aw
+                        and ay - margin < by + bh and by - margin < ay + ah):
+                    x, y = min(ax, bx), min(ay, by)
+                    p = a.pixels() + b.pixels()
+                    out[i] = blob(x, y, max(ax + aw, bx + bw) - x, max(ay + ah, by + bh) - y, p,
+                                  (a.cxf() * a.pixels() + b.cxf() * b.pixels()) / p,
+                                  (a.cyf() * a.pixels() + b.cyf() * b.pixels()) / p,
+                                  a.rotation(), max(a.elongation(), b.elongation()),
+                                  a.code() | b.code(), a.count() + b.count())
+                    merged = True
+                    break
+            else:
+                out.append(a)
+        blobs = out
+    return blobs
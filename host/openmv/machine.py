@@ -0,0 +1,28 @@
+"""
+Host stand-in for the MicroPython `machine` module.
+"""
+import _host
+
+PWRON_RESET = 1
+HARD_RESET = 2
+WDT_RESET = 3
+DEEPSLEEP_RESET = 4
+SOFT_RESET = 5
+
+
+def reset_cause():
+    return _host.reset_cause
+
+
+def reset():
+    raise _host.Standby(0)
+
+
+def freq():
+    return 480000000
+
+
+class SoftI2C:
+
+    def __init__(self, scl=None, sda=None, freq=400000):
+        pass
@@ -0,0 +1,23 @@
+"""
+Host stand-in for the `micropython` module.
+"""
+
+
+def const(value):
+    return value
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def mem_info(verbose=False):
+    pass
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
@@ -0,0 +1,10 @@
+"""
+Host stand-in for the OpenMV `network` module: no WiFi shield is installed.
+"""
+
+
+class WINC:
+    WPA_PSK = 2
+
+    def __init__(self, *args, **kwargs):
+        raise OSError("no WiFi shield on host")
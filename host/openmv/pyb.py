@@ -0,0 +1,168 @@
+"""
+Host stand-in for the OpenMV `pyb` module.
+"""
+import time as _time
+import _host
+
+
+def millis():
+    return _host.clock.ms()
+
+
+def micros():
+    return _host.clock.us()
+
+
+def elapsed_millis(start):
+    return millis() - start
+
+
+def elapsed_micros(start):
+    return micros() - start
+
+
+def delay(ms):
+    _host.clock.advance_ms(ms)
+
+
+def udelay(us):
+    _host.clock.advance_ms(us / 1000)
+
+
+def stop():
+    # light sleep: resumes after the programmed RTC wakeup
+    _host.clock.advance_ms(_host.rtc_wakeup_ms or 0)
+
+
+def standby():
+    # deep sleep: the board resets on wakeup
+    _host.standby_count += 1
+    raise _host.Standby(_host.rtc_wakeup_ms)
+
+
+class LED:
+    _states = {}
+
+    def __init__(self, id):
+        self.id = id
+
+    def on(self):
+        LED._states[self.id] = True
+
+    def off(self):
+        LED._states[self.id] = False
+
+    def toggle(self):
+        LED._states[self.id] = not LED._states.get(self.id, False)
+
+    def intensity(self, value=None):
+        return 255 if LED._states.get(self.id, False) else 0
+
+
+class Pin:
+    IN = 0
+    OUT_PP = 1
+    OUT_OD = 2
+    AF_PP = 3
+    ANALOG = 4
+    PULL_NONE = 0
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, id, mode=IN, pull=PULL_NONE):
+        self.id = id
+        self._value = 1
+
+    def high(self):
+        self._value = 1
+
+    def low(self):
+        self._value = 0
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = int(bool(v))
+
+
+class _TimerChannel:
+
+    def __init__(self):
+        self._percent = 0
+
+    def pulse_width_percent(self, value=None):
+        if value is None:
+            return self._percent
+        self._percent = value
+
+
+class Timer:
+    PWM = 0
+
+    def __init__(self, id, freq=None, **kwargs):
+        self.id = id
+
+    def init(self, **kwargs):
+        pass
+
+    def deinit(self):
+        pass
+
+    def channel(self, channel, mode=None, pin=None, **kwargs):
+        return _TimerChannel()
+
+
+class ExtInt:
+    IRQ_RISING = 0
+    IRQ_FALLING = 1
+    IRQ_RISING_FALLING = 2
+
+    def __init__(self, pin, mode, pull, callback):
+        self.callback = callback
+
+
+class ADC:
+    # raw reading of a ~3.7 V battery through the default (no PMS, no LED) divider
+    value = 3548
+
+    def __init__(self, pin):
+        pass
+
+    def read(self):
+        return ADC.value
+
+
+class ADCAll:
+
+    def __init__(self, resolution, mask=None):
+        pass
+
+    def read_core_temp(self):
+        return 35.0
+
+    def read_core_vbat(self):
+        return 3.3
+
+    def read_core_vref(self):
+        return 1.21
+
+
+class USB_VCP:
+    connected = False
+
+    def isconnected(self):
+        return USB_VCP.connected
+
+
+class RTC:
+
+    def datetime(self, value=None):
+        """(year, month, day, weekday, hours, minutes, seconds, subseconds)"""
+        if value is None:
+            t = _time.localtime(int(_host.rtc_now()))
+            return (t[0], t[1], t[2], t[6] + 1, t[3], t[4], t[5], 0)
+        _host.rtc_epoch = _time.mktime((value[0], value[1], value[2], value[4], value[5], value[6], 0, 0, -1))
+        _host.rtc_set_us = _host.clock.us()
+
+    def wakeup(self, timeout, callback=None):
+        _host.rtc_wakeup_ms = timeout
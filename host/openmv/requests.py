@@ -0,0 +1,11 @@
+"""
+Host stand-in for the OpenMV `requests` (urequests) module: there is no network on the emulated board.
+"""
+
+
+def post(url, **kwargs):
+    raise OSError("no network on host")
+
+
+def get(url, **kwargs):
+    raise OSError("no network on host")
@@ -0,0 +1,154 @@
+"""
+Host stand-in for the OpenMV `sensor` module. Frames come from `_host.frame_source`.
+"""
+import _host
+import image
+
+BINARY = image.BINARY
+GRAYSCALE = image.GRAYSCALE
+RGB565 = image.RGB565
+BAYER = image.BAYER
+YUV422 = image.YUV422
+JPEG = image.JPEG
+
+QQVGA = 0
+QVGA = 1
+VGA = 2
+HD = 3
+FHD = 4
+QHD = 5
+QXGA = 6
+WQXGA = 7
+WQXGA2 = 8
+B64X64 = 9
+B128X128 = 10
+B240X240 = 11
+
+_FRAMESIZES = {
+    QQVGA: (160, 120), QVGA: (320, 240), VGA: (640, 480), HD: (1280, 720),
+    FHD: (1920, 1080), QHD: (2560, 1440), QXGA: (2048, 1536), WQXGA: (2560, 1600),
+    WQXGA2: (2592, 1944), B64X64: (64, 64), B128X128: (128, 128), B240X240: (240, 240),
+}
+
+_pixformat = RGB565
+_framesize = QVGA
+_window = None
+_exposure_us = 10000
+_gain_db = 10.0
+_auto_exposure = True
+_auto_gain = True
+_extra_fbs = []
+
+
+def reset():
+    global _pixformat, _framesize, _window
+    _pixformat, _framesize, _window = RGB565, QVGA, None
+    dealloc_extra_fb()
+
+
+def set_pixformat(pixformat):
+    global _pixformat
+    _pixformat = pixformat
+
+
+def get_pixformat():
+    return _pixformat
+
+
+def set_framesize(framesize):
+    global _framesize, _window
+    _framesize = framesize
+    _window = None
+
+
+def get_framesize():
+    return _framesize
+
+
+def set_windowing(*roi):
+    global _window
+    _window = tuple(roi[0]) if len(roi) == 1 else tuple(roi)
+    if len(_window) == 2:
+        w, h = _FRAMESIZES[_framesize]
+        _window = ((w - _window[0]) // 2, (h - _window[1]) // 2, _window[0], _window[1])
+
+
+def get_windowing():
+    return _window if _window else (0, 0) + _FRAMESIZES[_framesize]
+
+
+def width():
+    return _window[2] if _window else _FRAMESIZES[_framesize][0]
+
+
+def height():
+    return _window[3] if _window else _FRAMESIZES[_framesize][1]
+
+
+def set_framebuffers(count):
+    pass
+
+
+def set_auto_whitebal(enable, rgb_gain_db=None):
+    pass
+
+
+def set_auto_exposure(enable, exposure_us=None):
+    global _auto_exposure, _exposure_us
+    _auto_exposure = enable
+    if exposure_us is not None:
+        _exposure_us = int(exposure_us)
+
+
+def set_auto_gain(enable, gain_db=None, gain_db_ceiling=None):
+    global _auto_gain, _gain_db
+    _auto_gain = enable
+    if gain_db is not None:
+        _gain_db = float(gain_db)
+
+
+def get_exposure_us():
+    return _exposure_us
+
+
+def get_gain_db():
+    return _gain_db
+
+
+def skip_frames(n=None, time=None):
+    if time:
+        _host.clock.advance_ms(time)
+    elif n:
+        _host.clock.advance_ms(n * _host.frame_period_ms)
+
+
+def sleep(enable):
+    pass
+
+
+def shutdown(enable):
+    pass
+
+
+def alloc_extra_fb(width, height, pixformat):
+    img = image.Image(width, height, pixformat)
+    _extra_fbs.append(img)
+    return img
+
+
+def dealloc_extra_fb():
+    if _extra_fbs:
+        _extra_fbs.pop()
+
+
+def snapshot():
+    """Next frame of the source, cropped to the sensor window and converted to the pixel format."""
+    if _host.frame_source is None:
+        raise RuntimeError("no frame source: use host.emulator.install(frames=...)")
+    _host.clock.advance_ms(_host.frame_period_ms)
+    w, h = _FRAMESIZES[_framesize]
+    px = _host.frame_source.next_frame(w, h, get_windowing())
+    img = image.Image(px, image.RGB565)
+    if _pixformat == GRAYSCALE:
+        img.to_grayscale()
+    return img
@@ -0,0 +1,153 @@
+"""
+Host stand-in for the OpenMV `tf` module.
+
+There is no TFLite interpreter on the host: the fake network scores each window from its
+darkness (dark textured shapes look like the synthetic "animal"), deterministically, and
+advances the virtual clock by `load_ms` per model load and `inference_ms` per inference
+so that inference-heavy code paths keep their relative cost.
+"""
+import os
+import weakref
+import numpy as np
+import _host
+
+# number of model outputs, set by the emulator from the labels file
+classes = 2
+# simulated costs (ms)
+load_ms = 150
+inference_ms = 40
+# model input resolution
+input_size = 96
+
+# counters inspected by host tools
+loads = 0
+inferences = 0
+
+
+class tf_classification:
+
+    def __init__(self, rect, output):
+        self._rect = rect
+        self._output = output
+
+    def rect(self): return self._rect
+    def x(self): return self._rect[0]
+    def y(self): return self._rect[1]
+    def w(self): return self._rect[2]
+    def h(self): return self._rect[3]
+    def output(self): return self._output
+
+
+class tf_detection:
+
+    def __init__(self, rect, score):
+        self._rect = rect
+        self._score = score
+
+    def rect(self): return self._rect
+    def x(self): return self._rect[0]
+    def y(self): return self._rect[1]
+    def w(self): return self._rect[2]
+    def h(self): return self._rect[3]
+    def output(self): return self._score
+
+    def __getitem__(self, i):
+        return (self._rect + (self._score,))[i]
+
+
+class tf_model:
+
+    def __init__(self, path, load_to_fb=False):
+        global loads
+        self.path = path
+        self.len = os.stat(path)[6] if os.path.exists(path) else 0
+        self.ram = self.len if load_to_fb else 0
+        self.input_height = self.input_width = self.height = self.width = input_size
+        self.input_channels = self.channels = 3
+        self.output_channels = classes
+        loads += 1
+        _host.clock.advance_ms(load_ms)
+
+    def classify(self, img, roi=None, min_scale=1.0, scale_mul=0.5, x_overlap=0, y_overlap=0):
+        return [tf_classification(rect, _scores(img, rect)) for rect in _windows(img, roi, min_scale, scale_mul, x_overlap, y_overlap)]
+
+    def detect(self, img, roi=None, thresholds=((128, 255),), invert=False):
+        global inferences
+        inferences += 1
+        _host.clock.advance_ms(inference_ms)
+        out = [[] for _ in range(classes)]
+        lo = min(t[0] for t in thresholds) / 255
+        gray = img.to_grayscale(copy=True)
+        for b in gray.find_blobs([(0, 60)], roi=roi, pixels_threshold=64, area_threshold=64):
+            score = min(1.0, 0.5 + b.density() / 2)
+            if score >= lo:
+                out[1 % classes].append(tf_detection(b.rect(), score))
+        return out
+
+
+def load(path, load_to_fb=False):
+    """Load a resident model, into the heap unless `load_to_fb` (freed when the model is collected)."""
+    size = os.stat(path)[6]
+    if not load_to_fb:
+        if size > _host.heap_free:
+            raise MemoryError(f"memory allocation failed, allocating {size} bytes")
+        _host.heap_free -= size
+    model = tf_model(path, load_to_fb)
+    if not load_to_fb:
+        weakref.finalize(model, _free, size)
+    return model
+
+
+def _free(size):
+    _host.heap_free += size
+
+
+def classify(model, img, roi=None, min_scale=1.0, scale_mul=0.5, x_overlap=0, y_overlap=0):
+    """Load (when given a path) and run the model on every sliding window."""
+    if isinstance(model, str):
+        model = tf_model(model)
+    return model.classify(img, roi, min_scale, scale_mul, x_overlap, y_overlap)
+
+
+def detect(model, img, roi=None, thresholds=((128, 255),), invert=False):
+    if isinstance(model, str):
+        model = tf_model(model)
+    return model.detect(img, roi, thresholds, invert)
+
+
+def _windows(img, roi, min_scale, scale_mul, x_overlap, y_overlap):
+    """Square sliding windows from scale 1 down to `min_scale`, as done by the firmware."""
+    rx, ry, rw, rh = roi if roi else (0, 0, img.width(), img.height())
+    rects = []
+    scale = 1.0
+    while scale >= min_scale:
+        side = max(1, int(min(rw, rh) * scale))
+        x_step = max(1, int(side * (1 - x_overlap))) if x_overlap > 0 else side
+        y_step = max(1, int(side * (1 - y_overlap))) if y_overlap > 0 else side
+        for y in range(ry, ry + rh - side + 1, y_step):
+            for x in range(rx, rx + rw - side + 1, x_step):
+                rects.append((x, y, side, side))
+        if scale_mul <= 0 or scale_mul >= 1:
+            break
+        scale *= scale_mul
+    return rects
+
+
+def _scores(img, rect):
+    global inferences
+    inferences += 1
+    _host.clock.advance_ms(inference_ms)
+    x, y, w, h = rect
+    px = img._px[y:y + h, x:x + w]
+    step = max(1, min(w, h) // input_size)
+    px = px[::step, ::step]
+    gray = px.mean(axis=2) if px.ndim == 3 else px
+    darkness = float(np.clip((75.0 - gray).mean() / 45.0 + (gray < 60).mean(), 0.0, 1.0))
+    out = [0.0] * classes
+    if classes == 1:
+        out[0] = darkness
+        return out
+    target = 1 + (x // max(1, w) + y // max(1, h)) % (classes - 1) if classes > 2 else 1
+    out[0] = round(1.0 - darkness, 4)
+    out[target] = round(darkness, 4)
+    return out
@@ -62,7 +62,8 @@ SENSOR_PIXFORMAT = sensor.RGB565
 # incl default: save all picture
 # incl trigger: save image-change-triggered pictures
 # incl detection: save images with model-detected patterns
-IMG_SAVE_FILTER = None if MODE == Mode.LIVE_VIEW else [ImageType.TRIGGER, ImageType.DETECTION]
+# incl difference: save frame difference images, selected by DIFF_SAVE_POLICY (see FRAME DIFFERENCING)
+IMG_SAVE_FILTER = None if MODE == Mode.LIVE_VIEW else [ImageType.TRIGGER, ImageType.DETECTION, ImageType.DIFFERENCE]
 # _____ windowing mode only parameters _____
 #whether to digitally zoom into image
 USE_SENSOR_WINDOWING = True
@@ -72,6 +73,9 @@ WIN_RECT = Rect(960,0,1600,1600)
 # _____ advanced settings _____
 #wether to control number of frame buffers or not (<1)
 NB_SENSOR_FRAMEBUFFERS = 1
+#number of pictures per subfolder of the image folders (e.g. jpegs/img/0001/1234.jpg for 1000), keeps directories small over long deployments
+#0: all pictures directly in the image folders (e.g. jpegs/img/1234.jpg)
+IMG_FOLDER_SHARD_SIZE = 0
 #set JPEG quality (90: ~1 MB, 95: ~2MB, 100: ~7MB). Hardly discernible improvement above 93
 #0: minimum
 #100: maximum
@@ -153,6 +157,74 @@ BLOBS_CROP_METHOD = BlobExportShape.RECTANGLE
 BACKGROUND_BLEND_LEVEL = 128
 # How long to wait for auto blending frame in reference image (in milliseconds)
 BLEND_TIMEOUT_MS = 10000
+class DiffSavePolicy:
+    """
+    "enum" for difference image saving policies.
+    (py enums not inluded in micropython)
+    """
+    NEVER:int = 0
+    TRIGGER:int = 1
+    EVERY_NTH:int = 2
+    INTERVAL:int = 3
+#which difference images to save (in jpegs/diff, only if IMG_SAVE_FILTER includes ImageType.DIFFERENCE). options:
+#NEVER: do not save difference images
+#TRIGGER: save the difference images containing blobs
+#EVERY_NTH: save every DIFF_SAVE_EVERY_NTH difference image
+#INTERVAL: save at most one difference image every DIFF_SAVE_INTERVAL_MS
+DIFF_SAVE_POLICY = DiffSavePolicy.TRIGGER
+DIFF_SAVE_EVERY_NTH = 100
+DIFF_SAVE_INTERVAL_MS = 10*60*1000
+#downscaling factor of the images on which frame differencing and blob detection run, in grayscale:
+#1: full resolution (in the sensor pixel format)
+#4, 8: decimated 1/4, 1/8 images, much faster and the reference frame buffer is 32, 128 times smaller (RGB565). Blob sizes above stay in full resolution pixels,
+#blob rectangles are scaled back to full resolution for logging, extraction and classification
+FD_DETECTION_SCALE = 1
+#grayscale thresholds of the difference image used instead of BLOB_COLOR_THRESHOLDS when FD_DETECTION_SCALE > 1 (values from 0 to 255)
+BLOB_GRAY_THRESHOLDS = [(0, 5)]
+#background model the images are compared to. options:
+#blend: reference image, replaced by a blend of the reference and the current image after each trigger and every BLEND_TIMEOUT_MS
+#running: running mean and deviation of every pixel (in grayscale, at FD_DETECTION_SCALE), updated with every image by one grey level at most.
+#A pixel changed when it deviates from the mean by more than its running deviation (then BLOB_GRAY_THRESHOLDS apply to the excess).
+#More robust to noise and light changes, can be used with automatic exposure. The reference image is only saved every BLEND_TIMEOUT_MS
+FD_BACKGROUND_MODEL = "blend"
+# _____ running background model only parameters _____
+#running deviation: how many times the usual difference to the mean a pixel must change by to be part of a blob (integer)
+FD_BG_DEVIATION_FACTOR = 3
+#starting and minimum running deviation of every pixel ([0-255])
+FD_BG_INITIAL_DEVIATION = 8
+FD_BG_MIN_DEVIATION = 2
+#whether to leave the areas of the last blobs out of the background updates (blend: blend only the static regions of the image after a trigger,
+#running: do not learn the mean there), so that animals do not leave "ghosts" in the background that trigger again
+FD_MASK_BLOBS = True
+#the areas of the blobs are updated anyway after this number of consecutive masked updates (e.g. an object was moved and stays)
+FD_MAX_MASKED_FRAMES = 50
+#size (in pixels of the difference image) of the tiles of the change map. blobs are only searched around the tiles whose mean difference is outside BLOB_(COLOR/GRAY)_THRESHOLDS,
+#which makes blob detection on quiet scenes much cheaper. should be smaller than the smallest blob (in the difference image, see FD_DETECTION_SCALE)
+#0: search blobs in the whole difference image
+FD_TILE_SIZE = 0
+#whether to keep an uncompressed copy of the frame in a second frame buffer instead of compressing every frame to JPEG before differencing.
+#the copy is only compressed when it is saved (i.e. triggered or kept by IMG_SAVE_FILTER), frames without change are never compressed
+FD_LAZY_JPEG = True
+#whether to follow the blobs across frames (tracks). Each detection is logged with the id of its track (the detection id of the first detection of the track).
+#with blob classification (ML_MODE = BLOB_CLASS), a track is classified once or at intervals (see below), and only its largest crop is saved,
+#when the track ends or after TRACK_CROP_MAX_AGE_MS
+TRACKING_ENABLED = False
+# _____ tracking enabled only parameters _____
+#minimum overlap (intersection over union, [0-1]) of a blob with the previous rectangle of a track to belong to it.
+#blobs not overlapping any track still belong to the nearest track whose size is larger than the distance between their centers
+TRACK_MIN_IOU = 0.2
+#number of consecutive difference images without its blob after which a track ends
+TRACK_MAX_MISSES = 5
+#maximum number of open tracks, the ones missing for the longest time end first
+TRACK_MAX_COUNT = 8
+#how often to classify the blob of a track again (in milliseconds)
+#0: classify each track only once
+TRACK_CLASSIFY_INTERVAL_MS = 60*1000
+#maximum number of classifications of a track (0: no maximum)
+TRACK_MAX_CLASSIFICATIONS = 5
+#maximum time the best crop of an open track stays in memory before it is saved (in milliseconds), e.g. an animal staying in view.
+#a larger crop of the track is then saved again. 0: only save the crop when the track ends (sleep, background reset, track lost)
+TRACK_CROP_MAX_AGE_MS = 60*1000
 
 ### NEURAL NETWORKS ###
 #wether to us neural networks to analyse the image. options:
@@ -180,13 +252,47 @@ MODEL_RES = 320
 THRESHOLD_CONFIDENCE = 0.2
 #define non-target label names to exclude from image classification results
 NON_TARGET_LABELS = "Background"
+#number of labels (with the highest confidences) logged for a classified window or blob (0: all the labels)
+CLASSIFICATION_TOP_K = 3
 # Add more colors if you are detecting more than 7 types of classes at once
 CLASS_COLORS = [(255,0,0),(0,255,0),(255,255,0),(0,0,255),(255,0,255),(0,255,255),(255,255,255)]
 # --- advanced settings
 #minimum image scale for model input
 MIN_IMAGE_SCALE = 1
+#whether to schedule the sliding windows of image classification coarse to fine: starting with the whole image, a window is only divided into the
+#(overlapping) windows of the next scale if its target confidence is above CLASSIFY_REFINE_CONFIDENCE or it overlaps a blob of frame differencing.
+#otherwise, all the windows of every scale down to MIN_IMAGE_SCALE are classified
+CLASSIFY_COARSE_TO_FINE = True
+CLASSIFY_REFINE_CONFIDENCE = 0.1
+#whether to stop classifying an image at the first window above THRESHOLD_CONFIDENCE (only the first detection is logged, no non-maximum suppression).
+#off: every detection is logged, see CLASSIFY_NMS_IOU
+CLASSIFY_EARLY_EXIT = False
+#without early exit: the windows above THRESHOLD_CONFIDENCE whose intersection over union with a window of the same target label
+#and higher confidence is above CLASSIFY_NMS_IOU are not logged (non-maximum suppression, one detection per object). 0: log every window
+CLASSIFY_NMS_IOU = 0.2
+#whether to run image classification and object detection (FRAME_CLASS, OBJECT_DETECT) only on the images with motion:
+#blobs or open tracks of frame differencing, or (without frame differencing) a change between consecutive images (see ML_GATING_THRESHOLD).
+#the other images are classified at most every ML_KEEPALIVE_MS. the number of skipped images is logged in the status file
+ML_MOTION_GATING = True
+ML_KEEPALIVE_MS = 5*60*1000
+# _____ gating without frame differencing only parameters _____
+#side of the tiles (in pixels) whose mean is compared between consecutive images (in grayscale), and minimum change of a tile mean (grey levels [0-255])
+ML_GATING_TILE_SIZE = 32
+ML_GATING_THRESHOLD = 5
 #under which image scale image analysis should be deferred after sunset (with 0.5 overlapping windows in both directions, scale 0.5 takes 8 s, 0.25 takes 40 s, 0.125 takes 3 min)
 THRESHOLD_IMAGE_SCALE_DEFER = 0.5
+#whether to queue the saved images whose analysis is deferred (see THRESHOLD_IMAGE_SCALE_DEFER) on the SD card (deferred.csv of the session folder) and classify them later:
+#when no motion was detected for DEFERRED_IDLE_MS (frame differencing only), and before deep sleep outside operation time
+#(not when the battery is low, nor before the sleeps between pictures of USE_DSLEEP_PIC_DELAY).
+#results are logged in the detections file with the id of the picture. images not saved (see IMG_SAVE_FILTER) are not analysed
+DEFERRED_CLASSIFICATION_ENABLED = True
+DEFERRED_IDLE_MS = 60*1000
+#maximum time spent classifying queued images after a capture when idle, and before deep sleep outside operation time (in milliseconds, at least one image is classified)
+DEFERRED_IDLE_BUDGET_MS = 0
+DEFERRED_SLEEP_BUDGET_MS = 10*60*1000
+#heap memory (in bytes) to keep free after loading the model. The model is loaded once into the heap at startup if it fits,
+#otherwise it is read from the SD card on every inference (much slower)
+ML_HEAP_RESERVE = 512*1024
 
 ### INDICATORS ###
 #wether to show the LED signals and image markings. initialising, waking, sleeping, and regular blinking LED signals, as well as warnings are not affected
@@ -196,6 +302,33 @@ BUSY_LED_INTERVAL_MS = 60*1000
 #how long to turn on active LED
 BUSY_LED_DURATION_MS = 500
 
+### LOGGING ###
+#how many characters of CSV rows (images.csv, detections.csv) to keep in memory before writing them to the SD card in one go.
+#0: write every row immediately (one file open/close per row). Buffered rows are also written when saving the session (e.g. before sleeping)
+#a crash or brown-out loses at most the buffered rows
+CSV_BUFFER_SIZE = 4096
+#maximum time a row stays buffered before being written (in milliseconds)
+CSV_FLUSH_PERIOD_MS = 60*1000
+#format of the image and detection logs. Options:
+#csv: images.csv and detections.csv text files
+#binary: images.bin and detections.bin fixed-width records, a fraction of the size and CPU time. Convert them to the CSV files with host/export_logs.py
+LOG_FORMAT = "csv"
+#period (in milliseconds) at which the session counters (picture and detection ids) are appended to the session journal (session.journal),
+#so that a brown-out does not reuse ids. The buffered log rows are written with every checkpoint, and the counters are also
+#appended before every saved image. session.json is rewritten before sleeping, or after CHECKPOINT_JOURNAL_SIZE journal records
+CHECKPOINT_PERIOD_MS = 10*1000
+CHECKPOINT_JOURNAL_SIZE = 256
+
+### PROFILING ###
+#wether to time each stage of the main loop (snapshot, differencing, blob finding, logging, saving, classifying...). Disabled, it costs a function call per stage
+PROFILER_ENABLED = False
+# _____ profiling enabled only parameters _____
+#how many of the last durations to keep per stage to compute the statistics (min/mean/p95/max)
+PROFILER_BUFFER_SIZE = 128
+#how often to append the statistics to the timings file of the session folder (in milliseconds)
+PROFILER_DUMP_PERIOD_MS = 5*60*1000
+PROFILER_FILENAME = "timings.csv"
+
 ### TIME ###
 #when the camera should work. options:
 #night: during the night (between sunrise and sunset)
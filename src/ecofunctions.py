@@ -1,10 +1,11 @@
 # Functions for EcoNect
 # import libraries
-import machine, pyb, time, network, sensor, os, requests, math
+import machine, pyb, time, sensor, math
 from pyb import Pin, Timer, ExtInt
-# import library for interrupt and allocate buffer memory
-import micropython
+# network, requests (wifi) and micropython (interrupts) are imported by the functions using them,
+# they are not loaded at startup when wifi and the switch are not used
 from hardware.led import *
+import hardware.wake as wake
 ##----- Function description -----#
 ## Reset and initialize the sensor
 ##----- Input arguments -----#
@@ -115,38 +116,6 @@ def expose(exposure_control,exposure_bias_day,exposure_bias_night,gain_bias,expo
         # TODO:possibly turn off LEDs here if it works with subsequent fd function and image capture
     return
 
-# ━━━━━━━━━━ 𝗜𝗠𝗔𝗚𝗘 𝗔𝗡𝗔𝗟𝗬𝗦𝗜𝗦 ━━━━━━━━━━
-# ⚊⚊⚊⚊⚊ Deferred analysis ⚊⚊⚊⚊⚊
-# deferred analysis of images when scale is too small (not working yet)
-# --- Input arguments ---
-# net
-# minimum_image_scale
-# predictions_list
-# --- Output variables ---
-# none
-def deferred_analysis(net,minimum_image_scale,predictions_list):
-    print("Starting deferred analysis of images before sleeping...")
-    #scan jpegs on card
-    os.sync()
-    sensor.dealloc_extra_fb()
-    sensor.dealloc_extra_fb()
-    print("current working dir:",os.getcwd())
-    files=os.listdir("jpegs")
-    jpegs=[files for files in files if "jpg" in files]
-    print(jpegs)
-    #open and classify each jpeg
-    for jpeg in jpegs:
-        print("Loading:",jpeg)
-        img=image.Image("jpegs/picture_1.jpg",copy_to_fb=True)
-        #convert to proper format
-        img.to_rgb565()
-        #img=image.Image("/jpegs/picture_1.jpg"+jpeg,copy_to_fb=True)
-        print("LED on: classifying image", jpeg, "with tensorflow lite...")
-        for obj in tf.classify(net, img, min_scale=minimum_image_scale, scale_mul=0.5, x_overlap=0.5, y_overlap=0.5):
-            with open('detections.csv', 'a') as detectionlog:
-                detectionlog.write(str(jpeg) + ',' + str(predictions_list[1][0]) + ',' + str(predictions_list[1][1]) + ',' + str(obj.rect()[0]) + ',' + str(obj.rect()[1]) + ',' + str(obj.rect()[2]) + ',' + str(obj.rect()[3]) + ',' + str(predictions_list[0][0]) + ',' + str(predictions_list[0][1]) + '\n')
-    return
-
 # ━━━━━━━━━━ 𝗟𝗢𝗪 𝗣𝗢𝗪𝗘𝗥 𝗦𝗟𝗘𝗘𝗣 ━━━━━━━━━━
 # ⚊⚊⚊⚊⚊ light sleep ⚊⚊⚊⚊⚊
 # go to light sleep, resumes script upon wakeup
@@ -213,9 +182,8 @@ def deep_sleep(sleep_time):
     LED_RED_BLINK(200,2)
     # compute deep sleep end time in epoch seconds
     dsleep_wakeup_epoch = time.mktime(time.localtime()) + math.floor(sleep_time/1000)
-    # create deep sleep wakeup file and write epoch seconds as string
-    with open('/sdcard/VAR/dsleepwakeup.txt', 'w') as timelog:
-        timelog.write(str(dsleep_wakeup_epoch))
+    # save the sleep state (ends at wakeup), read by wake.wake_check
+    wake.save_state(dsleep_wakeup_epoch, dsleep_wakeup_epoch, cfg.DEEPSLEEP_DEFAULT_DURATUION_MS)
     # define sleep time and go to sleep
     pyb.RTC().wakeup(math.floor(sleep_time/1000)*1000)
     # put camera into sleep and shut it down
@@ -238,72 +206,34 @@ def deep_sleep(sleep_time):
 # --- Output variables ---
 # none
 def indicator_dsleep(sleep_time):
-    # create deep sleep end time file on the initial sleep time call of tthis function
+    now_epoch = time.mktime(time.localtime())
+    # compute the deep sleep end time on the initial sleep time call of this function
     if(sleep_time > 0):
         # print and blink deep sleep time
         print("Going to deep sleep for ", sleep_time/60000," minutes")
         LED_RED_BLINK(200,2)
         # compute deep sleep end time in epoch seconds
-        dsleep_end_epoch = time.mktime(time.localtime()) + math.floor(sleep_time/1000)
-        # create deep sleep end file and write epoch seconds as string
-        with open('/sdcard/VAR/dsleepend.txt', 'w') as timelog:
-            timelog.write(str(dsleep_end_epoch))
-    else:
-        # get wakeup time from file
-        with open('/sdcard/VAR/dsleepend.txt', 'r') as timefetch:
-            dsleep_end_epoch = eval(timefetch.read())
-
-    # compute deep sleep interval wakeup time in epoch seconds
-    dsleep_wakeup_epoch = time.mktime(time.localtime()) + math.floor(cfg.DEEPSLEEP_DEFAULT_DURATUION_MS/1000)
-    # make sure sleep doesnt surpass the sleep end time
-    if(dsleep_wakeup_epoch > dsleep_end_epoch):
-        nap_time = (dsleep_end_epoch - time.mktime(time.localtime()))*1000
-        dsleep_wakeup_epoch = dsleep_end_epoch
+        dsleep_end_epoch = now_epoch + math.floor(sleep_time/1000)
     else:
-        nap_time = cfg.DEEPSLEEP_DEFAULT_DURATUION_MS
+        # get the end time from the sleep state
+        dsleep_end_epoch = wake.load_state()[1]
 
-    # create deep sleep wakeup file and write deep sleep wakeup epoch
-    with open('/sdcard/VAR/dsleepwakeup.txt', 'w') as timelog:
-        timelog.write(str(dsleep_wakeup_epoch))
-    # define sleep time and go
-    pyb.RTC().wakeup(math.floor(nap_time/1000)*1000)
-    # put camera into sleep and shut it down
-    sensor.sleep(True)
-    sensor.shutdown(True)
-    pyb.standby()
+    # nap until the next interval wakeup (without surpassing the sleep end time), the sleep state is saved for wake.wake_check
+    wake.nap(now_epoch, dsleep_end_epoch, cfg.DEEPSLEEP_DEFAULT_DURATUION_MS)
     # camera is init on wakeup
     return
 
 # ⚊⚊⚊⚊⚊ script start check ⚊⚊⚊⚊⚊
-# for deep sleep script start
+# for deep sleep script start: the intermediate wakeups of an indicator sleep
+# already went back to sleep in wake.wake_check (top of main.py)
 # --- Input arguments ---
 # none
 # --- Output variables ---
 # none
 def start_check():
-    # get the board reset cause
-    if (machine.reset_cause() == machine.DEEPSLEEP_RESET):
+    # get the board reset cause, restore the RTC
+    if wake.wake_check():
         print("Starting script from DEEP SLEEP")
-        # get wakeup time from file
-        with open('/sdcard/VAR/dsleepwakeup.txt', 'r') as timefetch:
-            dsleep_wakeup_epoch = eval(timefetch.read())
-        # check if woke up from indicator sleep, i.e. if dsleepend file exists
-        if('dsleepend.txt' in os.listdir('VAR')):
-            with open('/sdcard/VAR/dsleepend.txt', 'r') as timefetch:
-                dsleep_end_epoch = eval(timefetch.read())
-
-        # epoch seconds to time tuple to rtc tuple
-        dsleep_wakeup_time = time.localtime(dsleep_wakeup_epoch)
-        dsleep_wakeup_rtc = (dsleep_wakeup_time[0], dsleep_wakeup_time[1], dsleep_wakeup_time[2], 1, dsleep_wakeup_time[3], dsleep_wakeup_time[4], dsleep_wakeup_time[5], 0)
-        # initialise and update RTC
-        pyb.RTC().datetime(dsleep_wakeup_rtc)
-
-        # check if end time has not been reached
-        if(dsleep_wakeup_epoch < dsleep_end_epoch):
-            # indicator LED : the white firmware is used as the indicator now
-            #LED_BLUE_BLINK(500,1)
-            # sleep time is zero for interval sleep, indicator is 60s hardcoded
-            indicator_dsleep(0)
     else:
         print("Starting script from POWER ON")
     return
@@ -316,6 +246,7 @@ def start_check():
 # --- Output variables ---
 # wifishield - wifi shield is connected boolean
 def wifishield_isconnnected():
+    import network
     wlan = None
     try:
         wlan = network.WINC()
@@ -345,6 +276,7 @@ def wifishield_isconnnected():
 # --- Output variables ---
 # wifi_connected - wifi is connected boolean
 def wifi_connect(ssid,key):
+    import network
     # create a winc driver object and connect to WiFi shield
     wlan = network.WINC()
     print("Connecting to WiFi")
@@ -375,6 +307,7 @@ def wifi_connect(ssid,key):
 # --- Output variables ---
 # none
 def wifi_disconnect():
+    import network
     network.WINC().disconnect()
     print("Disconnected from WiFi")
     LED_BLUE_OFF()
@@ -396,6 +329,7 @@ def wifi_disconnect():
 # --- Output variables ---
 # data_transferred - data was transferred boolean
 def data_transfer(url, data1, data2=None, data3=None, data4=None):
+    import requests
     headers = {'Content-Type': 'application/json'}
     if (data2 is None and data3 is None and data4 is None):
         data = {'field1':str(data1)}
@@ -432,6 +366,7 @@ def data_transfer(url, data1, data2=None, data3=None, data4=None):
 # --- Output variables ---
 # file_transferred - file was transferred boolean
 def image_transfer(url, img1):
+    import requests
     headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; rv:91.0) Gecko/20100101 Firefox/91.0'}
     files = {'imageFile': ("img.jpg", open(img1, "rb"))}
     # send the file
@@ -460,6 +395,7 @@ def image_transfer(url, img1):
 # --- Output variables ---
 # none
 def switch_init(pin_switch):
+    import micropython
     # allocate memory buffer for interrupt
     micropython.alloc_emergency_exception_buf(100)
     # create global variables so they are used everywhere
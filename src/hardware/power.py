@@ -87,9 +87,10 @@ class PowerManagement:
     BATTERY_LOW_STR = "Battery low - Sleeping"
     AFTER_SUNRISE_DELAY = 30*60*1000 # 30 minutes
 
-    def __init__(self, illumination: Illumination, suntime: Suntime, rtc: Rtc, session: Session|None = None, enabled=cfg.POWER_MANAGEMENT_ENABLED):
+    def __init__(self, illumination: Illumination, suntime: Suntime, rtc: Rtc, session: Session|None = None, enabled=cfg.POWER_MANAGEMENT_ENABLED, on_sleep=None):
         
         self.enabled = enabled
+        self.on_sleep = on_sleep # called before deep sleep, before saving the session
         self.illumination = illumination
         self.suntime = suntime
         self.rtc = rtc
@@ -106,6 +107,17 @@ class PowerManagement:
     def get_battery_voltage(self):
        return self.battery.read_voltage()
 
+    def save_before_sleep(self, low_battery: bool = False, nap: bool = False):
+        """
+        Notify the deep sleep and save the session (data in memory is lost on deep sleep).
+
+        :param low_battery: Whether the camera sleeps because the battery is low.
+        :param nap: Whether it is a short sleep between pictures (USE_DSLEEP_PIC_DELAY).
+        """
+        if self.on_sleep:
+            self.on_sleep(low_battery, nap)
+        self.session.save()
+
     def sleep_if_low_bat(self, print_status=""):
         """
         Put the system to sleep if the battery voltage is below the minimum threshold.
@@ -119,7 +131,7 @@ class PowerManagement:
         if self.battery.is_low(v):
             print(v, PowerManagement.BATTERY_LOW_STR)
             if self.session: 
-                self.session.save()
+                self.save_before_sleep(low_battery=True)
                 self.session.log_status(v, PowerManagement.BATTERY_LOW_STR)
             indicator_dsleep(self.suntime.time_until_sunrise() + PowerManagement.AFTER_SUNRISE_DELAY)
         else:
@@ -141,7 +153,7 @@ class PowerManagement:
                 sleep_time = self.suntime.time_until_sunrise()
             elif (cfg.TIME_COVERAGE == "night"):
                 sleep_time = self.suntime.time_until_sunset()
-            self.session.save()
+            self.save_before_sleep()
             self.session.log_status(self.get_battery_voltage(), "Outside operation time - Sleeping")
             indicator_dsleep(sleep_time)
         
@@ -165,7 +177,7 @@ class PowerManagement:
                 pyb.delay(cfg.PICTURE_DELAY_MS)   
             else:
                 self.illumination.off(no_cooldown=True, message="before deep sleep")
-                self.session.save()
+                self.save_before_sleep(nap=True)
                 self.session.log_status(self.get_battery_voltage(), "Delay loop - Sleeping")
                 # go to sleep until next picture with blinking indicator
                 indicator_dsleep(cfg.PICTURE_DELAY_MS)
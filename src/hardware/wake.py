@@ -0,0 +1,74 @@
+"""
+Deep sleep wake check, run first on every boot (top of main.py).
+Only imports built-in modules: during a long sleep (see ecofunctions.indicator_dsleep) the board wakes up every
+DEEPSLEEP_DEFAULT_DURATUION_MS and goes back to standby from here, without importing or initialising the application.
+"""
+import machine, pyb, struct, time
+
+# compact sleep state, written before every deep sleep
+STATE_PATH = '/sdcard/VAR/dsleep.bin'
+# wakeup epoch (s), sleep end epoch (s), nap duration (ms)
+STATE_FORMAT = '<III'
+# result of the first wake_check of the boot (the RTC is restored once)
+_started_from_sleep = None
+
+
+def save_state(wakeup_epoch: int, end_epoch: int, nap_ms: int):
+    with open(STATE_PATH, 'wb') as file:
+        file.write(struct.pack(STATE_FORMAT, int(wakeup_epoch), int(end_epoch), int(nap_ms)))
+
+
+def load_state():
+    """
+    Returns:
+        (wakeup epoch, sleep end epoch, nap duration in ms), None if there is no (valid) state
+    """
+    try:
+        with open(STATE_PATH, 'rb') as file:
+            data = file.read()
+    except OSError:
+        return None
+    if len(data) != struct.calcsize(STATE_FORMAT):
+        return None
+    return struct.unpack(STATE_FORMAT, data)
+
+
+def set_rtc(epoch: int):
+    """Set the RTC to the epoch seconds (the time of the programmed wakeup, after a deep sleep reset)"""
+    t = time.localtime(epoch)
+    pyb.RTC().datetime((t[0], t[1], t[2], 1, t[3], t[4], t[5], 0))
+
+
+def nap(now_epoch: int, end_epoch: int, nap_ms: int):
+    """
+    Deep sleep for nap_ms, or until end_epoch if sooner. The board resets on wakeup (see wake_check).
+    """
+    wakeup_epoch = min(now_epoch + nap_ms // 1000, end_epoch)
+    save_state(wakeup_epoch, end_epoch, nap_ms)
+    pyb.RTC().wakeup(int(wakeup_epoch - now_epoch) * 1000)
+    # put camera into sleep and shut it down
+    import sensor
+    sensor.sleep(True)
+    sensor.shutdown(True)
+    pyb.standby()
+
+
+def wake_check():
+    """
+    After a deep sleep reset: restore the RTC to the wakeup time, and go back to sleep if the sleep is not over.
+
+    Returns:
+        Whether the board started from deep sleep (and the sleep is over)
+    """
+    global _started_from_sleep
+    if _started_from_sleep is not None:
+        return _started_from_sleep
+    _started_from_sleep = machine.reset_cause() == machine.DEEPSLEEP_RESET
+    state = load_state() if _started_from_sleep else None
+    if state is None:
+        return _started_from_sleep
+    wakeup_epoch, end_epoch, nap_ms = state
+    set_rtc(wakeup_epoch)
+    if wakeup_epoch < end_epoch:
+        nap(wakeup_epoch, end_epoch, nap_ms)
+    return True
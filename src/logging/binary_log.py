@@ -0,0 +1,120 @@
+import pyb
+import struct
+import config.settings as cfg
+from logging.csv import file_exists
+
+class BinaryLog:
+    """
+    A class to handle logs of fixed-width binary records (struct-packed), a compact alternative to Csv.
+
+    File layout:
+        MAGIC (6 bytes), VERSION (uint8), header length (uint16, little endian), header, records...
+    The header is utf-8 text, one item per line: log kind, struct format of a record, comma-separated
+    column names, semicolon-separated label table (may be empty), number of labels set per record
+    (CLASSIFICATION_TOP_K, 0: all the labels; since version 2).
+    host/export_logs.py converts the files back to the CSV layout.
+    """
+
+    MAGIC = b"ECOLOG"
+    VERSION = 2
+
+    def __init__(self, path: str, kind: str, record_format: str, columns, labels=None, top_k: int = 0,
+                 buffer_size: int = cfg.CSV_BUFFER_SIZE, flush_period_ms: int = cfg.CSV_FLUSH_PERIOD_MS,
+                 exists: bool = None):
+        """
+        Initialize the log, writing the header if the file does not exist yet.
+
+        :param path: The path to the log file.
+        :param kind: Kind of records (e.g. "images", "detections").
+        :param record_format: struct format of a record.
+        :param columns: Names of the record fields.
+        :param labels: Label table referenced by the records.
+        :param top_k: Number of labels set per record (0: all the labels).
+        :param buffer_size: Number of buffered bytes above which the buffer is written (0: write every record).
+        :param flush_period_ms: Maximum time a record stays buffered (in milliseconds).
+        :param exists: True if the file is known to exist with its header (e.g. from the session checkpoint),
+            None to probe the file.
+        """
+        self.path = path
+        self.record_format = record_format
+        self.record_size = struct.calcsize(record_format)
+        self.labels = labels if labels else []
+        self.buffer_size = buffer_size
+        self.flush_period_ms = flush_period_ms
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.start_time_flush_ms = pyb.millis()
+
+        if not exists and not file_exists(self.path):
+            header = "\n".join([kind, record_format, ",".join(columns), ";".join(self.labels), str(top_k)]).encode()
+            with open(self.path, 'wb') as file:
+                file.write(BinaryLog.MAGIC + struct.pack("<BH", BinaryLog.VERSION, len(header)) + header)
+        return
+
+    def write_record(self, *values):
+        """
+        Pack and append one record.
+        """
+        record = struct.pack(self.record_format, *values)
+
+        if self.buffer_size <= 0 and not self.buffer:
+            with open(self.path, 'ab') as file:
+                file.write(record)
+            return
+
+        if not self.buffer:
+            self.start_time_flush_ms = pyb.millis()
+        self.buffer.append(record)
+        self.buffered_bytes += self.record_size
+        if (self.buffered_bytes >= self.buffer_size
+            or pyb.elapsed_millis(self.start_time_flush_ms) > self.flush_period_ms):
+            self.flush()
+
+    def read_last(self):
+        """
+        Read the last complete record of the log file.
+
+        Returns:
+            The values of the last record, None if the file has no record
+        """
+        with open(self.path, 'rb') as file:
+            file.seek(len(BinaryLog.MAGIC) + 1)
+            header_length = struct.unpack("<H", file.read(2))[0]
+            start = len(BinaryLog.MAGIC) + 3 + header_length
+            size = file.seek(0, 2)
+            count = (size - start) // self.record_size # a brown-out can leave a truncated last record
+            if count <= 0:
+                return None
+            file.seek(start + (count - 1) * self.record_size)
+            return struct.unpack(self.record_format, file.read(self.record_size))
+
+    def flush(self):
+        """
+        Write the buffered records to the log file.
+        """
+        if self.buffer:
+            with open(self.path, 'ab') as file:
+                file.write(b''.join(self.buffer))
+            self.buffer = []
+            self.buffered_bytes = 0
+        self.start_time_flush_ms = pyb.millis()
+
+    def flush_if_due(self):
+        """
+        Write the buffered records if the oldest one has been buffered for more than flush_period_ms
+        (call periodically: write_record only checks it when a record is added).
+        """
+        if self.buffer and pyb.elapsed_millis(self.start_time_flush_ms) > self.flush_period_ms:
+            self.flush()
+
+
+def read_labels(path: str = cfg.LABELS_PATH):
+    """
+    Read the label table of the model, empty if no model is used or the file is missing.
+    """
+    if cfg.ML_MODE is None:
+        return []
+    try:
+        return [line.rstrip('\n') for line in open(path)]
+    except OSError:
+        return []
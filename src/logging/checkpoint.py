@@ -0,0 +1,115 @@
+import os
+import json
+import struct
+import config.settings as cfg
+
+class Checkpoint:
+    """
+    Crash-safe persistence of the session state (session.json), extended by a journal of its counters.
+
+    The state is written as a snapshot to a temporary file renamed over the previous one, so a brown-out during the
+    write leaves the previous snapshot (or the complete temporary file) readable. Between snapshots, the counters
+    (picture_count, detection_count) are appended to the journal as fixed-width records, a few bytes per checkpoint.
+    Each snapshot has a generation number, written in the journal records: records of an older snapshot are ignored.
+    After journal_size records, the journal is compacted into a new snapshot.
+    """
+
+    # generation, picture_count, detection_count
+    JOURNAL_FORMAT = "<III"
+
+    def __init__(self, path: str, journal_path: str, journal_size: int = cfg.CHECKPOINT_JOURNAL_SIZE):
+        """
+        :param path: The path to the snapshot (JSON) file.
+        :param journal_path: The path to the journal file.
+        :param journal_size: Number of journal records after which the journal is compacted into a snapshot.
+        """
+        self.path = path
+        self.journal_path = journal_path
+        self.journal_size = journal_size
+        self.record_size = struct.calcsize(self.JOURNAL_FORMAT)
+        self.generation = None # generation of the current snapshot, None: not read yet
+        self.journal_records = 0
+        self.data = None # last saved state
+
+    def _read_snapshot(self):
+        """
+        Returns:
+            The state of the snapshot (or of the temporary file if the snapshot is missing), None if neither can be read
+        """
+        for path in (self.path, self.path + ".tmp"):
+            try:
+                with open(path, 'r') as file:
+                    return json.load(file)
+            except (OSError, ValueError):
+                pass
+        return None
+
+    def load(self):
+        """
+        Read the snapshot and apply the journal records of its generation.
+
+        Returns:
+            The state (dict), None if there is no snapshot
+        """
+        data = self._read_snapshot()
+        if data is None:
+            return None
+        self.generation = data.get('generation', 0)
+        self.journal_records = 0
+        try:
+            with open(self.journal_path, 'rb') as file:
+                while True:
+                    record = file.read(self.record_size)
+                    if len(record) < self.record_size: # end, or record truncated by a brown-out
+                        break
+                    generation, picture_count, detection_count = struct.unpack(self.JOURNAL_FORMAT, record)
+                    if generation != self.generation:
+                        continue
+                    self.journal_records += 1
+                    data['picture_count'] = max(data['picture_count'], picture_count)
+                    data['detection_count'] = max(data['detection_count'], detection_count)
+        except OSError:
+            pass
+        self.data = data
+        return data
+
+    def save(self, data: dict):
+        """
+        Write a new snapshot of the state (temporary file, then rename) and start a new journal.
+
+        :param data: The state, with 'picture_count' and 'detection_count' counters.
+        """
+        if self.generation is None:
+            previous = self._read_snapshot()
+            self.generation = previous.get('generation', 0) if previous else 0
+        self.generation += 1
+        data['generation'] = self.generation
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w') as file:
+            json.dump(data, file)
+        os.rename(temp_path, self.path) # replaces the previous snapshot
+        with open(self.journal_path, 'wb'):
+            pass
+        self.journal_records = 0
+        self.data = data
+
+    def record(self, picture_count: int, detection_count: int):
+        """
+        Append the counters to the journal, or write a snapshot if the journal is full.
+        Nothing is written if the counters did not change, or before the first load or save.
+        """
+        data = self.data
+        if data is None:
+            return
+        if self.journal_records >= self.journal_size:
+            data['picture_count'] = picture_count
+            data['detection_count'] = detection_count
+            self.save(data)
+            return
+        if data['picture_count'] == picture_count and data['detection_count'] == detection_count:
+            return
+        with open(self.journal_path, 'ab') as file:
+            file.write(struct.pack(self.JOURNAL_FORMAT, self.generation, picture_count, detection_count))
+        self.journal_records += 1
+        data['picture_count'] = picture_count
+        data['detection_count'] = detection_count
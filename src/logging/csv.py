@@ -1,25 +1,43 @@
 import os
+import pyb
+import config.settings as cfg
+
+def file_exists(path: str):
+    """
+    Existence probe of a single file (os.stat), unlike a listing its cost does not depend on the size of the folder.
+    """
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
 
 class Csv:
     """
     A class to handle CSV file operations.
+    Rows can be buffered in memory and written in batches, see `flush`.
     """
 
-    def __init__(self, path: str, *headers):
+    def __init__(self, path: str, *headers, buffer_size: int = cfg.CSV_BUFFER_SIZE, flush_period_ms: int = cfg.CSV_FLUSH_PERIOD_MS,
+                 exists: bool = None):
         """
         Initialize the Csv object with a filename.
 
         :param filename: The name of the CSV file.
+        :param buffer_size: Number of buffered characters above which the buffer is written (0: write every row).
+        :param flush_period_ms: Maximum time a complete row stays buffered (in milliseconds).
+        :param exists: True if the file is known to exist with its headers (e.g. from the session checkpoint),
+            None to probe the file.
         """
         self.path = path
         # self.headers = headers
+        self.buffer_size = buffer_size
+        self.flush_period_ms = flush_period_ms
+        self.buffer = []
+        self.buffered_chars = 0
+        self.start_time_flush_ms = pyb.millis()
 
-        name = self.path.split('/')[-1]
-        parent_path = self.path[:-(len(name)+1)]
-        # print(f"parent_path: {parent_path}")
-        filenames = os.listdir(parent_path)
-
-        if not name in filenames:
+        if not exists and not file_exists(self.path):
             with open(self.path, 'w') as file:
                 file.write(','.join(headers) + '\n')
         # else: raise Exception(f"Csv file {self.path} already exists.")
@@ -32,21 +50,70 @@ class Csv:
         :param prepend_comma: Whether to prepend a comma before the data.
         :param end_line: Whether to end the line after the data.
         """
-        
-        print(self.path)
+        start = ',' if prepend_comma else ''
+        ending = '\n' if end_line else ''
+        data_str = ','.join([str(d) for d in data]) if data else ''
+        text = start + data_str + ending
+
+        if self.buffer_size <= 0 and not self.buffer:
+            with open(self.path, 'a') as file:
+                file.write(text)
+            return
+
+        if not self.buffer:
+            self.start_time_flush_ms = pyb.millis()
+        self.buffer.append(text)
+        self.buffered_chars += len(text)
+
+        # only write complete rows, a crash then loses at most the buffered rows
+        if end_line and (self.buffered_chars >= self.buffer_size
+                         or pyb.elapsed_millis(self.start_time_flush_ms) > self.flush_period_ms):
+            self.flush()
+        return
 
-        with open(self.path, 'a') as file:
-            start = ',' if prepend_comma else ''
-            ending = '\n' if end_line else ''
-            data_str = ','.join([str(d) for d in data]) if data else ''
-            file.write(start + data_str + ending)
+    def flush(self):
+        """
+        Write the buffered data to the CSV file.
+        """
+        if self.buffer:
+            with open(self.path, 'a') as file:
+                file.write(''.join(self.buffer))
+            self.buffer = []
+            self.buffered_chars = 0
+        self.start_time_flush_ms = pyb.millis()
         return
 
+    def flush_if_due(self):
+        """
+        Write the buffered rows if the oldest one has been buffered for more than flush_period_ms
+        (call periodically: append only checks it when a row is added).
+        """
+        if self.buffer and pyb.elapsed_millis(self.start_time_flush_ms) > self.flush_period_ms:
+            self.flush()
+
+    def read_last(self, max_line_size: int = 1024):
+        """
+        Read the last complete row of the CSV file (without reading the whole file).
+        :param max_line_size: Number of bytes read from the end of the file.
+        :return: The values of the last row, None if the file has no row after the headers.
+        """
+        with open(self.path, 'rb') as file:
+            size = file.seek(0, 2)
+            file.seek(max(0, size - max_line_size))
+            # the last element is empty, or an incomplete row (e.g. cut by a brown-out)
+            lines = file.read().split(b'\n')[:-1]
+        # the first element is the headers, or a row cut by the start of the read
+        lines = lines[1:]
+        if not lines:
+            return None
+        return lines[-1].decode().split(',')
+
     def read(self):
         """
         Read the CSV file and return its contents.
         :return: List of rows in the CSV file.
         """
+        self.flush()
         with open(self.path, 'r') as file:
             lines = file.readlines()
         return [line.strip().split(',') for line in lines]
\ No newline at end of file
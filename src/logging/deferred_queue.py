@@ -0,0 +1,80 @@
+from logging.csv import Csv
+
+class DeferredQueue(Csv):
+    """
+    Persistent queue of the saved images whose classification is deferred, extending the Csv class.
+    Entries are appended to the CSV file, the byte offset of the next entry to process is kept in a second file
+    so the queue survives deep sleep and resets (an entry is processed again if the camera resets while processing it).
+    """
+
+    HEADERS = ("picture_id", "path", "roi_x", "roi_y", "roi_width", "roi_height")
+
+    def __init__(self, path: str, position_path: str, exists: bool = None):
+        """
+        Initialize the queue, resuming at the saved position.
+
+        :param path: The path to the queue CSV file.
+        :param position_path: The path to the file of the position of the next entry.
+        :param exists: True if the queue file is known to exist (skips the probe, see Csv).
+        """
+        super().__init__(path, *DeferredQueue.HEADERS, buffer_size=0, exists=exists)
+        self.position_path = position_path
+        self.position = 0 # byte offset of the next entry, 0: after the header
+        self.next_position = 0
+        self.pending = None # number of entries to process, None: unknown (resumed queue) until it is drained
+        try:
+            with open(self.position_path, 'r') as file:
+                self.position = int(file.read())
+        except (OSError, ValueError):
+            pass
+
+    def append(self, picture_id: int, path: str, roi_rect=None):
+        """
+        Queue the image saved at path.
+
+        :param picture_id: Id of the picture, logged with the results.
+        :param path: Path of the saved image.
+        :param roi_rect: Region of interest (x, y, width, height) of the image, None for the whole image.
+        """
+        roi = roi_rect if roi_rect else ("NA",) * 4
+        super().append(picture_id, path, *roi)
+        if self.pending is not None:
+            self.pending += 1
+
+    def peek(self):
+        """
+        Returns:
+            (picture_id, path, roi_rect) of the next entry to process, None if the queue is empty
+        """
+        with open(self.path, 'rb') as file:
+            if self.position == 0:
+                file.readline() # header
+            else:
+                file.seek(self.position)
+            line = file.readline()
+            self.next_position = file.tell()
+        if not line or not line.endswith(b'\n'):
+            self.pending = 0
+            return None
+        values = line.decode().strip().split(',')
+        roi_rect = None if values[2] == "NA" else tuple(int(v) for v in values[2:6])
+        return int(values[0]), values[1], roi_rect
+
+    def pop(self):
+        """
+        Mark the entry returned by peek as processed.
+        """
+        self.position = self.next_position
+        with open(self.position_path, 'w') as file:
+            file.write(str(self.position))
+        if self.pending:
+            self.pending -= 1
+
+    def has_pending(self):
+        """
+        Whether entries may be waiting, without reading the file once the queue was found empty.
+        """
+        return self.pending != 0
+
+    def is_empty(self):
+        return not self.has_pending() or self.peek() is None
@@ -1,5 +1,29 @@
 # filepath: /home/user/Bureau/stage/projet/src/logging/detection_logger.py
 from logging.csv import Csv
+from logging.binary_log import BinaryLog, read_labels
+import config.settings as cfg
+
+# track_id is the last column, so that the columns of the logs written before tracking keep their positions
+COLUMNS = ("detection_id", "picture_id", 
+           "blob_pixels", "blob_elongation", 
+           "blob_corner1_x", "blob_corner1_y", "blob_corner2_x", "blob_corner2_y", 
+           "blob_corner3_x", "blob_corner3_y", "blob_corner4_x", "blob_corner4_y", 
+           "blob_l_mode", "blob_l_min", "blob_l_max", 
+           "blob_a_mode", "blob_a_min", "blob_a_max", 
+           "blob_b_mode", "blob_b_min", "blob_b_max", 
+           "image_labels", "image_confidences", 
+           "image_x", "image_y", "image_width", "image_height",
+           "track_id")
+
+def get_blob_log_data(blob, color_statistics):
+    return [blob.pixels(), blob.elongation(),
+        blob.corners()[0][0], blob.corners()[0][1], 
+        blob.corners()[1][0], blob.corners()[1][1],
+        blob.corners()[2][0], blob.corners()[2][1], 
+        blob.corners()[3][0], blob.corners()[3][1],
+        color_statistics.l_mode(), color_statistics.l_min(), color_statistics.l_max(),
+        color_statistics.a_mode(), color_statistics.a_min(), color_statistics.a_max(),
+        color_statistics.b_mode(), color_statistics.b_min(), color_statistics.b_max()]
 
 class DetectionLogger(Csv):
     """
@@ -7,64 +31,115 @@ class DetectionLogger(Csv):
     Provides methods for logging blob detections and classification results.
     """
 
-    def __init__(self, path: str, detection_count: int = 0):
+    def __init__(self, path: str, detection_count: int = 0, labels=None, exists: bool = None):
         """
         Initialize the DetectionLogger with a path and required headers.
         
         :param path: The path to the CSV file.
+        :param labels: Label table of the model (read from LABELS_PATH if None).
+        :param exists: True if the file is known to exist (skips the probe, see Csv).
         """
-        super().__init__(path, "detection_id", "picture_id", 
-                        "blob_pixels", "blob_elongation", 
-                        "blob_corner1_x", "blob_corner1_y", "blob_corner2_x", "blob_corner2_y", 
-                        "blob_corner3_x", "blob_corner3_y", "blob_corner4_x", "blob_corner4_y", 
-                        "blob_l_mode", "blob_l_min", "blob_l_max", 
-                        "blob_a_mode", "blob_a_min", "blob_a_max", 
-                        "blob_b_mode", "blob_b_min", "blob_b_max", 
-                        "image_labels", "image_confidences", 
-                        "image_x", "image_y", "image_width", "image_height")
+        super().__init__(path, *COLUMNS, exists=exists)
         
         self.detection_count = detection_count
+        # label names by index, joined per classification without conversion
+        self.labels = read_labels() if labels is None else labels
         
     
     def append(self, picture_id=None, blob=None, color_statistics=None,
-                labels=None, confidences=None,
-                rect=None,
-                prepend_comma=False, end_line=True):
+                classification=None, track_id=None):
         """
-        Append detection data to the log.
+        Append a detection line: a blob (with its classification if any) or a classification alone.
+
+        :param picture_id: Id of the picture (the one of the classification if None).
+        :param classification: Classification of the blob or region, its top labels are logged.
         """
+        if picture_id is None:
+            if classification is None:
+                raise ValueError("Missing parameters.")
+            picture_id = classification.picture_id
         self.detection_count += 1
-        data = [self.detection_count]
-
-        if not picture_id is None:
-            data.append(picture_id)
-        elif not prepend_comma:
-            raise ValueError("Missing parameters.")
+        data = [self.detection_count, picture_id]
 
         if blob and color_statistics:
-            blob_data = self.get_blob_log_data(blob, color_statistics) 
-        elif not prepend_comma:
-            blob_data = ["NA"] * 19
-
-        if blob_data:
-            data += blob_data
-
-        if labels and confidences:
-            if not rect:
-                raise ValueError("Missing parameter rect.")
-            labels_str = ";".join(map(str, labels))
-            confidences_str = ";".join(map(str, confidences))
-            data += [labels_str, confidences_str, rect.x(), rect.y(), rect.w(), rect.h()]
+            data += self.get_blob_log_data(blob, color_statistics)
+        else:
+            data += ["NA"] * 19
+
+        if classification:
+            labels = self.labels
+            rect = classification.rect
+            data += [";".join([labels[i] for i in classification.label_indices]),
+                     ";".join([str(c) for c in classification.confidences]),
+                     rect[0], rect[1], rect[2], rect[3]]
+        else:
+            data += ["NA"] * 6
+        data.append("NA" if track_id is None else track_id)
         
-        super().append(*data, prepend_comma=prepend_comma, end_line=end_line)
+        super().append(*data)
 
 
     def get_blob_log_data(self, blob, color_statistics):
-        return [blob.pixels(), blob.elongation(),
-            blob.corners()[0][0], blob.corners()[0][1], 
-            blob.corners()[1][0], blob.corners()[1][1],
-            blob.corners()[2][0], blob.corners()[2][1], 
-            blob.corners()[3][0], blob.corners()[3][1],
-            color_statistics.l_mode(), color_statistics.l_min(), color_statistics.l_max(),
-            color_statistics.a_mode(), color_statistics.a_min(), color_statistics.a_max(),
-            color_statistics.b_mode(), color_statistics.b_min(), color_statistics.b_max()]
\ No newline at end of file
+        return get_blob_log_data(blob, color_statistics)
+
+
+class BinaryDetectionLogger(BinaryLog):
+    """
+    Same interface as DetectionLogger, writing fixed-width binary records instead of CSV lines.
+    Confidences are stored as uint8 (confidence * 255) for every label of the label table in the header.
+    Record flags: 1 = blob data present, 2 = classification data present. Untracked detections have a track_id of 0.
+    """
+
+    HAS_BLOB = 1
+    HAS_CLASS = 2
+    # detection_id, picture_id, flags, pixels, elongation, 4 corners, L/A/B mode/min/max
+    # (then a confidence per label, the rect and the track_id)
+    BLOB_FORMAT = "<IIBIf8h9b"
+    BLOB_FIELDS = 22
+
+    def __init__(self, path: str, detection_count: int = 0, labels=None, exists: bool = None):
+        """
+        Initialize the BinaryDetectionLogger with a path and the label table.
+
+        :param path: The path to the log file.
+        :param labels: Label table of the model (read from LABELS_PATH if None).
+        :param exists: True if the file is known to exist (skips the probe, see BinaryLog).
+        """
+        if labels is None:
+            labels = read_labels()
+        super().__init__(path, "detections", self.BLOB_FORMAT + str(len(labels)) + "B4hI", COLUMNS, labels,
+                         top_k=cfg.CLASSIFICATION_TOP_K, exists=exists)
+        self.detection_count = detection_count
+        self.record = [0] * (self.BLOB_FIELDS + len(self.labels) + 5)
+
+    def append(self, picture_id=None, blob=None, color_statistics=None,
+                classification=None, track_id=None):
+        """
+        Append a detection record: a blob (with its classification if any) or a classification alone.
+        Only the confidences of the top labels of the classification are set, the others are 0.
+        """
+        record = self.record
+        if picture_id is None:
+            if classification is None:
+                raise ValueError("Missing parameters.")
+            picture_id = classification.picture_id
+        self.detection_count += 1
+        for i in range(len(record)):
+            record[i] = 0
+        record[0] = self.detection_count
+        record[1] = picture_id
+        record[-1] = track_id if track_id else 0
+
+        if blob and color_statistics:
+            record[2] |= self.HAS_BLOB
+            record[3:self.BLOB_FIELDS] = get_blob_log_data(blob, color_statistics)
+
+        if classification:
+            record[2] |= self.HAS_CLASS
+            for index, confidence in zip(classification.label_indices, classification.confidences):
+                if index < len(self.labels):
+                    record[self.BLOB_FIELDS + index] = min(255, int(confidence * 255 + 0.5))
+            rect = classification.rect
+            record[-5:-1] = [rect[0], rect[1], rect[2], rect[3]]
+
+        self.write_record(*record)
@@ -1,21 +1,25 @@
 from logging.csv import Csv
+from logging.binary_log import BinaryLog
 import vision.frame
 
+COLUMNS = ("picture_id", "date_time", 
+           "exposure_us", "gain_dB", "frames_per_second", "image_type", 
+           "roi_x", "roi_y", "roi_width", "roi_height")
+
 class ImageLogger(Csv):
     """
     A class to handle image logging operations, extending the Csv class.
     Provides methods for logging captured images with their metadata.
     """
 
-    def __init__(self, path: str):
+    def __init__(self, path: str, exists: bool = None):
         """
         Initialize the ImageLogger with a path, csv headers and an optional picture count.
         
         :param path: The path to the CSV file.
+        :param exists: True if the file is known to exist (skips the probe, see Csv).
         """
-        super().__init__(path, "picture_id", "date_time", 
-                        "exposure_us", "gain_dB", "frames_per_second", "image_type", 
-                        "roi_x", "roi_y", "roi_width", "roi_height")
+        super().__init__(path, *COLUMNS, exists=exists)
     
     def append(self, frame: vision.frame.Frame):
         """
@@ -33,3 +37,34 @@ class ImageLogger(Csv):
             super().append(frame.id, datetime_str, frame.exposure_us, frame.gain_db, frame.fps, frame.image_type, *frame.roi_rect)
         else:
             super().append(frame.id, datetime_str, frame.exposure_us, frame.gain_db, frame.fps, frame.image_type)
+
+
+class BinaryImageLogger(BinaryLog):
+    """
+    Same interface as ImageLogger, writing fixed-width binary records instead of CSV lines.
+    The capture time is stored as its (year, month, day, hours, minutes, seconds) fields,
+    a missing image type or ROI as -1.
+    """
+
+    # picture_id, year, month, day, hours, minutes, seconds, exposure_us, gain_dB, fps, image_type, roi x/y/w/h
+    RECORD_FORMAT = "<IHBBBBBIffb4h"
+
+    def __init__(self, path: str, exists: bool = None):
+        """
+        Initialize the BinaryImageLogger with a path.
+
+        :param path: The path to the log file.
+        :param exists: True if the file is known to exist (skips the probe, see BinaryLog).
+        """
+        super().__init__(path, "images", self.RECORD_FORMAT, COLUMNS, exists=exists)
+
+    def append(self, frame: vision.frame.Frame):
+        """
+        Append image data to the log.
+        """
+        t = frame.capture_time
+        image_type = frame.image_type if isinstance(frame.image_type, int) else -1
+        roi = frame.roi_rect if frame.roi_rect else (-1, -1, -1, -1)
+        self.write_record(frame.id, t[0], t[1], t[2], t[3], t[4], t[5],
+                          frame.exposure_us, frame.gain_db, frame.fps, image_type,
+                          roi[0], roi[1], roi[2], roi[3])
@@ -1,11 +1,13 @@
 import config.settings as cfg
 import os, time
 import pyb
-import json
 from logging.csv import Csv
-from logging.detection_logger import DetectionLogger
-from logging.image_logger import ImageLogger
+from logging.checkpoint import Checkpoint
+from logging.detection_logger import DetectionLogger, BinaryDetectionLogger
+from logging.image_logger import ImageLogger, BinaryImageLogger
+from logging.deferred_queue import DeferredQueue
 from vision.frame import Frame
+from util.profiler import profiler
 
 
 class Session:
@@ -17,9 +19,19 @@ class Session:
     DATA_FOLDER = 'DATA'
     VAR_FOLDER = 'VAR'
     SESSION_FILENAME = 'session.json'
+    SESSION_JOURNAL_FILENAME = 'session.journal'
+    DEPLOYMENT_COUNTER_FILENAME = 'deployment_count.txt'
     DETECTIONLOG_FILENAME = 'detections.csv'
     IMAGELOG_FILENAME = 'images.csv'
+    DETECTIONLOG_BIN_FILENAME = 'detections.bin'
+    IMAGELOG_BIN_FILENAME = 'images.bin'
     STATUSLOG_FILENAME = 'status.csv'
+    DEFERRED_FILENAME = 'deferred.csv'
+    DEFERRED_POSITION_FILENAME = 'deferred_position.txt'
+
+    def __init__(self):
+        self.checkpoint_state = Checkpoint(f'{self.SDCARD}/{self.SESSION_FILENAME}', f'{self.SDCARD}/{self.SESSION_JOURNAL_FILENAME}')
+        self.start_time_checkpoint_ms = pyb.millis()
 
     def create(self, rtc):
         """
@@ -32,8 +44,6 @@ class Session:
         if (not self.VAR_FOLDER in filenames):
             os.mkdir(self.VAR_FOLDER) #for compatibility
 
-        print(os.listdir())
-        
         self.path = f"{self.DATA_FOLDER}/{self._find_new_folder_name(rtc)}"
 
         print("Creating new session path:", self.path)
@@ -42,16 +52,12 @@ class Session:
         os.chdir(str(self.path))
         print("Created new deployment folder:", self.path)
 
-        filenames = os.listdir()
-
-        self.detectionlog = DetectionLogger(self.DETECTIONLOG_FILENAME, 0)
-        self.imagelog = ImageLogger(self.IMAGELOG_FILENAME)
-        self.statuslog = Csv(self.STATUSLOG_FILENAME, "date_time", "status", "battery_voltage", 
-                            "USB_connected", "core_temperature_C")
+        self._open_logs(0, ())
 
-        #make jpeg, reference image and ROI directories if needed
-        if (not "jpegs" in filenames): 
-            os.mkdir("jpegs")
+        #make jpeg, reference image and ROI directories (the folder is new)
+        os.mkdir(Frame.BASE_FOLDER)
+        Frame.load_folders()
+        Frame.on_save = self.record_counters
 
         # filenames = os.listdir("jpegs")
 
@@ -72,26 +78,65 @@ class Session:
     
     def _find_new_folder_name(self, rtc):
         """
-        Find the new folder name based on the current date and time and current folders count.
+        Find the new folder name based on the deployment number and the current date and time.
         """
-        # Listing root contents to search folders
-        foldernames=[name for name in os.listdir(self.DATA_FOLDER) if "." not in name]
-
-        print("Foldernames:", foldernames, "in", os.getcwd())
-
-        new_folder_number=len(foldernames)
-
         #create folder for new deployment to avoid overwriting images
         date = rtc.datetime()
         # format from date (YYYY-M-D and HH-MM-SS)
         date_part = f"{date[0]}-{date[1]}-{date[2]}_{date[4]}-{date[5]}-{date[6]}"
-        new_folder_name = f"{new_folder_number} {date_part}"
+        return f"{self._next_deployment_number()} {date_part}"
 
-        while (new_folder_name in foldernames):
-            new_folder_name = f"{new_folder_number} {date_part}"
-            new_folder_number += 1 # assumes no overflow because of the changing date
+    def _next_deployment_number(self):
+        """
+        Take the next number of the deployment counter (VAR folder), saved before the folder is created: a reset in between
+        only skips a number. Without a (readable) counter, e.g. on a card of a previous version, the numbers continue after
+        the highest one of the DATA folders.
+        """
+        path = f"{self.VAR_FOLDER}/{self.DEPLOYMENT_COUNTER_FILENAME}"
+        try:
+            with open(path, 'r') as file:
+                number = int(file.read())
+        except (OSError, ValueError):
+            number = 0
+            for name in os.listdir(self.DATA_FOLDER):
+                try:
+                    number = max(number, int(name.split(' ')[0]) + 1)
+                except ValueError:
+                    pass
+            print("Deployment counter starting at", number)
+
+        with open(path, 'w') as file:
+            file.write(str(number + 1))
+        return number
 
-        return new_folder_name
+    def _open_logs(self, detection_count: int, logs):
+        """
+        Open (create if needed) the session logs in the current directory, as CSV or binary records depending on LOG_FORMAT.
+
+        :param logs: Names of the log files whose headers are already written (from the session checkpoint),
+            the other files are probed.
+        """
+        if cfg.LOG_FORMAT == "binary":
+            detectionlog_filename, imagelog_filename = self.DETECTIONLOG_BIN_FILENAME, self.IMAGELOG_BIN_FILENAME
+            self.detectionlog = BinaryDetectionLogger(detectionlog_filename, detection_count,
+                                                      exists=detectionlog_filename in logs)
+            self.imagelog = BinaryImageLogger(imagelog_filename, exists=imagelog_filename in logs)
+        else:
+            detectionlog_filename, imagelog_filename = self.DETECTIONLOG_FILENAME, self.IMAGELOG_FILENAME
+            self.detectionlog = DetectionLogger(detectionlog_filename, detection_count,
+                                                exists=detectionlog_filename in logs)
+            self.imagelog = ImageLogger(imagelog_filename, exists=imagelog_filename in logs)
+        self.statuslog = Csv(self.STATUSLOG_FILENAME, "date_time", "status", "battery_voltage", 
+                            "USB_connected", "core_temperature_C", buffer_size=0,
+                            exists=self.STATUSLOG_FILENAME in logs)
+        self.logs = [detectionlog_filename, imagelog_filename, self.STATUSLOG_FILENAME]
+        self.deferred = None
+        # only when images can be deferred (condition of Classifier.should_defer), no empty queue file otherwise
+        if (cfg.DEFERRED_CLASSIFICATION_ENABLED and cfg.ML_MODE == cfg.ML_Mode.FRAME_CLASS
+            and cfg.MIN_IMAGE_SCALE < cfg.THRESHOLD_IMAGE_SCALE_DEFER):
+            self.deferred = DeferredQueue(self.DEFERRED_FILENAME, self.DEFERRED_POSITION_FILENAME,
+                                          exists=self.DEFERRED_FILENAME in logs)
+            self.logs.append(self.DEFERRED_FILENAME)
 
     def load(self):
         """
@@ -99,25 +144,22 @@ class Session:
         """
         os.sync()
         os.chdir(self.SDCARD)
-        # Check if the session file exists
-        print(f"lisdir({os.getcwd()}):", os.listdir())
 
-        if self.SESSION_FILENAME in os.listdir():
-            
-            with open(f'{self.SDCARD}/{self.SESSION_FILENAME}', 'r') as file:
-                data = json.load(file)
-                self.path = data['path']
-                detection_count = data['detection_count']
-                picture_count = data['picture_count']
-                ### ....
+        data = self.checkpoint_state.load()
+        if data:
+            self.path = data['path']
+            detection_count = data['detection_count']
+            picture_count = data['picture_count']
+            ### ....
             
             print(f"Loaded session.json file. self.path: {self.path}, detection_count: {detection_count}, picture_count: {picture_count}")
             os.chdir(self.path)
-            self.detectionlog = DetectionLogger(self.DETECTIONLOG_FILENAME, detection_count)
-            self.imagelog = ImageLogger(self.IMAGELOG_FILENAME)
+            self._open_logs(detection_count, data.get('logs', ()))
+            picture_count, detection_count = self._reconcile_counters(picture_count, detection_count)
+            self.detectionlog.detection_count = detection_count
+            Frame.load_folders()
             Frame.set_starting_id(picture_count - 1)
-            self.statuslog = Csv(self.STATUSLOG_FILENAME, "date_time", "status", "battery_voltage", 
-                                "USB_connected", "core_temperature_C")
+            Frame.on_save = self.record_counters
             
             return self
         
@@ -125,20 +167,45 @@ class Session:
         
         return None
 
+    def _reconcile_counters(self, picture_count: int, detection_count: int):
+        """
+        Counters at least past the last rows of the image and detection logs: rows written after the last checkpoint
+        (before a brown-out) do not get their ids reused.
+
+        Returns:
+            picture_count, detection_count
+        """
+        try:
+            image = self.imagelog.read_last()
+            if image:
+                # picture_count is the next picture id + 1
+                picture_count = max(picture_count, int(image[0]) + 2)
+            detection = self.detectionlog.read_last()
+            if detection:
+                detection_count = max(detection_count, int(detection[0]))
+                picture_count = max(picture_count, int(detection[1]) + 2)
+        except (OSError, ValueError) as e:
+            print(f"Error reading the last log rows: {e}")
+        return picture_count, detection_count
+
     def save(self):
         """
-        Save the current session data to json file
+        Save the current session data to json file, write the buffered log rows (and the loop timings),
+        which would be lost on deep sleep reset
         """
+        self.flush()
+        profiler.dump()
+
         data = {
             'path': self.path,
             'picture_count': Frame.id + 1,
-            'detection_count': self.detectionlog.detection_count
+            'detection_count': self.detectionlog.detection_count,
+            'logs': self.logs # headers written, the files are not probed on load
         }
 
         try:
-            print(f"Saving session data to /sdcard/{self.SESSION_FILENAME} file")
-            with open(f'/sdcard/{self.SESSION_FILENAME}', 'w') as file:
-                json.dump(data, file)
+            print(f"Saving session data to {self.SDCARD}/{self.SESSION_FILENAME} file")
+            self.checkpoint_state.save(data)
 
         except Exception as e:
             print(f"Error saving session data: {e}")
@@ -146,6 +213,50 @@ class Session:
         
         return True
 
+    def checkpoint(self):
+        """
+        Append the session counters to the session journal every CHECKPOINT_PERIOD_MS (call on every loop iteration):
+        a brown-out then loses at most this period of counters, recovered from the logs on load (see _reconcile_counters).
+        The buffered log rows are written with every checkpoint, or once buffered for more than CSV_FLUSH_PERIOD_MS.
+        """
+        self.flush_if_due()
+        if pyb.elapsed_millis(self.start_time_checkpoint_ms) < cfg.CHECKPOINT_PERIOD_MS:
+            return
+        self.start_time_checkpoint_ms = pyb.millis()
+        try:
+            # the log tails are then at least as recent as the journal
+            self.detectionlog.flush()
+            self.imagelog.flush()
+        except OSError as e:
+            print(f"Error writing the session logs: {e}")
+        self.record_counters()
+
+    def record_counters(self):
+        """
+        Append the session counters to the session journal (if they changed), called before every saved image
+        (Frame.on_save) so that a brown-out can not reuse the id of a saved image, and overwrite it.
+        """
+        try:
+            self.checkpoint_state.record(Frame.id + 1, self.detectionlog.detection_count)
+        except OSError as e:
+            print(f"Error saving session checkpoint: {e}")
+
+
+    def flush(self):
+        """
+        Write the buffered rows of the session logs to the SD card
+        """
+        self.detectionlog.flush()
+        self.imagelog.flush()
+        self.statuslog.flush()
+
+    def flush_if_due(self):
+        """
+        Write the buffered rows of the session logs that have been buffered for more than their flush period
+        """
+        self.detectionlog.flush_if_due()
+        self.imagelog.flush_if_due()
+        self.statuslog.flush_if_due()
 
     def log_status(self, vbat, status="NA"):
 
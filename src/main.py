@@ -1,19 +1,34 @@
+# fast wake path of deep sleep, before any other import: back to standby if the sleep is not over
+from hardware.wake import wake_check
+wake_check()
+# import time and heap of the startup steps (reported with PROFILER_ENABLED)
+from util.startup import startup
+step = startup.start()
 # import user defined parameters
 import config.settings as cfg
-from config.settings import Mode, ImageType, ML_Mode
+from config.settings import Mode, ML_Mode
+startup.stop("config.settings", step)
 #import libraries
+import sensor, time, machine, image, pyb
+step = startup.start()
 from hardware.camera import Camera
-from logging.detection_logger import DetectionLogger
-import sensor, time, machine, image
+from hardware.led import Illumination
 # import external functions
-from ecofunctions import *
+from ecofunctions import start_check
 from hardware.power import PowerManagement
-from hardware.led import *
 from util.timeutil import Suntime, Rtc
+startup.stop("hardware, ecofunctions", step)
+step = startup.start()
+from logging.detection_logger import DetectionLogger
 from logging.session import Session
+from logging.deferred_queue import DeferredQueue
+startup.stop("logging", step)
+step = startup.start()
 from vision.frame import Frame
-from vision.frame_differencer import FrameDifferencer
-from vision.classifier import Classifier
+from vision.tracker import Track
+from util.profiler import profiler
+startup.stop("vision.frame, util.profiler", step)
+# frame differencing, classifier (tf) and change detection are imported when enabled (see App.__init__)
 
 class App:
     def __init__(self):
@@ -24,9 +39,16 @@ class App:
         self.session: Session | None = None
         self.power_mgmt: PowerManagement
         self.is_night: bool
-        self.frame_differencer: FrameDifferencer
-        self.classifier: Classifier
+        self.frame_differencer: "FrameDifferencer | None" = None
+        self.classifier: "Classifier"
         self.detectionlog: DetectionLogger | None = None
+        self.deferred: DeferredQueue | None = None
+        self.start_time_motion_ms = pyb.millis()
+        self.change_detector: "ChangeDetector | None" = None
+        # motion gating of image classification: images classified and skipped since the last status
+        self.start_time_inference_ms = pyb.millis()
+        self.inference_count = 0
+        self.skipped_count = 0
         
         # perform quick start from sleep check
         start_check()
@@ -46,15 +68,19 @@ class App:
         else:
             print_status="Script start - Live view"
 
-        self.power_mgmt = PowerManagement(self.illumination, self.solartime, self.rtc, self.session)
+        self.power_mgmt = PowerManagement(self.illumination, self.solartime, self.rtc, self.session, on_sleep=self.on_sleep)
         
         if self.session:
             self.detectionlog=self.session.detectionlog
 
         self.power_mgmt.sleep_if_low_bat(print_status)
 
-        if(cfg.ML_MODE):
+        if(cfg.ML_MODE is not None):
+            step = startup.start()
+            from vision.classifier import Classifier
+            startup.stop("vision.classifier", step)
             self.classifier = Classifier(self.session)
+            self.deferred = self.session.deferred
 
         winrect = cfg.WIN_RECT if cfg.USE_SENSOR_WINDOWING else None
 
@@ -69,8 +95,17 @@ class App:
         self.clock = time.clock()
 
         if(cfg.FRAME_DIFF_ENABLED):
+            step = startup.start()
+            from vision.frame_differencer import FrameDifferencer
+            startup.stop("vision.frame_differencer", step)
             self.frame_differencer = FrameDifferencer(self.image_width, self.image_height, 
                                                       cfg.SENSOR_PIXFORMAT, self, self.session)
+        elif(cfg.ML_MOTION_GATING and (cfg.ML_MODE==ML_Mode.FRAME_CLASS or cfg.ML_MODE==ML_Mode.OBJECT_DETECT)):
+            from vision.change_detector import ChangeDetector
+            self.change_detector = ChangeDetector()
+
+        if profiler.enabled:
+            startup.report(profiler)
 
     def on_triggered(self, jpeg_frame : Frame):
         """
@@ -79,39 +114,151 @@ class App:
         Args:
             frame: Frame object containing the image that triggered the event
         """
-        pass
+        self.start_time_motion_ms = pyb.millis()
 
-    def on_blob_found(self, jpeg_frame: Frame, blob: image.blob):
+    def on_blobs_found(self, jpeg_frame: Frame, blobs: list, tracks: list):
         """
-        Called when a blob has been processed by the frame differencer.
+        Called with the blobs of a frame found by the frame differencer, before they are logged.
+        With blob classification (ML_MODE = BLOB_CLASS), the blobs to classify are classified in one batch.
         
         Args:
-            frame: Frame object containing the image with the processed blob
-            blob: The blob that was processed
+            jpeg_frame: Frame object containing the image with the blobs
+            blobs: The blobs (full resolution coordinates)
+            tracks: Track of every blob (None if TRACKING_ENABLED is False), the crop of a track is saved when it ends or is due (see on_track_crop)
+        Returns:
+            results: Classification of every classified blob, None for the others
         """
+        results = [None] * len(blobs)
         if (cfg.ML_MODE != ML_Mode.BLOB_CLASS 
-            or not Frame.CAN_SAVE_DETECTION_IMG
             or not self.detectionlog):
-            return
+            return results
+
+        to_classify = []
+        for i in range(len(blobs)):
+            blob, track = blobs[i], tracks[i]
+            if track is None or track.should_classify():
+                to_classify.append(i)
+                if track:
+                    track.set_classified()
+
+            if Frame.CAN_SAVE_DETECTION_IMG and (track is None or track.is_better_crop(blob)):
+                frame_blob = jpeg_frame.extract_blob_region(blob, cfg.BLOBS_CROP_METHOD)
+                if (frame_blob.can_save()):
+                    # the blobs are logged next, in order
+                    detection_id = self.detectionlog.detection_count + 1 + i
+                    filename = str(jpeg_frame.id) + "_d" + str(detection_id) + "_xywh" + str("_".join(map(str,frame_blob.roi_rect)));
+                    if track:
+                        track.keep_crop(frame_blob, filename, blob.pixels())
+                    else:
+                        frame_blob.save("blobs", filename)
+
+        if to_classify:
+            rects = [jpeg_frame.get_blob_region(blobs[i], cfg.BLOBS_CROP_METHOD) for i in to_classify]
+            outputs = self.classifier.classify_blobs(jpeg_frame.img, rects)
+            for i, output in zip(to_classify, outputs):
+                results[i] = self.classifier.get_classification(output, blobs[i].rect(), jpeg_frame.id)
+        return results
+
+    def on_track_ended(self, track: Track):
+        """
+        Called when a track of the frame differencer ended: save its best crop.
+        
+        Args:
+            track: The track that ended
+        """
+        self.on_track_crop(track)
+
+    def on_track_crop(self, track: Track):
+        """
+        Called when the best crop of an open track is due (TRACK_CROP_MAX_AGE_MS), or when the track ended: save the crop.
+        Only a larger crop of the track is kept (and saved) afterwards.
+        
+        Args:
+            track: The track of the crop
+        """
+        if track.best_crop:
+            track.best_crop.save("blobs", track.best_filename)
+            track.best_crop = None
+
+    def on_sleep(self, low_battery: bool = False, nap: bool = False):
+        """
+        Called before deep sleep: end the open tracks, whose crops would be lost,
+        and classify the queued images (unless the battery is low, or before a nap between pictures,
+        which DEFERRED_SLEEP_BUDGET_MS would delay).
+        """
+        if self.frame_differencer:
+            self.frame_differencer.end_tracks()
+        self.log_gating()
+        if self.deferred and self.deferred.has_pending() and not low_battery and not nap:
+            self.classify_deferred(cfg.DEFERRED_SLEEP_BUDGET_MS)
 
-        frame_blob = jpeg_frame.extract_blob_region(blob, cfg.BLOBS_CROP_METHOD)
+    def classify_deferred(self, budget_ms: int):
+        """
+        Classify the queued images (see DEFERRED_CLASSIFICATION_ENABLED) for at most budget_ms (at least one image).
+        The detections are logged with the id of the queued picture.
+        """
+        start_time_ms = pyb.millis()
+        entry = self.deferred.peek()
+        while entry:
+            picture_id, path, _ = entry
+            print(f"Deferred classification of {path}")
+            start = profiler.start()
+            try:
+                img = image.Image(path, copy_to_fb=True)
+                self.classifier.classify(img, cfg.ML_MODE, picture_id=picture_id)
+            except OSError as e:
+                print(f"Cannot classify {path}: {e}")
+            profiler.stop("classify_deferred", start)
+            self.deferred.pop()
+            if pyb.elapsed_millis(start_time_ms) >= budget_ms:
+                return
+            entry = self.deferred.peek()
+
+    def should_classify_image(self, frame: Frame):
+        """
+        Motion gating of image classification (ML_MOTION_GATING): whether the frame shows motion
+        (or nothing was classified for ML_KEEPALIVE_MS).
+        """
+        if not cfg.ML_MOTION_GATING:
+            return True
+        if self.frame_differencer:
+            changed = len(self.frame_differencer.get_motion_rects()) > 0
+        else:
+            changed = self.change_detector.update(frame.img)
+        if changed or pyb.elapsed_millis(self.start_time_inference_ms) > cfg.ML_KEEPALIVE_MS:
+            if not changed:
+                # keep-alive: also report the skipped images of the quiet period
+                self.log_gating()
+            self.start_time_inference_ms = pyb.millis()
+            self.inference_count += 1
+            return True
+        self.skipped_count += 1
+        return False
 
-        if (frame_blob.can_save()):
-            filename = str(jpeg_frame.id) + "_d" + str(self.detectionlog.detection_count) + "_xywh" + str("_".join(map(str,frame_blob.roi_rect)));
-            frame_blob.save("blobs", filename)
-        if (cfg.ML_MODE == ML_Mode.BLOB_CLASS):
-            output = self.classifier.classify(frame_blob.img, cfg.ML_MODE)
-            self.detectionlog.append(jpeg_frame.id, labels=self.classifier.labels, confidences=output, rect=blob.rect(), prepend_comma=True)
+    def log_gating(self):
+        """
+        Log the number of images skipped by the motion gating since the last report in the status file.
+        """
+        if not self.skipped_count or not self.session:
+            return
+        status = f"Motion gating - classified {self.inference_count} images, skipped {self.skipped_count}"
+        print(status)
+        self.session.log_status("NA", status)
+        self.inference_count = 0
+        self.skipped_count = 0
 
     def on_background_reset(self):
         """
-        Called when the background reference image is reset.
+        Called when the background reference image is reset: end the open tracks,
+        whose positions refer to the previous background.
         """
-        pass
+        if self.frame_differencer:
+            self.frame_differencer.end_tracks()
             
     def run(self):
         ### MAIN LOOP ###
         while(True):
+            loop_start = profiler.start()
             self.clock.tick()
             self.is_night = not self.solartime.is_daytime()
 
@@ -119,28 +266,58 @@ class App:
             self.illumination.update(self.is_night)
 
             # handle power mangment, enter deeplseep if needed, lower frame rate using a configured delay
+            start = profiler.start()
             self.power_mgmt.update()
+            profiler.stop("power", start)
 
             ### Take and process picture(s) ###
             
+            start = profiler.start()
             frame = self.camera.take_picture(self.is_night, self.clock)
+            profiler.stop("snapshot", start)
             
             if(self.frame_differencer):
+                start = profiler.start()
                 frame = self.frame_differencer.update(frame)
+                profiler.stop("frame_diff", start)
 
             if(self.session):
+                start = profiler.start()
                 frame.log(self.session.imagelog) ### keep in main
+                profiler.stop("log_image", start)
+
+                # too long to classify now: queued once saved (or skipped if not saved)
+                defer = ((cfg.ML_MODE==ML_Mode.FRAME_CLASS or cfg.ML_MODE==ML_Mode.OBJECT_DETECT)
+                         and self.classifier.should_defer(cfg.ML_MODE))
 
-                if(cfg.ML_MODE==ML_Mode.FRAME_CLASS or cfg.ML_MODE==ML_Mode.OBJECT_DETECT):
-                    detection_confidence = self.classifier.classify(frame.img, cfg.ML_MODE, roi_rect=frame.roi_rect)
+                if((cfg.ML_MODE==ML_Mode.FRAME_CLASS or cfg.ML_MODE==ML_Mode.OBJECT_DETECT) and not defer
+                   and self.should_classify_image(frame)):
+                    motion_rects = (self.frame_differencer.get_motion_rects() if self.frame_differencer
+                                    else self.change_detector.changed_rects if self.change_detector else None)
+                    detection_confidence = self.classifier.classify(frame.img, cfg.ML_MODE, picture_id=frame.id,
+                                                                    motion_rects=motion_rects)
 
                 if(frame.can_save()):
-                    frame.save("img")
+                    start = profiler.start()
+                    path = frame.save("img")
+                    profiler.stop("save_image", start)
+                    if defer and self.deferred:
+                        self.deferred.append(frame.id, path, frame.roi_rect)
+
+                # classify queued images when no motion was detected for a while
+                if (self.deferred and self.deferred.has_pending() and self.frame_differencer
+                    and pyb.elapsed_millis(self.start_time_motion_ms) > cfg.DEFERRED_IDLE_MS):
+                    self.classify_deferred(cfg.DEFERRED_IDLE_BUDGET_MS)
 
             ###
 
             print("Frames per second: %s" % str(round(self.clock.fps(),1)),", Gain (dB): %s" % str(round(sensor.get_gain_db())),", Exposure time (ms): %s" % str(round(sensor.get_exposure_us()/1000)),"\n*****")
 
+            profiler.stop("loop", loop_start)
+            profiler.update()
+            if self.session:
+                self.session.checkpoint()
+
 
 # Create and run the application
 if __name__ == "__main__":
@@ -148,6 +325,14 @@ if __name__ == "__main__":
     try:
         app.run()
     except Exception as e:
+        if app.session:
+            # save the best crops of the open tracks
+            if app.frame_differencer:
+                try:
+                    app.frame_differencer.end_tracks()
+                except Exception as track_error:
+                    print(f"Error ending the tracks: {track_error}")
+            app.session.flush()
         with open("error_log.txt", "a") as f:
             error_str = f"Error: {e}\n{e.args}\n"
             print(error_str)
@@ -71,7 +71,7 @@ with open(str(new_folder_name)+'/detections1.csv', 'w') as detectionlog1:
         detectionlog1.write("detection_id" + ',' + "picture_id" + ',' + "blob_pixels" + ',' + "blob_elongation" + ','
     + "blob_corner1_x" + ',' + "blob_corner1_y" + ',' + "blob_corner2_x" + ',' + "blob_corner2_y" + ',' + "blob_corner3_x" + ',' + "blob_corner3_y" + ',' + "blob_corner4_x" + ',' + "blob_corner4_y"
     + ',' + "blob_l_mode" + ',' + "blob_l_min" + ',' + "blob_l_max" + ',' + "blob_a_mode" + ',' + "blob_a_min" + ',' + "blob_a_max" + ',' + "blob_b_mode" + ',' + "blob_b_min" + ',' + "blob_b_max" + ','
-    + "image_labels" + ',' "image_confidences" + ',' + "image_x" + ',' + "image_y" + ',' + "image_width" + ',' + "image_height" + '\n')
+    + "image_labels" + ',' "image_confidences" + ',' + "image_x" + ',' + "image_y" + ',' + "image_width" + ',' + "image_height" + ',' + "track_id" + '\n')
 
 with open(str(new_folder_name)+'/images1.csv', 'w') as imagelog1:
         imagelog1.write("picture_id" + ',' + "date_time" + ',' + "exposure_us" + ',' + "gain_dB" + ',' + "frames_per_second" + ','
@@ -95,7 +95,8 @@ csv_test = Csv(new_folder_name+'/detections2.csv', "detection_id", "picture_id",
                 "blob_a_mode", "blob_a_min", "blob_a_max", 
                 "blob_b_mode", "blob_b_min",  "blob_b_max", 
                 "image_labels", "image_confidences", 
-                "image_x", "image_y", "image_width", "image_height")
+                "image_x", "image_y", "image_width", "image_height",
+                "track_id")
 
 log1_content = [line.strip().split(',') for line in log1_lines]
 print("log1_content", log1_content)
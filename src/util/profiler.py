@@ -0,0 +1,138 @@
+import pyb, time
+from array import array
+import config.settings as cfg
+
+class Stage:
+    """
+    Ring buffer of the last durations (in microseconds) of one named stage.
+    """
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.samples = array('L', (0 for _ in range(capacity)))
+        self.index = 0
+        self.count = 0 # total number of samples recorded, including overwritten ones
+
+    def add(self, duration_us: int):
+        self.samples[self.index] = duration_us
+        self.index += 1
+        if self.index == len(self.samples):
+            self.index = 0
+        self.count += 1
+
+    def statistics(self):
+        """
+        Returns:
+            (min, mean, p95, max) of the buffered durations in microseconds, None if empty
+        """
+        n = min(self.count, len(self.samples))
+        if n == 0:
+            return None
+        values = sorted(self.samples[:n])
+        return (values[0], sum(values) // n, values[min(n - 1, (n * 95) // 100)], values[-1])
+
+
+class Profiler:
+    """
+    Per-stage timing of the main loop. Each stage keeps its last samples in a preallocated ring buffer,
+    statistics are periodically appended to a CSV file of the session folder.
+
+    Usage:
+        start = profiler.start()
+        ...
+        profiler.stop("snapshot", start)
+    """
+
+    HEADERS = ("date_time", "stage", "count", "min_us", "mean_us", "p95_us", "max_us")
+
+    def __init__(self, capacity: int = cfg.PROFILER_BUFFER_SIZE, dump_period_ms: int = cfg.PROFILER_DUMP_PERIOD_MS,
+                 filename: str = cfg.PROFILER_FILENAME):
+        self.enabled = True
+        self.capacity = capacity
+        self.dump_period_ms = dump_period_ms
+        self.filename = filename
+        self.stages = {}
+        self.log = None
+        self.start_time_dump_ms = pyb.millis()
+
+    def start(self):
+        return pyb.micros()
+
+    def stop(self, name: str, start_us: int):
+        self.add(name, pyb.elapsed_micros(start_us))
+
+    def add(self, name: str, duration_us: int):
+        """
+        Add a duration measured otherwise (e.g. util.startup) to a stage.
+        """
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = Stage(name, self.capacity)
+            self.stages[name] = stage
+        stage.add(duration_us)
+
+    def report(self):
+        """
+        Returns:
+            list of (stage name, count, min, mean, p95, max) for every stage with samples
+        """
+        rows = []
+        for stage in self.stages.values():
+            stats = stage.statistics()
+            if stats:
+                rows.append((stage.name, stage.count) + stats)
+        return rows
+
+    def dump(self):
+        """
+        Append the current statistics of every stage to the timings CSV file (in the working directory,
+        i.e. the session folder).
+        """
+        rows = self.report()
+        if not rows:
+            return
+        if self.log is None:
+            # imported here: logging.csv is not needed when profiling is disabled
+            from logging.csv import Csv
+            self.log = Csv(self.filename, *Profiler.HEADERS)
+        date = "-".join(map(str, time.localtime()[0:6]))
+        for row in rows:
+            self.log.append(date, *row)
+        self.log.flush()
+        self.start_time_dump_ms = pyb.millis()
+
+    def update(self):
+        """
+        Dump the statistics if the dump period has elapsed.
+        """
+        if pyb.elapsed_millis(self.start_time_dump_ms) > self.dump_period_ms:
+            self.dump()
+
+
+class NullProfiler:
+    """
+    Profiler used when profiling is disabled: every call returns immediately.
+    """
+
+    enabled = False
+
+    def start(self):
+        return 0
+
+    def stop(self, name, start_us):
+        pass
+
+    def add(self, name, duration_us):
+        pass
+
+    def report(self):
+        return []
+
+    def dump(self):
+        pass
+
+    def update(self):
+        pass
+
+
+profiler = Profiler() if cfg.PROFILER_ENABLED else NullProfiler()
@@ -0,0 +1,42 @@
+import gc, time
+
+class StartupProfiler:
+    """
+    Duration and heap allocations of the steps of the startup (module imports, initialisation), reported
+    with the loop profiler (util.profiler, PROFILER_ENABLED). Only imports built-in modules so that it can
+    time the import of the settings and of the loop profiler themselves.
+
+    Usage:
+        start = startup.start()
+        import config.settings as cfg
+        startup.stop("config.settings", start)
+    """
+
+    def __init__(self):
+        self.steps = [] # (name, duration in microseconds, allocated heap bytes)
+        self.start_us = time.ticks_us()
+
+    def start(self):
+        return (time.ticks_us(), gc.mem_alloc())
+
+    def stop(self, name: str, start):
+        """
+        :param start: Value returned by start() before the step.
+        """
+        start_us, start_alloc = start
+        self.steps.append((name, time.ticks_diff(time.ticks_us(), start_us), gc.mem_alloc() - start_alloc))
+
+    def report(self, profiler=None):
+        """
+        Print the steps (and the time since the profiler was created), add their durations to the stages of the profiler.
+        The heap of an import includes the garbage of its compilation, freed at the next collection.
+        """
+        total_us = time.ticks_diff(time.ticks_us(), self.start_us)
+        print("Startup: %d ms, heap allocated: %d bytes, free: %d bytes" % (total_us // 1000, gc.mem_alloc(), gc.mem_free()))
+        for name, duration_us, allocated in self.steps:
+            print("  %-28s %7d us %8d bytes" % (name, duration_us, allocated))
+            if profiler:
+                profiler.add("startup " + name, duration_us)
+
+
+startup = StartupProfiler()
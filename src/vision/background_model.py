@@ -0,0 +1,104 @@
+import sensor, image
+import config.settings as cfg
+
+
+class BackgroundModel:
+    """
+    Running background model of grayscale images (FD_BACKGROUND_MODEL = "running"), updated incrementally with each frame:
+    for every pixel a running mean of the image and a running deviation of FD_BG_DEVIATION_FACTOR times |image - mean|.
+    A pixel is foreground when its deviation from the mean exceeds the running deviation, so noisy areas (foliage, water)
+    need a larger change to trigger than still ones.
+
+    Both are sigma-delta estimates: each image moves them by one grey level towards the new value. Exponential averages
+    of 8-bit images (image.blend) truncate the small updates of slow learning rates to zero; steps of one level only need
+    saturated additions and subtractions under a mask, and converge to the median (mean) and to a multiple of the mean
+    absolute deviation (deviation).
+
+    Global brightness changes (light, exposure) are compensated before comparing, and the areas of the last blobs
+    are left out of the mean update (see set_foreground) so that animals are not learned as background.
+    """
+
+    def __init__(self, width: int, height: int):
+        """
+        Allocate the mean, deviation, foreground map and work framebuffers.
+
+        :param width: Width of the images (detection resolution).
+        :param height: Height of the images (detection resolution).
+        """
+        self.width = width
+        self.height = height
+        self.mean = sensor.alloc_extra_fb(width, height, sensor.GRAYSCALE)
+        self.deviation = sensor.alloc_extra_fb(width, height, sensor.GRAYSCALE)
+        self.foreground = sensor.alloc_extra_fb(width, height, sensor.GRAYSCALE)
+        self.work = sensor.alloc_extra_fb(width, height, sensor.GRAYSCALE)
+        self.masked_rects = []
+
+    def reset(self, img: image.Image):
+        """
+        Restart the model from an image: the mean is the image, the deviation FD_BG_INITIAL_DEVIATION everywhere.
+        """
+        self.mean.replace(img)
+        self.deviation.draw_rectangle(0, 0, self.width, self.height, color=cfg.FD_BG_INITIAL_DEVIATION, fill=True)
+        self.masked_rects = []
+
+    def set_foreground(self, rects):
+        """
+        Leave the given areas out of the next mean updates.
+
+        :param rects: Rectangles (x, y, w, h) at detection resolution (see FrameDifferencer.mask_blobs).
+        """
+        self.masked_rects = rects
+
+    def _step_towards(self, target: image.Image, model: image.Image, times: int = 1):
+        """
+        model += 1 where target > model, model -= 1 where target < model (except in the masked areas for the mean).
+        target is multiplied by `times` (saturated additions), the work framebuffer is used as mask once binarized:
+        grayscale mask pixels only count above 127.
+        """
+        work = self.work
+        for sign in (1, -1):
+            if sign > 0:
+                # work = max(0, times * target - model)
+                work.replace(target)
+                for _ in range(times - 1):
+                    work.add(target)
+                work.sub(model)
+            else:
+                # work = max(0, model - times * target)
+                work.replace(model)
+                for _ in range(times):
+                    work.sub(target)
+            if model is self.mean:
+                for rect in self.masked_rects:
+                    work.draw_rectangle(*rect, color=0, fill=True)
+            work.binary([(1, 255)])
+            if sign > 0:
+                model.add(1, mask=work)
+            else:
+                model.sub(1, mask=work)
+
+    def update(self, img: image.Image):
+        """
+        Compute the foreground map of a new image, then update the model with it.
+        Foreground map: max(0, |img - shift - mean| - deviation) for every pixel,
+        shift being the difference of the average brightness of the image and of the mean.
+
+        :param img: The new grayscale image.
+        :return: The foreground map (framebuffer of the model, valid until the next update).
+        """
+        shift = img.get_statistics().mean() - self.mean.get_statistics().mean()
+        self.foreground.replace(img)
+        if shift > 0:
+            self.foreground.sub(shift)
+        elif shift < 0:
+            self.foreground.add(-shift)
+        self.foreground.difference(self.mean)
+
+        # deviation towards FD_BG_DEVIATION_FACTOR * |img - mean|, everywhere: a still animal slowly loses contrast but noise is always learned
+        self._step_towards(self.foreground, self.deviation, cfg.FD_BG_DEVIATION_FACTOR)
+        self.deviation.max(cfg.FD_BG_MIN_DEVIATION)
+        # mean towards the image, outside of the blobs
+        self._step_towards(img, self.mean)
+
+        self.foreground.sub(self.deviation)
+        return self.foreground
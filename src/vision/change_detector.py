@@ -0,0 +1,39 @@
+import image
+import config.settings as cfg
+
+class ChangeDetector:
+    """
+    Cheap change detection between consecutive images, without frame differencing: the images are reduced to the mean
+    of their tiles (mean_pooled, in grayscale), a change is detected where the mean of a tile changed by more than a threshold.
+    """
+
+    def __init__(self, tile_size: int = cfg.ML_GATING_TILE_SIZE, threshold: int = cfg.ML_GATING_THRESHOLD):
+        """
+        :param tile_size: Side of the tiles (in pixels).
+        :param threshold: Minimum change of the mean of a tile (grey levels).
+        """
+        self.tile_size = tile_size
+        self.thresholds = [(threshold, 255)]
+        self.previous: image.Image | None = None
+        # full resolution rectangles of the groups of changed tiles of the last image
+        self.changed_rects = []
+
+    def update(self, img: image.Image):
+        """
+        Compare the image with the previous one.
+
+        Returns:
+            Whether the image changed (True for the first image)
+        """
+        pooled = img.mean_pooled(self.tile_size, self.tile_size).to_grayscale()
+        if self.previous is None:
+            self.previous = pooled
+            self.changed_rects = []
+            return True
+        # the previous image becomes the difference, the current one is kept for the next comparison
+        self.previous.difference(pooled)
+        tile = self.tile_size
+        self.changed_rects = [(b.x() * tile, b.y() * tile, b.w() * tile, b.h() * tile)
+                              for b in self.previous.find_blobs(self.thresholds, pixels_threshold=1, area_threshold=1, merge=True)]
+        self.previous = pooled
+        return len(self.changed_rects) > 0
@@ -0,0 +1,155 @@
+from vision.tracker import iou
+
+
+class Classification:
+    """
+    Result of the classification of a region of a picture (image window, blob or detected object), as logged:
+    the labels with the highest confidences, by index in the label table of the model (LABELS_PATH).
+    """
+
+    def __init__(self, picture_id: int, label_indices, confidences, rect):
+        """
+        :param picture_id: Id of the classified picture (Frame.id).
+        :param label_indices: Indices of the labels in the label table, by decreasing confidence.
+        :param confidences: Confidence of every label of label_indices.
+        :param rect: Classified region (x, y, w, h) in picture coordinates.
+        """
+        self.picture_id = picture_id
+        self.label_indices = label_indices
+        self.confidences = confidences
+        self.rect = rect
+
+    def label_index(self):
+        """Index of the label with the highest confidence"""
+        return self.label_indices[0]
+
+    def confidence(self):
+        """Highest confidence"""
+        return self.confidences[0]
+
+
+def target_mask(labels, non_target_labels):
+    """
+    Returns:
+        Whether every label of the label table is a target (not in non_target_labels)
+    """
+    return [not label in non_target_labels for label in labels]
+
+
+def mask_runs(mask):
+    """
+    Returns:
+        (start, end) index ranges of the consecutive labels of the mask (e.g. a single range after a "Background" label 0)
+    """
+    runs = []
+    start = None
+    for i in range(len(mask) + 1):
+        if i < len(mask) and mask[i]:
+            if start is None:
+                start = i
+        elif start is not None:
+            runs.append((start, i))
+            start = None
+    return runs
+
+
+# outputs of at most this many labels are reduced with plain loops (see top_k, argmax)
+SMALL_OUTPUT = 64
+
+def top_k(output, k: int, runs=None, min_confidence: float = 0.0):
+    """
+    Labels of highest confidence of a model output. Large outputs are reduced without python loop over the labels:
+    every range is reduced by the builtins (max for k = 1, sort otherwise), then the k values are located with list.index.
+    Small outputs (SMALL_OUTPUT labels, e.g. the few labels of the usual models) are faster with a plain loop.
+
+    Args:
+        output: Model output (confidence of every label)
+        k: Number of labels (0: all the labels)
+        runs: Index ranges of the labels considered (e.g. mask_runs of target_mask), all the labels if None
+        min_confidence: Labels of lower confidence are skipped
+    Returns:
+        indices: Label indices, by decreasing confidence (lowest index first for equal confidences)
+        confidences: Confidence of every label of indices
+    """
+    if k <= 0:
+        k = len(output)
+    if runs is None:
+        runs = ((0, len(output)),)
+    if len(output) <= SMALL_OUTPUT:
+        return _top_k_small(output, k, runs, min_confidence)
+    candidates = []
+    for start, end in runs:
+        if end <= start:
+            continue
+        values = output if start == 0 and end == len(output) else output[start:end]
+        if k == 1:
+            values = (max(values),)
+        else:
+            values = sorted(values, reverse=True)[:k]
+        position = start
+        previous = None
+        for value in values:
+            if value < min_confidence:
+                break
+            # equal confidences: next occurrence
+            position = output.index(value, position + 1 if value == previous else start, end)
+            previous = value
+            candidates.append((value, position))
+    if len(runs) > 1:
+        candidates.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+    candidates = candidates[:k]
+    return [candidate[1] for candidate in candidates], [candidate[0] for candidate in candidates]
+
+
+def argmax(output, indices):
+    """
+    Label of highest confidence among the given labels, with a plain loop: for small outputs (SMALL_OUTPUT),
+    e.g. the target confidence of every classified window.
+
+    Args:
+        output: Model output (confidence of every label)
+        indices: Indices of the labels considered, ascending
+    Returns:
+        (index, confidence) of the label of highest confidence (lowest index first), (None, 0) if no confidence is above 0
+    """
+    best = None
+    confidence = 0
+    for i in indices:
+        if output[i] > confidence:
+            best = i
+            confidence = output[i]
+    return best, confidence
+
+
+def _top_k_small(output, k: int, runs, min_confidence: float):
+    """
+    top_k by looping over the labels of the runs (ascending ranges).
+    """
+    indices = [i for start, end in runs for i in range(start, end) if output[i] >= min_confidence]
+    indices.sort(key=lambda i: (-output[i], i)) # lowest index first for equal confidences
+    indices = indices[:k]
+    return indices, [output[i] for i in indices]
+
+
+def non_max_suppression(hits, min_iou: float):
+    """
+    Greedy non-maximum suppression of overlapping classified windows, per label:
+    by decreasing confidence, a window is kept unless it overlaps a kept window of the same label by min_iou or more.
+
+    Args:
+        hits: (label index, confidence, Classification) of every window
+        min_iou: Intersection over union above which the window of lower confidence is suppressed
+    Returns:
+        Classification of the kept windows, by decreasing confidence
+    """
+    hits = sorted(hits, key=lambda hit: hit[1], reverse=True)
+    kept = []
+    for label, _, classification in hits:
+        suppressed = False
+        for kept_label, kept_classification in kept:
+            if kept_label == label and iou(classification.rect, kept_classification.rect) >= min_iou:
+                suppressed = True
+                break
+        if not suppressed:
+            kept.append((label, classification))
+    return [classification for (_, classification) in kept]
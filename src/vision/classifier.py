@@ -1,7 +1,9 @@
 from hardware.led import LED_YELLOW_OFF, LED_YELLOW_ON
-import math, tf, image
+import math, tf, image, gc, os, pyb
 import config.settings as cfg
 from config.settings import ML_Mode
+from util.profiler import profiler
+from vision.classification import Classification, target_mask, mask_runs, top_k, argmax, non_max_suppression, SMALL_OUTPUT
 
 ### TODO: use design pattern
 class Classifier:
@@ -12,110 +14,290 @@ class Classifier:
         self.model_res = cfg.MODEL_RES
         self.net_path = cfg.NET_PATH
         self.threshold_confidence = cfg.THRESHOLD_CONFIDENCE
+        self.top_k = cfg.CLASSIFICATION_TOP_K
         self.scale_mul = 0.5  # From original code's hardcoded values
         self.x_overlap = 0.5
         self.y_overlap = 0.5
         self.has_detected = False
+        self.input_img = None # model input buffer of blob classification, allocated on first use
+        # model passed to tf: the resident model, or its path if it does not fit in the heap (read on every inference)
+        self.model = self.net_path
+        # counters: model load time, number and durations of the inference calls
+        self.load_ms = 0
+        self.inference_count = 0
+        self.inference_total_us = 0
+        self.inference_max_us = 0
         self._load_model()
 
     def _load_model(self):
         try:
             self.labels = [line.rstrip('\n') for line in open(cfg.LABELS_PATH)]
-            print("Loaded model and labels")
+            print("Loaded labels")
             #get target label index
-            self.target_indices = [i for i in range(len(self.labels)) if self.labels[i] not in cfg.NON_TARGET_LABELS]
-            self.non_target_indices = [i for i in range(len(self.labels)) if self.labels[i] in cfg.NON_TARGET_LABELS]
-            print("Selected target indices:",list(self.labels[i] for i in self.target_indices))
+            mask = target_mask(self.labels, cfg.NON_TARGET_LABELS)
+            self.target_runs = mask_runs(mask)
+            # few labels: plain loop over the target indices (see _target)
+            self.target_indices = [i for i in range(len(mask)) if mask[i]] if len(mask) <= SMALL_OUTPUT else None
+            print("Selected target indices:",list(self.labels[i] for i in range(len(self.labels)) if mask[i]))
+            model_size = os.stat(self.net_path)[6]
         except Exception as e:
             print(e)
             raise Exception('Failed to load "trained.tflite" or "labels.txt", make sure to add these files on the SD card (' + str(e) + ')')
+        self.model = self._load_resident_model(model_size)
 
-    def classify(self, img, mode, roi_rect=None, use_indicators=True):
+    def _load_resident_model(self, model_size: int):
+        """
+        Load the model once into the heap, if ML_HEAP_RESERVE bytes of heap are still free afterwards.
+
+        Returns:
+            The loaded model, or the model path (fallback: tf reads the file on every inference)
+        """
+        gc.collect()
+        heap_free = gc.mem_free()
+        if model_size + cfg.ML_HEAP_RESERVE > heap_free:
+            print(f"Model ({model_size} bytes) does not fit in the heap ({heap_free} bytes free, {cfg.ML_HEAP_RESERVE} reserved), loading it on every inference")
+            return self.net_path
+        start = pyb.millis()
+        try:
+            model = tf.load(self.net_path, load_to_fb=False)
+        except MemoryError as e:
+            print(f"Failed to load the model into the heap ({e}), loading it on every inference")
+            return self.net_path
+        self.load_ms = pyb.elapsed_millis(start)
+        print(f"Loaded model ({model_size} bytes) in {self.load_ms} ms")
+        return model
+
+    def _count_inference(self, start_us: int):
+        duration = pyb.elapsed_micros(start_us)
+        self.inference_count += 1
+        self.inference_total_us += duration
+        self.inference_max_us = max(self.inference_max_us, duration)
+
+    def mean_inference_us(self):
+        """Mean duration of an inference call (a sliding window classification counts as one call)"""
+        return self.inference_total_us // self.inference_count if self.inference_count else 0
+
+    def _classify(self, img, **kwargs):
+        start = pyb.micros()
+        result = tf.classify(self.model, img, **kwargs)
+        self._count_inference(start)
+        return result
+
+    def _detect(self, img, **kwargs):
+        start = pyb.micros()
+        result = tf.detect(self.model, img, **kwargs)
+        self._count_inference(start)
+        return result
+
+    def classify(self, img, mode, use_indicators=True, picture_id=None, motion_rects=None):
         """
         Classify an image using the specified mode.
+        The detections are logged with picture_id (FRAME_CLASS, OBJECT_DETECT).
+        motion_rects: rectangles of the moving objects of the image (FRAME_CLASS, see _coarse_to_fine_windows)
         """
 
         self.has_detected = False
 
         if use_indicators: LED_YELLOW_ON()
 
+        start = profiler.start()
         if mode == ML_Mode.BLOB_CLASS:
             res = self.classify_blob(img)
+            profiler.stop("classify_blob", start)
         elif mode == ML_Mode.FRAME_CLASS:
-            res = self.classify_image(img, roi_rect)
+            res = self.classify_image(img, picture_id, motion_rects)
+            profiler.stop("classify_image", start)
         elif mode == ML_Mode.OBJECT_DETECT:
-            res = self.detect_objects(img)
+            res = self.detect_objects(img, picture_id=picture_id)
+            profiler.stop("detect_objects", start)
 
         if use_indicators: LED_YELLOW_OFF()
         return res
 
     def _rescale_image(self, img):
         """Rescale image to model resolution"""
+        start = profiler.start()
         img_resized = img.copy(
             x_size=self.model_res, 
             y_size=self.model_res,
             copy_to_fb=True,
             hint=image.BICUBIC
         )
+        profiler.stop("classify_rescale", start)
         return img_resized
     
     def classify_blob(self, img):
         """Classify a single blob image"""
-        img_resized = self._rescale_image(img)
-        obj = tf.classify(self.net_path, img_resized)[0]
-        output = obj.output()
-        self.has_detected = len(output) > 0
-        return obj.output()
-
-    def classify_image(self, img, roi_rect=None):
-        """Classify using sliding window approach"""
-
-        #only analyse when classification is feasible within reasonable time frame
-        # ? 2 consts ? deferred analysis of images when scale is too small (not working yet)
-        if (cfg.MIN_IMAGE_SCALE < cfg.THRESHOLD_IMAGE_SCALE_DEFER):
-            return
-            
+        return self.classify_blobs(img, [(0, 0, img.width(), img.height())])[0]
+
+    def classify_blobs(self, img, rects, use_indicators=True):
+        """
+        Classify the regions of the blobs of an image in one pass: each region is rescaled into the same preallocated
+        input buffer (no copy of the region) and run through the resident model.
+
+        Args:
+            img: The image containing the blobs (uncompressed)
+            rects: Regions (x, y, w, h) to classify
+        Returns:
+            outputs: Model output (confidence of every label) of every region
+        """
+        if use_indicators: LED_YELLOW_ON()
+        start = profiler.start()
+
+        if self.input_img is None:
+            self.input_img = image.Image(self.model_res, self.model_res, cfg.SENSOR_PIXFORMAT)
+        outputs = []
+        for rect in rects:
+            self.input_img.draw_image(img, 0, 0, x_scale=self.model_res / rect[2], y_scale=self.model_res / rect[3],
+                                      roi=rect, hint=image.BILINEAR)
+            outputs.append(self._classify(self.input_img)[0].output())
+        self.has_detected = len(outputs) > 0
+
+        profiler.stop("classify_blobs", start)
+        if use_indicators: LED_YELLOW_OFF()
+        return outputs
+
+    def get_classification(self, output, rect, picture_id=None):
+        """
+        Args:
+            output: Model output (confidence of every label)
+            rect: Classified region (x, y, w, h) in picture coordinates
+            picture_id: Id of the classified picture
+        Returns:
+            Classification with the CLASSIFICATION_TOP_K labels of highest confidence (all the labels if 0)
+        """
+        indices, confidences = top_k(output, self.top_k)
+        return Classification(picture_id, indices, confidences, rect)
+
+    def should_defer(self, mode):
+        """
+        Whether the classification is too long to run in the capture loop (sliding windows down to MIN_IMAGE_SCALE),
+        the image should then be queued for deferred classification.
+        """
+        return mode == ML_Mode.FRAME_CLASS and cfg.MIN_IMAGE_SCALE < cfg.THRESHOLD_IMAGE_SCALE_DEFER
+
+    def classify_image(self, img, picture_id=None, motion_rects=None):
+        """
+        Classify using sliding window approach (see should_defer), coarse to fine (CLASSIFY_COARSE_TO_FINE).
+        With CLASSIFY_EARLY_EXIT, stops at the first window with a target.
+
+        Returns:
+            Highest target confidence of the logged windows
+        """
+
+        # windows are logged in image coordinates
+        x_scale = img.width() / self.model_res
+        y_scale = img.height() / self.model_res
         img = self._rescale_image(img)
         confidence = 0
 
-        for obj in tf.classify(
-            self.net_path,
-            img,
-            min_scale=cfg.MIN_IMAGE_SCALE,
-            scale_mul=self.scale_mul,
-            x_overlap=self.x_overlap,
-            y_overlap=self.y_overlap
-        ):
-            output = obj.output()
-            if self._check_threshold(output):
+        if cfg.CLASSIFY_COARSE_TO_FINE:
+            if motion_rects:
+                motion_rects = [(int(x / x_scale), int(y / y_scale), int(w / x_scale), int(h / y_scale)) for (x, y, w, h) in motion_rects]
+            windows = self._coarse_to_fine_windows(img, motion_rects)
+        else:
+            windows = ((obj.rect(), obj.output(), self._target(obj.output())) for obj in self._classify(
+                img,
+                min_scale=cfg.MIN_IMAGE_SCALE,
+                scale_mul=self.scale_mul,
+                x_overlap=self.x_overlap,
+                y_overlap=self.y_overlap
+            ))
+
+        # (target label index, target confidence, Classification) of the windows above the threshold
+        hits = []
+        for (x, y, w, h), output, (target_index, target_confidence) in windows:
+            if target_confidence >= self.threshold_confidence:
                 self.has_detected = True
-                print("Detected target! Logging detection...")
-
-                self.detectionlog.append(
-                    picture_id=self.imagelog.picture_count,
-                    labels=self.labels,
-                    confidences=output,
-                    rect=roi_rect
-                )
+                confidence = max(confidence, target_confidence)
+                rect = (int(x * x_scale), int(y * y_scale), int(w * x_scale), int(h * y_scale))
+                hits.append((target_index, target_confidence, self.get_classification(output, rect, picture_id)))
+                if cfg.CLASSIFY_EARLY_EXIT:
+                    break
+
+        # overlapping windows of the same target: one detection per object
+        if cfg.CLASSIFY_NMS_IOU > 0 and len(hits) > 1:
+            detections = non_max_suppression(hits, cfg.CLASSIFY_NMS_IOU)
+        else:
+            detections = [classification for (_, _, classification) in hits]
+        if detections:
+            print("Detected target! Logging %d detection(s) of %d window(s)..." % (len(detections), len(hits)))
+        for classification in detections:
+            self.detectionlog.append(classification=classification)
         return confidence
-    
-    def _check_threshold(self, output):
-        """Check if any non-target class exceeds confidence threshold"""
-        for idx in range(len(output)):
-            if idx in self.non_target_indices:
-                continue
-            if output[idx] >= self.threshold_confidence:
+
+    def _coarse_to_fine_windows(self, img, motion_rects=None):
+        """
+        Sliding windows from the whole image down to MIN_IMAGE_SCALE, like tf.classify with scale_mul and overlaps, except that
+        only the windows with a target confidence above CLASSIFY_REFINE_CONFIDENCE are divided into all the windows of the next scale,
+        and the windows containing the center of a motion rectangle into the windows of the next scale containing it.
+
+        Args:
+            img: Image at model resolution
+            motion_rects: Rectangles (x, y, w, h) of the moving objects (image coordinates)
+        Yields:
+            (window rectangle, model output, (target label index, target confidence)) of every classified window
+        """
+        side = min(img.width(), img.height())
+        centers = [(x + w // 2, y + h // 2) for (x, y, w, h) in motion_rects] if motion_rects else []
+        windows = [(0, 0, side, side)]
+        scale = 1.0
+        while windows:
+            refine = []
+            follow = []
+            for rect in windows:
+                output = self._classify(img, roi=rect)[0].output()
+                target = self._target(output)
+                yield rect, output, target
+                if target[1] >= cfg.CLASSIFY_REFINE_CONFIDENCE:
+                    refine.append(rect)
+                elif self._contains_any(rect, centers):
+                    follow.append(rect)
+            scale *= self.scale_mul
+            if scale < cfg.MIN_IMAGE_SCALE:
+                return
+            window_side = max(1, int(side * scale))
+            windows = self._sub_windows(refine, window_side)
+            for rect in self._sub_windows(follow, window_side):
+                if not rect in windows and self._contains_any(rect, centers):
+                    windows.append(rect)
+
+    def _sub_windows(self, parents, side):
+        """
+        Returns:
+            Windows of the given side (with x_overlap, y_overlap) within the parent windows, without duplicates
+        """
+        x_step = max(1, int(side * (1 - self.x_overlap)))
+        y_step = max(1, int(side * (1 - self.y_overlap)))
+        windows = set()
+        for (px, py, pw, ph) in parents:
+            for y in range(py, py + ph - side + 1, y_step):
+                for x in range(px, px + pw - side + 1, x_step):
+                    windows.add((x, y, side, side))
+        return sorted(windows)
+
+    @staticmethod
+    def _contains_any(rect, points):
+        x, y, w, h = rect
+        for (px, py) in points:
+            if x <= px < x + w and y <= py < y + h:
                 return True
         return False
 
-    def detect_objects(self, img, use_indicators=True):
+    def _target(self, output):
+        """(index, confidence) of the target class of highest confidence ((None, 0) if none)"""
+        if self.target_indices is not None:
+            return argmax(output, self.target_indices)
+        indices, confidences = top_k(output, 1, self.target_runs)
+        return (indices[0], confidences[0]) if indices else (None, 0)
+
+    def detect_objects(self, img, use_indicators=True, picture_id=None):
         """Detect objects with thresholding"""
 
         threshold_value = math.ceil(self.threshold_confidence * 255)
         confidence = 0
 
-        for class_id, detection_list in enumerate(tf.detect(
-            self.net_path,
+        for class_id, detection_list in enumerate(self._detect(
             img,
             thresholds=[(threshold_value, 255)]  # Original code's approach
         )):
@@ -133,11 +315,6 @@ class Classifier:
                 if use_indicators: 
                     img.draw_rectangle(detection.rect(), color=cfg.CLASS_COLORS[class_id-1], thickness=2)
                 
-                self.detectionlog.append(
-                    picture_id=self.imagelog.picture_count,
-                    labels=self.labels[class_id],
-                    confidences=detection[4],
-                    rect=detection.rect()
-                )
+                self.detectionlog.append(classification=Classification(picture_id, [class_id], [detection[4]], detection.rect()))
                 
         return confidence
\ No newline at end of file
@@ -14,9 +14,12 @@ class Frame:
 
     id = 0 # (static) (overflow à 9223372036854775807/(86400*60fps)=1779199852788j)
     BASE_FOLDER = "jpegs"
+    folders = set() # (static) registry of the existing folders of BASE_FOLDER, see load_folders
+    on_save = None # (static) called before an image is written, e.g. to persist the picture ids (see Session.record_counters)
     CAN_SAVE_ANY_IMG = cfg.IMG_SAVE_FILTER and ImageType.DEFAULT in cfg.IMG_SAVE_FILTER
     CAN_SAVE_DETECTION_IMG = cfg.IMG_SAVE_FILTER and ImageType.DETECTION in cfg.IMG_SAVE_FILTER
     CAN_SAVE_TRIGGER_IMG = cfg.IMG_SAVE_FILTER and ImageType.TRIGGER in cfg.IMG_SAVE_FILTER
+    CAN_SAVE_DIFF_IMG = cfg.IMG_SAVE_FILTER and ImageType.DIFFERENCE in cfg.IMG_SAVE_FILTER
     
     # def __init__(self, arg, buffer:bytes|bytearray|memoryview|None=None, copy_to_fb:bool=False):
     #     super().__init__(arg, buffer, copy_to_fb)
@@ -56,6 +59,27 @@ class Frame:
         """
         Frame.id = id
 
+    @staticmethod
+    def load_folders():
+        """
+        Fill the folder registry from the BASE_FOLDER of the current session (once, when the session is created or loaded),
+        so saving an image does not list the directory.
+        """
+        Frame.folders = set(f"{Frame.BASE_FOLDER}/{name}" for name in os.listdir(Frame.BASE_FOLDER))
+
+    @staticmethod
+    def make_folder(folderpath: str):
+        """
+        Create the folder if it is not in the registry.
+        """
+        if folderpath in Frame.folders:
+            return
+        try:
+            os.mkdir(folderpath)
+        except OSError:
+            pass # already exists (e.g. shard folder of a loaded session)
+        Frame.folders.add(folderpath)
+
     # @classmethod
     # def from_Image(cls, obj: image.Image):
     #     """
@@ -84,18 +108,29 @@ class Frame:
         """
         return (Frame.CAN_SAVE_ANY_IMG
                 or (Frame.CAN_SAVE_TRIGGER_IMG and self.image_type == ImageType.TRIGGER)
-                or (Frame.CAN_SAVE_DETECTION_IMG and self.image_type == ImageType.DETECTION))
+                or (Frame.CAN_SAVE_DETECTION_IMG and self.image_type == ImageType.DETECTION)
+                or (Frame.CAN_SAVE_DIFF_IMG and self.image_type == ImageType.DIFFERENCE))
     
     @led_green
     def save(self, foldername: str, filename: str = "",):
+        """
+        Save the image in the folder (of BASE_FOLDER) as filename.jpg (frame id by default).
+
+        :return: The path of the saved image.
+        """
         if not filename:
             filename = str(self.id)
         folderpath = f"{Frame.BASE_FOLDER}/{foldername}"
-        if not foldername in os.listdir(Frame.BASE_FOLDER):
-            os.mkdir(folderpath)
+        Frame.make_folder(folderpath)
+        if cfg.IMG_FOLDER_SHARD_SIZE > 0:
+            folderpath = f"{folderpath}/{self.id // cfg.IMG_FOLDER_SHARD_SIZE:04d}"
+            Frame.make_folder(folderpath)
         path = f"{folderpath}/{filename}.jpg"
+        if Frame.on_save:
+            Frame.on_save()
         print(f"Saving image to {path}")
         self.img.save(path, quality=cfg.JPEG_QUALITY)
+        return path
 
     def log(self, imagelog):
         imagelog.append(self)
@@ -114,6 +149,40 @@ class Frame:
         self.img.draw_rectangle(*blob.rect(), color=rect_color, thickness=thickness)
         return self
     
+    def get_blob_region(self, blob, shape: int = BlobExportShape.RECTANGLE):
+        """
+        Region of interest around a blob
+        
+        Args:
+            blob: The blob
+            shape: The shape of the region (rectangle or square)
+            
+        Returns:
+            blob_rect: Rectangle coordinates (x, y, w, h) of the blob region
+        """
+        if shape == BlobExportShape.RECTANGLE:
+            return blob.rect()
+        # Make a square using the largest dimension
+        size = max(blob.w(), blob.h())
+        
+        # Check if square is too large for the image
+        if size > self.img.height():
+            print("Cannot export blob bounding square as its size would exceed the image height! Using image height instead.")
+            size = self.img.height()
+        
+        # Position the square, keeping original top-left corner if possible
+        x = blob.x()
+        y = blob.y()
+        
+        # Make sure the square stays within image bounds
+        if x + size > self.img.width():
+            x = self.img.width() - size
+        
+        if y + size > self.img.height():
+            y = self.img.height() - size
+        
+        return (x, y, size, size)
+
     def extract_blob_region(self, blob, shape: int = BlobExportShape.RECTANGLE, img = None):
         """
         Extract the region of interest around a blob
@@ -123,32 +192,9 @@ class Frame:
             shape: The shape to extract (rectangle or square)
             
         Returns:
-            blob_rect: Rectangle coordinates for the blob region
-            img_blob: Image of the extracted region
+            Frame of the extracted region (its roi_rect is the blob region, see get_blob_region)
         """
-        if shape == BlobExportShape.RECTANGLE:
-            blob_rect = blob.rect()
-        elif shape == BlobExportShape.SQUARE:
-            # Make a square using the largest dimension
-            size = max(blob.w(), blob.h())
-            
-            # Check if square is too large for the image
-            if size > self.img.height():
-                print("Cannot export blob bounding square as its size would exceed the image height! Using image height instead.")
-                size = self.img.height()
-            
-            # Position the square, keeping original top-left corner if possible
-            x = blob.x()
-            y = blob.y()
-            
-            # Make sure the square stays within image bounds
-            if x + size > self.img.width():
-                x = self.img.width() - size
-            
-            if y + size > self.img.height():
-                y = self.img.height() - size
-            
-            blob_rect = (x, y, size, size)
+        blob_rect = self.get_blob_region(blob, shape)
         
         # Extract blob region from the image
         if not img:
@@ -1,9 +1,13 @@
 import sensor, image, pyb
 import config.settings as cfg
-from config.settings import ML_Mode
+from config.settings import DiffSavePolicy
 from hardware.led import LED_CYAN_ON, LED_CYAN_OFF
 from vision.frame import Frame
 from vision.image_type import ImageType
+from vision.scaled_blob import ScaledBlob
+from vision.background_model import BackgroundModel
+from vision.tracker import Tracker
+from util.profiler import profiler
 
 
 class FrameDifferencer:
@@ -29,18 +33,55 @@ class FrameDifferencer:
             self.detectionlog = session.detectionlog
             self.imagelog = session.imagelog
         self.img_ref_fb: image.Image
+        self.img_raw_fb: image.Image | None = None
+        self.img_small_fb: image.Image | None = None
+        self.background: BackgroundModel | None = None
+        self.img_mask_fb: image.Image | None = None
+        # rectangles of the last blobs (at detection resolution), left out of the next blend
+        self.masked_rects = []
+        self.masked_count = 0
+        # detection resolution: blob thresholds and sizes of the downscaled grayscale image
+        self.scale = cfg.FD_DETECTION_SCALE
+        self.grayscale = self.scale > 1 or cfg.FD_BACKGROUND_MODEL == "running"
+        self.thresholds = cfg.BLOB_GRAY_THRESHOLDS if self.grayscale else cfg.BLOB_COLOR_THRESHOLDS
+        self.min_blob_pixels = cfg.MIN_BLOB_PIXELS // (self.scale * self.scale)
+        self.max_blob_pixels = cfg.MAX_BLOB_PIXELS // (self.scale * self.scale)
         self.started = False
         self.has_found_blobs = False
+        # full resolution rectangles of the blobs processed on the last image
+        self.blob_rects = []
+        self.diff_count = 0
+        self.start_time_diff_save_ms = pyb.millis()
+        self.tracker = Tracker() if cfg.TRACKING_ENABLED else None
         self.initialize_framebuffers()
-        if (cfg.EXPOSURE_MODE=="auto"): 
+        if (cfg.EXPOSURE_MODE=="auto" and not self.background): 
             print("ATTENTION: using automatic exposure with frame differencing can result in spurious triggers!")
         
     def initialize_framebuffers(self):
         """Allocate frame buffers for reference and original images"""
         # De-allocate frame buffers just in case
         sensor.dealloc_extra_fb()  
+        if self.grayscale:
+            # Allocate frame buffers for the background and current images at detection resolution
+            # (the current image is not overwritten: no copy of it is needed)
+            width, height = self.image_width // self.scale, self.image_height // self.scale
+            if cfg.FD_BACKGROUND_MODEL == "running":
+                self.background = BackgroundModel(width, height)
+                self.img_ref_fb = self.background.mean
+            else:
+                self.img_ref_fb = sensor.alloc_extra_fb(width, height, sensor.GRAYSCALE)
+                if cfg.FD_MASK_BLOBS:
+                    self.img_mask_fb = sensor.alloc_extra_fb(width, height, sensor.BINARY)
+            self.img_small_fb = sensor.alloc_extra_fb(width, height, sensor.GRAYSCALE)
+            return
         # Allocate frame buffers for reference images
         self.img_ref_fb = sensor.alloc_extra_fb(self.image_width, self.image_height, self.sensor_pixformat)
+        # Allocate frame buffer for the mask of the static regions
+        if cfg.FD_MASK_BLOBS:
+            self.img_mask_fb = sensor.alloc_extra_fb(self.image_width, self.image_height, sensor.BINARY)
+        # Allocate frame buffer for the uncompressed copy of the current image
+        if cfg.FD_LAZY_JPEG:
+            self.img_raw_fb = sensor.alloc_extra_fb(self.image_width, self.image_height, self.sensor_pixformat)
     
     def set_reference_image(self, frame: Frame):
         """
@@ -50,10 +91,55 @@ class FrameDifferencer:
             frame: Frame object containing the current image to save as reference
         """
         # Store the image as reference
-        self.img_ref_fb.replace(frame.img)
+        if self.background:
+            self.background.reset(self.downscale(frame).img)
+        elif self.grayscale:
+            self.img_ref_fb.replace(self.downscale(frame).img)
+        else:
+            self.img_ref_fb.replace(frame.img)
         frame.save_and_log("reference", self.imagelog)
         self.start_time_blending_ms = pyb.millis()
 
+    def mask_blobs(self, blobs: list[image.blob]):
+        """
+        Leave the areas of the blobs out of the next background update (FD_MASK_BLOBS).
+        The rectangles are grown by half their size to cover the motion until the update. They are updated anyway
+        after FD_MAX_MASKED_FRAMES consecutive masked updates.
+        
+        Args:
+            blobs: Blobs found on the difference image (at detection resolution)
+        """
+        if not blobs or not cfg.FD_MASK_BLOBS or self.masked_count >= cfg.FD_MAX_MASKED_FRAMES:
+            self.masked_rects = []
+            self.masked_count = 0
+        else:
+            self.masked_rects = [(b.x() - b.w() // 2, b.y() - b.h() // 2, 2 * b.w(), 2 * b.h()) for b in blobs]
+            self.masked_count += 1
+        if self.background:
+            self.background.set_foreground(self.masked_rects)
+
+    def get_static_mask(self):
+        """
+        Returns:
+            Mask of the static regions (the image without the masked rectangles) in the mask framebuffer
+        """
+        self.img_mask_fb.draw_rectangle(0, 0, self.img_mask_fb.width(), self.img_mask_fb.height(), color=1, fill=True)
+        for rect in self.masked_rects:
+            self.img_mask_fb.draw_rectangle(*rect, color=0, fill=True)
+        return self.img_mask_fb
+
+    def downscale(self, frame: Frame):
+        """
+        Draw the image at detection resolution, in grayscale, into the detection framebuffer
+        
+        Args:
+            frame: Frame object containing the full resolution image
+        Returns:
+            Frame of the detection framebuffer
+        """
+        self.img_small_fb.draw_image(frame.img, 0, 0, x_scale=1/self.scale, y_scale=1/self.scale, hint=image.AREA)
+        return Frame(self.img_small_fb, frame.capture_time, frame.exposure_us, frame.gain_db, frame.fps, ImageType.DIFFERENCE, frame.roi_rect, id=frame.id)
+
     def get_reference_image(self):
         """Return the reference image framebuffer"""
         return self.img_ref_fb
@@ -75,13 +161,29 @@ class FrameDifferencer:
         # low blending of the new image while a high alpha results in high
         # blending of the new image. We need to reverse that for this update.
         #blend with frame that is in buffer
-        frame.img.blend(self.img_ref_fb, alpha=(256-cfg.BACKGROUND_BLEND_LEVEL))
-        self.img_ref_fb.replace(frame.img)
+        reference_frame = frame
+        if self.masked_rects:
+            # Blend only the static regions: the reference keeps its pixels where the last blobs were.
+            # Same blend as below, from the reference side: REF = NEW*alpha + REF*(256-alpha)
+            mask = self.get_static_mask()
+            if self.grayscale:
+                self.img_ref_fb.blend(self.downscale(frame).img, alpha=cfg.BACKGROUND_BLEND_LEVEL, mask=mask)
+            else:
+                self.img_ref_fb.blend(frame.img, alpha=cfg.BACKGROUND_BLEND_LEVEL, mask=mask)
+                reference_frame = Frame(self.img_ref_fb, frame.capture_time, frame.exposure_us, frame.gain_db, frame.fps, frame.image_type, frame.roi_rect, id=frame.id)
+        elif self.grayscale:
+            # the saved reference is then the unblended full resolution image
+            small_frame = self.downscale(frame)
+            small_frame.img.blend(self.img_ref_fb, alpha=(256-cfg.BACKGROUND_BLEND_LEVEL))
+            self.img_ref_fb.replace(small_frame.img)
+        else:
+            frame.img.blend(self.img_ref_fb, alpha=(256-cfg.BACKGROUND_BLEND_LEVEL))
+            self.img_ref_fb.replace(frame.img)
 
         if cfg.INDICATORS_ENABLED: LED_CYAN_OFF()
 
         # Save reference image to disk
-        frame.save_and_log("reference", self.imagelog)
+        reference_frame.save_and_log("reference", self.imagelog)
 
         self.start_time_blending_ms = pyb.millis()
         return
@@ -94,12 +196,88 @@ class FrameDifferencer:
         Args:
             frame: Frame object containing the current image to process
         """
-        # Compute absolute frame difference
-        frame.img.difference(self.img_ref_fb)
-        frame.img.gaussian(2)  # Apply Gaussian blur to reduce noise
+        # Compute absolute frame difference (deviation from the running background beyond the usual deviation)
+        if self.background:
+            frame.img = self.background.update(frame.img)
+        else:
+            frame.img.difference(self.img_ref_fb)
+        frame.img.gaussian(2 if self.scale == 1 else 1)  # Apply Gaussian blur to reduce noise
         # frame.img.gamma(2.0)  # Apply gamma correction to enhance contrast
         return frame
         
+    def find_changed_rois(self, diff_frame: Frame):
+        """
+        Coarse change map of the difference image: each tile of FD_TILE_SIZE pixels is reduced to its mean,
+        tiles with a mean outside the "no change" thresholds are changed.
+        
+        Args:
+            diff_frame: Frame object containing the difference image
+        Returns:
+            rois: Rectangles (x, y, w, h) covering the groups of neighbouring changed tiles, with a margin of one tile
+                  so that blobs crossing a quiet tile border are found whole. Groups closer than 3 tiles are merged,
+                  so the rectangles do not overlap.
+        """
+        tile = cfg.FD_TILE_SIZE
+        change_map = diff_frame.img.mean_pooled(tile, tile)
+        width, height = diff_frame.img.width(), diff_frame.img.height()
+        rois = []
+        for group in change_map.find_blobs(self.thresholds, invert=True, merge=True, margin=2, pixels_threshold=1, area_threshold=1):
+            x0 = max(0, (group.x() - 1) * tile)
+            y0 = max(0, (group.y() - 1) * tile)
+            # the image border not covered by the map belongs to the last tiles
+            x1 = width if group.x() + group.w() + 1 >= change_map.width() else (group.x() + group.w() + 1) * tile
+            y1 = height if group.y() + group.h() + 1 >= change_map.height() else (group.y() + group.h() + 1) * tile
+            rois.append((x0, y0, x1 - x0, y1 - y0))
+        return rois
+
+    def find_blobs_in_rois(self, diff_frame: Frame, rois: list):
+        """
+        Find the blobs of the difference image within the given (non-overlapping) rectangles.
+        A blob reaching the border of its rectangle (not the image border) may continue in a quiet tile or in another rectangle:
+        the rectangle is then grown by one tile, merged with the rectangles it overlaps and searched again.
+        
+        Args:
+            diff_frame: Frame object containing the difference image
+            rois: Rectangles (x, y, w, h) to search
+        Returns:
+            blobs: List of the blobs found
+        """
+        tile = cfg.FD_TILE_SIZE
+        width, height = diff_frame.img.width(), diff_frame.img.height()
+        searched = [] # (roi, blobs) of the rectangles searched without cut blobs
+        rois = list(rois)
+        while rois:
+            x, y, w, h = rois.pop()
+            found = diff_frame.img.find_blobs(self.thresholds, invert=True, merge=False, pixels_threshold=self.min_blob_pixels, roi=(x, y, w, h))
+            cut = False
+            for b in found:
+                if ((b.x() <= x and x > 0) or (b.y() <= y and y > 0)
+                    or (b.x() + b.w() >= x + w and x + w < width) or (b.y() + b.h() >= y + h and y + h < height)):
+                    cut = True
+                    break
+            if not cut:
+                searched.append(((x, y, w, h), found))
+                continue
+            # grow and merge with the overlapping rectangles (searching them again if needed)
+            x0, y0 = max(0, x - tile), max(0, y - tile)
+            x1, y1 = min(width, x + w + tile), min(height, y + h + tile)
+            merged = True
+            while merged:
+                merged = False
+                for other in rois + [roi for (roi, _) in searched]:
+                    ox, oy, ow, oh = other
+                    if ox < x1 and oy < y1 and ox + ow > x0 and oy + oh > y0:
+                        x0, y0 = min(x0, ox), min(y0, oy)
+                        x1, y1 = max(x1, ox + ow), max(y1, oy + oh)
+                        rois = [roi for roi in rois if roi != other]
+                        searched = [item for item in searched if item[0] != other]
+                        merged = True
+            rois.append((x0, y0, x1 - x0, y1 - y0))
+        blobs = []
+        for (_, found) in searched:
+            blobs += found
+        return blobs
+
     def find_blobs(self, diff_frame: Frame):
         """
         Process a frame for motion detection with frame differencing.
@@ -112,18 +290,25 @@ class FrameDifferencer:
         Sets: self.has_found_blobs to True if blobs are found, False otherwise.
         """
 
-        blobs: list[image.blob]
+        blobs: list[image.blob] = []
         self.has_found_blobs = False
 
         try:
-            # Find blobs in the difference image
-            blobs = diff_frame.img.find_blobs(cfg.BLOB_COLOR_THRESHOLDS, invert=True, merge=False, pixels_threshold=cfg.MIN_BLOB_PIXELS)
+            if cfg.FD_TILE_SIZE > 0:
+                # Find blobs only around the tiles that changed
+                start = profiler.start()
+                rois = self.find_changed_rois(diff_frame)
+                profiler.stop("fd_change_map", start)
+                blobs = self.find_blobs_in_rois(diff_frame, rois)
+            else:
+                # Find blobs in the difference image
+                blobs = diff_frame.img.find_blobs(self.thresholds, invert=True, merge=False, pixels_threshold=self.min_blob_pixels)
         except MemoryError:
             self.has_found_blobs = True
             print("Memory error in blob detection - assuming triggered")
         
         # filter blobs with maximum pixels condition
-        blobs = [b for b in blobs if b.pixels() < cfg.MAX_BLOB_PIXELS]
+        blobs = [b for b in blobs if b.pixels() < self.max_blob_pixels]
 
         if len(blobs) > 0:
             print(f"{len(blobs)} blob(s) within range!")
@@ -131,26 +316,118 @@ class FrameDifferencer:
 
         return blobs
     
+    def track_blobs(self, blobs: list):
+        """
+        Update the tracks with the blobs of the difference image, pass the ended tracks to the listener,
+        and the open tracks whose best crop is due (see Track.is_crop_due).
+        
+        Args:
+            blobs: Blobs to process (full resolution coordinates), in logging order
+        Returns:
+            tracks: Track of every blob
+        """
+        # new tracks take the detection id of their first detection
+        first_id = self.detectionlog.detection_count + 1 if self.session else self.tracker.last_id + 1
+        tracks, ended = self.tracker.update(blobs, first_id)
+        for track in ended:
+            self.listener.on_track_ended(track)
+        for track in self.tracker.tracks:
+            if track.is_crop_due():
+                self.listener.on_track_crop(track)
+        return tracks
+
+    def end_tracks(self):
+        """
+        End all the open tracks (e.g. before deep sleep), passing them to the listener.
+        """
+        if self.tracker:
+            for track in self.tracker.end_all():
+                self.listener.on_track_ended(track)
+
     def process_blobs(self, blobs: list[image.blob], jpeg_frame: Frame, diff_frame: Frame, mark: bool = cfg.INDICATORS_ENABLED):
+        """
+        Pass the blobs of the frame to the listener at once, in full resolution coordinates, with their track (TRACKING_ENABLED),
+        then log them with the classification results returned by the listener.
         
+        Args:
+            blobs: Blobs found on the difference image (at detection resolution)
+            jpeg_frame: Frame object containing the full resolution image
+            diff_frame: Frame object containing the difference image
+        """
         nb_blobs_to_process = len(blobs) if cfg.MAX_BLOB_TO_PROCESS == -1 else min(cfg.MAX_BLOB_TO_PROCESS, len(blobs))
+        # back to full resolution coordinates
+        full_blobs = [self.to_full_resolution(b) for b in blobs[:nb_blobs_to_process]]
+        self.blob_rects = [b.rect() for b in full_blobs]
+
+        tracks = [None] * nb_blobs_to_process
+        if self.tracker:
+            start = profiler.start()
+            tracks = self.track_blobs(full_blobs)
+            profiler.stop("fd_tracking", start)
 
+        color_statistics = []
         for i in range(0, nb_blobs_to_process):
             
             blob = blobs[i]
             # optional marking of blobs, drawing not supported on compressed images...
             if (mark):
-                diff_frame.mark_blob(blob)
+                diff_frame.mark_blob(blob, thickness=max(1, 5 // self.scale))
             
             if self.session:
-                # log each detected blob, we finish the CSV line here if not classifying
                 # stats not supported on compressed images...
-                color_statistics = diff_frame.get_statistics(roi = blob.rect(), thresholds = cfg.BLOB_COLOR_THRESHOLDS)
-                self.detectionlog.append(diff_frame.id, blob, color_statistics, end_line=(cfg.ML_MODE != ML_Mode.BLOB_CLASS))
-            
-            self.listener.on_blob_found(jpeg_frame, blob)
+                start = profiler.start()
+                color_statistics.append(diff_frame.get_statistics(roi = blob.rect(), thresholds = self.thresholds))
+                profiler.stop("fd_statistics", start)
+
+        # Classification of the classified blobs
+        results = self.listener.on_blobs_found(jpeg_frame, full_blobs, tracks)
+
+        if self.session:
+            # log each detected blob, with its classification if any
+            start = profiler.start()
+            for i in range(0, nb_blobs_to_process):
+                track_id = tracks[i].id if tracks[i] else None
+                self.detectionlog.append(diff_frame.id, full_blobs[i], color_statistics[i], results[i], track_id=track_id)
+            profiler.stop("log_detection", start)
+
+    def get_motion_rects(self):
+        """
+        Returns:
+            Full resolution rectangles of the recent moving objects: the blobs of the last image and the open tracks
+            (which stay through the images without differencing, e.g. background blending)
+        """
+        rects = list(self.blob_rects)
+        if self.tracker:
+            rects += [track.rect for track in self.tracker.tracks]
+        return rects
+
+    def to_full_resolution(self, blob):
+        """
+        Returns:
+            The blob in full resolution coordinates
+        """
+        return ScaledBlob(blob, self.scale) if self.scale > 1 else blob
 
     
+    def should_save_difference(self, diff_frame: Frame):
+        """
+        Whether the difference image should be saved, according to IMG_SAVE_FILTER and DIFF_SAVE_POLICY.
+        Call once per difference image, after find_blobs.
+        """
+        self.diff_count += 1
+        if not diff_frame.can_save():
+            return False
+        if cfg.DIFF_SAVE_POLICY == DiffSavePolicy.TRIGGER:
+            return self.has_found_blobs
+        if cfg.DIFF_SAVE_POLICY == DiffSavePolicy.EVERY_NTH:
+            return self.diff_count % cfg.DIFF_SAVE_EVERY_NTH == 0
+        if cfg.DIFF_SAVE_POLICY == DiffSavePolicy.INTERVAL:
+            if pyb.elapsed_millis(self.start_time_diff_save_ms) < cfg.DIFF_SAVE_INTERVAL_MS:
+                return False
+            self.start_time_diff_save_ms = pyb.millis()
+            return True
+        return False
+
     def update(self, frame: Frame):
         """
         Update the frame differencer with a new frame.
@@ -158,6 +435,7 @@ class FrameDifferencer:
         Args:
             frame: Frame object containing the new image to process
         """
+        self.blob_rects = []
         
         # If no reference image is set or there was any change precedently, set the current image as reference
         if (not self.started):
@@ -166,28 +444,63 @@ class FrameDifferencer:
             self.started = True
             self.listener.on_background_reset()
             return frame
-        # If the reference image is set, check if we need to blend the background
-        # TODO: track detections rects and blend on no movement, multi blobs: mask?
+        # The running background is updated with every image: only save the reference image periodically
+        elif (self.background):
+            if pyb.elapsed_millis(self.start_time_blending_ms) > cfg.BLEND_TIMEOUT_MS:
+                frame.save_and_log("reference", self.imagelog)
+                self.start_time_blending_ms = pyb.millis()
+        # If the reference image is set, check if we need to blend the background (without the blobs, see mask_blobs)
         elif (self.has_found_blobs or pyb.elapsed_millis(self.start_time_blending_ms) > cfg.BLEND_TIMEOUT_MS):
+            start = profiler.start()
             self.blend_background(frame)
+            profiler.stop("fd_blend", start)
             self.has_found_blobs = False
             return frame
 
-        # copy at save-quality before differencing it (image.difference() overwrites)
-        jpeg_frame = frame.to_jpeg(quality=cfg.JPEG_QUALITY, copy=True)
-        diff_frame = Frame(frame.img, frame.capture_time, frame.exposure_us, frame.gain_db, frame.fps, frame.image_type, frame.roi_rect, id=frame.id)
+        if self.grayscale:
+            # differencing at detection resolution leaves the image untouched
+            jpeg_frame = frame
+            start = profiler.start()
+            diff_frame = self.downscale(frame)
+            profiler.stop("fd_downscale", start)
+        # copy before differencing it (image.difference() overwrites)
+        elif self.img_raw_fb:
+            # uncompressed copy: compressed by Frame.save only if the frame is saved
+            start = profiler.start()
+            self.img_raw_fb.replace(frame.img)
+            jpeg_frame = Frame(self.img_raw_fb, frame.capture_time, frame.exposure_us, frame.gain_db, frame.fps, frame.image_type, frame.roi_rect, id=frame.id)
+            profiler.stop("fd_copy", start)
+        else:
+            # copy at save-quality
+            start = profiler.start()
+            jpeg_frame = frame.to_jpeg(quality=cfg.JPEG_QUALITY, copy=True)
+            profiler.stop("fd_to_jpeg", start)
+        if not self.grayscale:
+            diff_frame = Frame(frame.img, frame.capture_time, frame.exposure_us, frame.gain_db, frame.fps, ImageType.DIFFERENCE, frame.roi_rect, id=frame.id)
         
+        start = profiler.start()
         self.difference(diff_frame)
-        diff_frame.save("diff")
+        profiler.stop("fd_difference", start)
+        start = profiler.start()
         blobs = self.find_blobs(diff_frame)
+        profiler.stop("fd_find_blobs", start)
+
+        self.mask_blobs(blobs)
 
         if self.has_found_blobs:
             jpeg_frame.image_type = ImageType.TRIGGER
             self.listener.on_triggered(jpeg_frame)
 
-        if not blobs: return jpeg_frame
+        if blobs:
+            self.process_blobs(blobs, jpeg_frame, diff_frame)
+        elif self.tracker:
+            self.track_blobs([])
 
-        self.process_blobs(blobs, jpeg_frame, diff_frame)
+        # saved after blob processing: includes the blob markings
+        if self.should_save_difference(diff_frame):
+            start = profiler.start()
+            diff_frame.save("diff")
+            profiler.stop("fd_save_diff", start)
 
         return jpeg_frame
 
@@ -5,4 +5,5 @@ class ImageType:
     """
     DEFAULT:int = 0
     TRIGGER:int = 1
-    DETECTION:int = 2
\ No newline at end of file
+    DETECTION:int = 2
+    DIFFERENCE:int = 3
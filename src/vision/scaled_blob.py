@@ -0,0 +1,52 @@
+class ScaledBlob:
+    """
+    Full resolution view of a blob found on a downscaled image (see FD_DETECTION_SCALE).
+    Provides the image.blob methods used for logging, blob extraction and classification.
+    """
+
+    def __init__(self, blob, scale: int):
+        """
+        :param blob: The blob found on the downscaled image.
+        :param scale: Downscaling factor of the image the blob was found on.
+        """
+        self.blob = blob
+        self.scale = scale
+
+    def rect(self):
+        return (self.x(), self.y(), self.w(), self.h())
+
+    def x(self):
+        return self.blob.x() * self.scale
+
+    def y(self):
+        return self.blob.y() * self.scale
+
+    def w(self):
+        return self.blob.w() * self.scale
+
+    def h(self):
+        return self.blob.h() * self.scale
+
+    def cx(self):
+        return self.blob.cx() * self.scale
+
+    def cy(self):
+        return self.blob.cy() * self.scale
+
+    def pixels(self):
+        return self.blob.pixels() * self.scale * self.scale
+
+    def area(self):
+        return self.w() * self.h()
+
+    def density(self):
+        return self.blob.density()
+
+    def elongation(self):
+        return self.blob.elongation()
+
+    def rotation(self):
+        return self.blob.rotation()
+
+    def corners(self):
+        return [(x * self.scale, y * self.scale) for (x, y) in self.blob.corners()]
@@ -0,0 +1,202 @@
+import pyb
+import config.settings as cfg
+
+
+def iou(rect_a, rect_b):
+    """
+    Intersection over union of two rectangles (x, y, w, h).
+    """
+    x0 = max(rect_a[0], rect_b[0])
+    y0 = max(rect_a[1], rect_b[1])
+    x1 = min(rect_a[0] + rect_a[2], rect_b[0] + rect_b[2])
+    y1 = min(rect_a[1] + rect_a[3], rect_b[1] + rect_b[3])
+    if x1 <= x0 or y1 <= y0:
+        return 0.0
+    intersection = (x1 - x0) * (y1 - y0)
+    return intersection / (rect_a[2] * rect_a[3] + rect_b[2] * rect_b[3] - intersection)
+
+
+class Track:
+    """
+    A blob followed across frames: the same animal/object while it stays in view.
+    Keeps the classification budget of the object and its best (largest) crop, saved when the track ends
+    (or when it is older than TRACK_CROP_MAX_AGE_MS).
+    """
+
+    def __init__(self, id: int, blob, now_ms: int):
+        """
+        :param id: Track id, the detection id of the first detection of the track.
+        :param blob: First blob of the track (full resolution coordinates).
+        :param now_ms: Current time (pyb.millis()).
+        """
+        self.id = id
+        self.rect = blob.rect()
+        self.cx = blob.cx()
+        self.cy = blob.cy()
+        self.start_time_ms = now_ms
+        self.hits = 1 # number of frames the track was found on
+        self.misses = 0 # number of consecutive frames the track was not found on
+        self.classified_count = 0
+        self.start_time_classified_ms = now_ms
+        self.best_pixels = 0
+        self.best_crop = None # compressed Frame of the largest crop, see keep_crop
+        self.best_filename = ""
+        self.start_time_crop_ms = now_ms
+
+    def age_ms(self, now_ms: int):
+        return now_ms - self.start_time_ms
+
+    def update(self, blob):
+        self.rect = blob.rect()
+        self.cx = blob.cx()
+        self.cy = blob.cy()
+        self.hits += 1
+        self.misses = 0
+
+    def should_classify(self):
+        """
+        Whether the current blob of the track should be classified: the first time, then every TRACK_CLASSIFY_INTERVAL_MS
+        (0: only once), at most TRACK_MAX_CLASSIFICATIONS times (0: no maximum).
+        """
+        if self.classified_count == 0:
+            return True
+        if cfg.TRACK_CLASSIFY_INTERVAL_MS <= 0:
+            return False
+        if cfg.TRACK_MAX_CLASSIFICATIONS > 0 and self.classified_count >= cfg.TRACK_MAX_CLASSIFICATIONS:
+            return False
+        return pyb.elapsed_millis(self.start_time_classified_ms) > cfg.TRACK_CLASSIFY_INTERVAL_MS
+
+    def set_classified(self):
+        self.classified_count += 1
+        self.start_time_classified_ms = pyb.millis()
+
+    def is_better_crop(self, blob):
+        return blob.pixels() > self.best_pixels
+
+    def keep_crop(self, crop, filename: str, pixels: int):
+        """
+        Keep the crop as the best one of the track (replacing the previous one), compressed in place.
+
+        :param crop: Frame of the extracted blob region.
+        :param filename: File name of the crop, used when the track ends.
+        :param pixels: Pixel count of the blob.
+        """
+        self.best_crop = crop.to_jpeg(quality=cfg.JPEG_QUALITY)
+        self.best_filename = filename
+        self.best_pixels = pixels
+        self.start_time_crop_ms = pyb.millis()
+
+    def is_crop_due(self):
+        """
+        Whether the best crop has been kept for more than TRACK_CROP_MAX_AGE_MS and should be saved while the track goes on.
+        """
+        return (self.best_crop is not None and cfg.TRACK_CROP_MAX_AGE_MS > 0
+                and pyb.elapsed_millis(self.start_time_crop_ms) > cfg.TRACK_CROP_MAX_AGE_MS)
+
+
+class Tracker:
+    """
+    Associates the blobs of consecutive difference images to tracks: greedily by decreasing overlap (IoU),
+    then the remaining blobs by the distance of their centroid to the one of the remaining tracks (small fast objects).
+    A track ends after TRACK_MAX_MISSES consecutive frames without its blob.
+    """
+
+    def __init__(self, min_iou: float = cfg.TRACK_MIN_IOU, max_misses: int = cfg.TRACK_MAX_MISSES, max_tracks: int = cfg.TRACK_MAX_COUNT):
+        self.min_iou = min_iou
+        self.max_misses = max_misses
+        self.max_tracks = max_tracks
+        self.tracks = []
+        self.last_id = 0
+
+    def _match(self, blobs):
+        """
+        Returns:
+            list of the matched track of every blob (None if unmatched)
+        """
+        matches = [None] * len(blobs)
+        if not self.tracks:
+            return matches
+        pairs = []
+        for i in range(len(blobs)):
+            rect = blobs[i].rect()
+            for track in self.tracks:
+                overlap = iou(rect, track.rect)
+                if overlap >= self.min_iou:
+                    pairs.append((overlap, i, track))
+        pairs.sort(key=lambda pair: pair[0], reverse=True)
+        matched = set()
+        for _, i, track in pairs:
+            if matches[i] is None and not track.id in matched:
+                matches[i] = track
+                matched.add(track.id)
+        # centroid fallback: the blob center lies within the size of the track from its center
+        for i in range(len(blobs)):
+            if matches[i] is not None:
+                continue
+            blob = blobs[i]
+            best = None
+            best_distance = 0
+            for track in self.tracks:
+                if track.id in matched:
+                    continue
+                dx, dy = blob.cx() - track.cx, blob.cy() - track.cy
+                distance = dx * dx + dy * dy
+                size = max(track.rect[2], track.rect[3])
+                if distance <= size * size and (best is None or distance < best_distance):
+                    best, best_distance = track, distance
+            if best is not None:
+                matches[i] = best
+                matched.add(best.id)
+        return matches
+
+    def update(self, blobs, first_id: int):
+        """
+        Update the tracks with the blobs of a new difference image (call for every difference image, also without blobs).
+
+        Args:
+            blobs: Blobs found (full resolution coordinates)
+            first_id: Id of a new track of the first blob, the following blobs take the next ids
+                      (i.e. the detection ids the blobs are logged with)
+        Returns:
+            tracks: Track of every blob
+            ended: Tracks not found for more than max_misses frames (or dropped above max_tracks)
+        """
+        now_ms = pyb.millis()
+        tracks = self._match(blobs)
+        found = set()
+        for i in range(len(blobs)):
+            if tracks[i] is None:
+                tracks[i] = Track(first_id + i, blobs[i], now_ms)
+                self.tracks.append(tracks[i])
+                self.last_id = max(self.last_id, first_id + i)
+            else:
+                tracks[i].update(blobs[i])
+            found.add(tracks[i].id)
+
+        ended = []
+        kept = []
+        for track in self.tracks:
+            if not track.id in found:
+                track.misses += 1
+            if track.misses > self.max_misses:
+                ended.append(track)
+            else:
+                kept.append(track)
+        # too many tracks (e.g. moving vegetation): end the ones missing for the longest time
+        if len(kept) > self.max_tracks:
+            kept.sort(key=lambda track: track.misses)
+            ended += kept[self.max_tracks:]
+            kept = kept[:self.max_tracks]
+        self.tracks = kept
+        return tracks, ended
+
+    def end_all(self):
+        """
+        End every track (e.g. before deep sleep or a background reset).
+
+        Returns:
+            ended: The open tracks
+        """
+        ended = self.tracks
+        self.tracks = []
+        return ended